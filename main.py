@@ -1,6 +1,12 @@
+import argparse
 from utils.ikea import DataCollection
+from utils.browser_profile import BrowserProfile, add_arguments
 
 if __name__ == '__main__':
     get_url = 'https://www.ikea.com/gb/en/'
-    scrp = DataCollection(get_url, headless=True) # if True, it works w/o opening the Chrome
-    scrp.scrape_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False) # --profile isn't taken for --profile-dir
+    add_arguments(parser)
+    parser.add_argument('--replay', action='store_true', default=False) # Every page is read from the page cache, Chrome isn't started
+    args, _ = parser.parse_known_args() # The browser options are needed before Chrome starts, the others are read by scrape_data
+    scrp = DataCollection(get_url, headless=True, profile=BrowserProfile.from_args(args), browser=not args.replay) # if True, it works w/o opening the Chrome
+    scrp.scrape_data()
@@ -11,4 +11,11 @@ setup(name='ikea_project',
             'sqlalchemy',
             'pandas',
             'psycopg2',
-            ])
\ No newline at end of file
+            'requests',
+            'lxml',
+            ],
+      extras_require={
+            'parquet': ['pyarrow'],
+            'thumbnails': ['Pillow'],
+            'redis': ['redis'],
+            })
\ No newline at end of file
@@ -1,5 +1,29 @@
 import unittest
 from testing_files.test_ikea_code.test_ikea import DataCollectionTest
+from testing_files.test_ikea_code.test_parallel import ParallelScrapingTest
+from testing_files.test_ikea_code.test_wait_policy import WaitPolicyTest
+from testing_files.test_ikea_code.test_static_engine import StaticEngineTest
+from testing_files.test_ikea_code.test_image_downloader import ImageDownloaderTest
+from testing_files.test_ikea_code.test_image_store import ImageStoreTest
+from testing_files.test_ikea_code.test_seen_index import SeenIndexTest
+from testing_files.test_ikea_code.test_link_filter import LinkFilterTest
+from testing_files.test_ikea_code.test_s3_sink import S3SinkTest
+from testing_files.test_ikea_code.test_rds_writer import RDSBatchWriterTest
+from testing_files.test_ikea_code.test_pipeline import StoragePipelineTest
+from testing_files.test_ikea_code.test_checkpoint import CrawlCheckpointTest
+from testing_files.test_ikea_code.test_segment_store import SegmentStoreTest
+from testing_files.test_ikea_code.test_browser_profile import BrowserProfileTest
+from testing_files.test_ikea_code.test_driver_cache import DriverCacheTest
+from testing_files.test_ikea_code.test_dom_extraction import DomExtractionTest
+from testing_files.test_ikea_code.test_harvest import HarvestTest
+from testing_files.test_ikea_code.test_job_runner import JobRunnerTest
+from testing_files.test_ikea_code.test_metrics import MetricsTest
+from testing_files.test_ikea_code.test_benchmark import BenchmarkTest
+from testing_files.test_ikea_code.test_page_cache import PageCacheTest
+from testing_files.test_ikea_code.test_reprocess import ReprocessTest
+from testing_files.test_ikea_code.test_image_processor import ImageProcessorTest
+from testing_files.test_ikea_code.test_work_queue import WorkQueueTest
+from testing_files.test_ikea_code.test_sinks import SinksTest
 
 if __name__ == "__main__":
     unittest.main(argv=[""], verbosity=3, exit=True)
\ No newline at end of file
@@ -0,0 +1,237 @@
+'''
+This code is to work on Data Collection Pipeline project
+It runs the whole scrape_data pipeline against a local site of generated products, for each engine and set of sinks,
+and reports the products per second, the latency percentiles and the peak memory. No network access is needed:
+S3 is served by moto and PostgreSQL is replaced by a SQLite file. Chrome is still needed for the search pages.
+
+Run it from the project folder:
+    python -m testing_files.benchmarks.benchmark_pipeline --products 100 --output benchmark.json
+    python -m testing_files.benchmarks.benchmark_pipeline --products 100 --baseline benchmark.json --tolerance 0.2
+
+With --nodes, it also runs 1, 2, ... worker processes sharing a SQLite work queue (see --queue of main.py) with the static engine,
+which needs no browser, to show how the throughput scales with the number of nodes:
+    python -m testing_files.benchmarks.benchmark_pipeline --products 200 --latency 0.05 --nodes 1,2,4 --engines none
+'''
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import multiprocessing
+from time import perf_counter
+from sqlalchemy import create_engine
+from utils.ikea import DataCollection, StoreData
+from utils.wait_policy import WaitPolicy
+from utils.work_queue import SQLiteWorkQueue
+from utils.metrics import METRICS
+from utils.browser_profile import BrowserProfile, add_arguments
+from testing_files.test_ikea_code.fixture_server import FixtureSite
+
+ENGINES = ['selenium', 'static']
+SINKS = {'local': ['--local'], 'local+images': ['--local', '--imgs'], 's3': ['--s3'], 'rds': ['--rds'], 'all': ['--local', '--imgs', '--s3', '--rds']}
+
+def chrome_available() -> bool:
+
+    '''
+    Tells if a Chrome or Chromium binary is installed (the search pages need a browser)
+    '''
+    return any(shutil.which(name) for name in ['chromium', 'chromium-browser', 'google-chrome', 'google-chrome-stable', 'chrome'])
+
+class BenchmarkCollection(DataCollection):
+
+    '''
+    A DataCollection whose S3 keys are for moto and whose RDS is a SQLite file in the run folder
+    '''
+    def check_config_file(self):
+        self.config.read_dict({'KEY': {'AWSAccessKeyId': 'testing', 'AWSSecretKey': 'testing', 'AWSBucketName': 'benchmark-bucket', 'DATABASE_TYPE': 'sqlite'}})
+
+    def psycopg2_create_engine(self):
+        return create_engine(f"sqlite:///{os.path.abspath('rds.sqlite')}")
+
+def run_once(site: FixtureSite, engine: str, sinks: str, num_products: int, num_workers: int = 1, profile: BrowserProfile = None) -> dict:
+
+    '''
+    Scrapes and stores num_products products of the local site in a new folder
+
+    Parameters
+    ----------
+    site (FixtureSite)
+        The local site
+    engine (str)
+        The extraction engine (selenium or static)
+    sinks (str)
+        A key of SINKS
+    num_products (int)
+        The number of products to scrape
+    num_workers (int)
+        The number of browser sessions
+    profile (BrowserProfile)
+        The Chrome settings
+
+    Returns
+    -------
+    dict
+        The products per second, the latency percentiles of each stage (ms) and the peak memory of the run (MB)
+    '''
+    folder = os.getcwd()
+    run_folder = tempfile.mkdtemp(prefix='ikea_benchmark_')
+    os.chdir(run_folder) # Every file of the run (records, index, checkpoints, SQLite) is written here
+    mock = None
+    if '--s3' in SINKS[sinks]:
+        from moto import mock_aws
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+        mock = mock_aws() # A local stand-in for S3
+        mock.start()
+        import boto3
+        boto3.client('s3', aws_access_key_id='testing', aws_secret_access_key='testing').create_bucket(Bucket='benchmark-bucket')
+    argv = ['--word', 'desk', '--target', str(num_products), '--max-pages', str(num_products), '--engine', engine, '--workers', str(num_workers),
+            '--table', 'products'] + SINKS[sinks]
+    try:
+        scraper = BenchmarkCollection(site.url('/gb/en/'), headless=True, profile=profile)
+        scraper.check_config_file()
+        METRICS.reset()
+        tracemalloc.start()
+        start = perf_counter()
+        scraper.scrape_data(argv)
+        elapsed = perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        if mock is not None:
+            mock.stop()
+        os.chdir(folder)
+        shutil.rmtree(run_folder, ignore_errors=True)
+    report = METRICS.report()
+    products = report['counters'].get('products', 0)
+    return {'engine': engine, 'sinks': sinks, 'workers': num_workers, 'products': products, 'failed': report['counters'].get('products_failed', 0),
+            'seconds': round(elapsed, 3), 'products_per_s': round(products / elapsed, 3) if elapsed else 0, 'peak_mb': round(peak / 1048576, 1),
+            'latency_ms': {stage: {'p50': round(value['p50'] * 1000, 1), 'p95': round(value['p95'] * 1000, 1), 'p99': round(value['p99'] * 1000, 1)}
+                           for stage, value in report['stages'].items()}}
+
+def run_node(queue_path: str, folder: str) -> int:
+
+    '''
+    Scrapes the links of a shared queue with the static engine until it is drained, in a worker process
+
+    Returns
+    -------
+    int
+        The number of products this node scraped
+    '''
+    collection = BenchmarkCollection.__new__(BenchmarkCollection) # No browser is needed
+    StoreData.__init__(collection)
+    collection.wait = WaitPolicy(None)
+    collection.user_store_data_options(['--local', '--folder', folder, '--index', f'{folder}_index.sqlite', '--engine', 'static', '--queue', queue_path])
+    collection.queue_poll = 0.1
+    try:
+        collection.scrape_from_queue()
+    finally:
+        collection.close_storage()
+    return METRICS.report()['counters'].get('products', 0)
+
+def run_nodes(site: FixtureSite, num_products: int, num_nodes: int) -> dict:
+
+    '''
+    Publishes num_products links of the local site to a new SQLite work queue and scrapes them with num_nodes processes,
+    each with its own data folder and index like separate containers
+
+    Returns
+    -------
+    dict
+        The products scraped by each node and the products per second of all of them
+    '''
+    folder = os.getcwd()
+    run_folder = tempfile.mkdtemp(prefix='ikea_benchmark_nodes_')
+    os.chdir(run_folder)
+    try:
+        work_queue = SQLiteWorkQueue('work_queue.sqlite')
+        work_queue.publish([site.url(f'/gb/en/p/bench-desk-{30000000 + k}/') for k in range(num_products)])
+        work_queue.close()
+        with multiprocessing.get_context('spawn').Pool(num_nodes) as pool:
+            start = perf_counter()
+            products = pool.starmap(run_node, [('work_queue.sqlite', f'node{k}') for k in range(num_nodes)])
+            elapsed = perf_counter() - start # Includes the start of the nodes
+    finally:
+        os.chdir(folder)
+        shutil.rmtree(run_folder, ignore_errors=True)
+    return {'nodes': num_nodes, 'products': sum(products), 'per_node': products, 'seconds': round(elapsed, 3),
+            'products_per_s': round(sum(products) / elapsed, 3) if elapsed else 0}
+
+def compare(results: list, baseline: list, tolerance: float = 0.2) -> list:
+
+    '''
+    Finds the runs slower than the same run of a baseline
+
+    Parameters
+    ----------
+    results (list)
+        The results of run_once
+    baseline (list)
+        The results of a previous benchmark
+    tolerance (float)
+        The slowdown allowed (0.2 for 20%)
+
+    Returns
+    -------
+    list
+        A message for each regression
+    '''
+    previous = {(run['engine'], run['sinks'], run['workers']): run for run in baseline}
+    regressions = []
+    for run in results:
+        before = previous.get((run['engine'], run['sinks'], run['workers']))
+        if before is None or not before['products_per_s']:
+            continue
+        if run['products_per_s'] < before['products_per_s'] * (1 - tolerance):
+            regressions.append(f"{run['engine']}/{run['sinks']} with {run['workers']} workers: {run['products_per_s']} products/s, "
+                               f"{before['products_per_s']} in the baseline")
+        if run['failed'] > before['failed']:
+            regressions.append(f"{run['engine']}/{run['sinks']} with {run['workers']} workers: {run['failed']} failed products, {before['failed']} in the baseline")
+    return regressions
+
+def print_results(results: list):
+    print(f"\n{'engine':10} {'sinks':14} {'products':>8} {'prod/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'peak MB':>8}")
+    for run in results:
+        product = run['latency_ms'].get('product', {'p50': 0, 'p95': 0, 'p99': 0})
+        print(f"{run['engine']:10} {run['sinks']:14} {run['products']:>8} {run['products_per_s']:>8} {product['p50']:>8} {product['p95']:>8} {product['p99']:>8} {run['peak_mb']:>8}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the scraper against a local site of generated products')
+    parser.add_argument('--products', type=int, default=50, help='Number of products scraped in each run (ex: 100)')
+    parser.add_argument('--engines', type=str, default=','.join(ENGINES), help=f'Engines to run, among {ENGINES} (ex: static)')
+    parser.add_argument('--sinks', type=str, default=','.join(SINKS), help=f'Sets of sinks to run, among {list(SINKS)} (ex: local,all)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of browser sessions (ex: 4)')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds the local site waits before each answer (ex: 0.05)')
+    parser.add_argument('--nodes', type=str, default=None, help='Numbers of worker processes sharing a work queue to run with the static engine (ex: 1,2,4)')
+    parser.add_argument('--output', type=str, default=None, help='Save the results to this json file (ex: benchmark.json)')
+    parser.add_argument('--baseline', type=str, default=None, help='Results of a previous run, exits with an error if a run got slower (ex: benchmark.json)')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Slowdown allowed against the baseline (ex: 0.2 for 20%%)')
+    add_arguments(parser)
+    args = parser.parse_args()
+    engines = [engine for engine in args.engines.split(',') if engine in ENGINES] # --engines none only runs the nodes
+    if engines and not chrome_available():
+        sys.exit('Chrome is needed to run the benchmark')
+    profile = BrowserProfile.from_args(args)
+    results = []
+    with FixtureSite(num_products=args.products, latency=args.latency) as site:
+        for engine in engines:
+            for sinks in args.sinks.split(','):
+                print(f'\nRunning {engine} with {sinks} ...')
+                results.append(run_once(site, engine, sinks, args.products, args.workers, profile))
+        node_runs = [run_nodes(site, args.products, int(nodes)) for nodes in args.nodes.split(',')] if args.nodes else []
+    print_results(results)
+    for run in node_runs:
+        print(f"{run['nodes']} nodes: {run['products']} products in {run['seconds']}s, {run['products_per_s']} products/s "
+              f"({run['products_per_s'] / node_runs[0]['products_per_s'] * node_runs[0]['nodes']:.2f}x of one node, per node {run['per_node']})")
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare(results, json.load(fp), args.tolerance)
+        for regression in regressions:
+            print(f'Regression: {regression}')
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,52 @@
+'''
+This code is to work on Data Collection Pipeline project
+It measures how long a scraper takes to be ready (driver, Chrome, home page and cookies) with and without the startup cache
+
+Run it from the project folder (it needs Chrome):
+    python -m testing_files.benchmarks.benchmark_startup --runs 5 --profile-dir chrome_profile
+    python -m testing_files.benchmarks.benchmark_startup --runs 5 --attach 127.0.0.1:9222
+'''
+import argparse
+from time import perf_counter
+from utils.ikea import Scraper
+from utils.driver_cache import clear_driver_path
+from utils.browser_profile import BrowserProfile, add_arguments
+
+def start_scraper(url: str, profile: BrowserProfile) -> dict:
+
+    '''
+    Starts a scraper, accepts the cookies and closes it
+
+    Returns
+    -------
+    dict
+        The seconds spent on each startup step and in total
+    '''
+    start = perf_counter()
+    scraper = Scraper(url, headless=True, profile=profile)
+    scraper.accept_cookies()
+    timings = dict(scraper.startup, total=perf_counter() - start)
+    if profile.debugger_addresses:
+        scraper.driver.get('about:blank') # Keeps the running Chrome for the next run
+    else:
+        scraper.driver.quit()
+    return timings
+
+def print_timings(name: str, runs: list):
+    steps = list(runs[0])
+    print(f'\n{name} ({len(runs)} runs, mean seconds)')
+    for step in steps:
+        print(f'  {step}: {sum(run.get(step, 0) for run in runs) / len(runs):.3f}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the startup time of a scraper')
+    parser.add_argument('--runs', type=int, default=3, help='Number of warm starts (ex: 5)')
+    parser.add_argument('--url', type=str, default='https://www.ikea.com/gb/en/', help='Home page (ex: https://www.ikea.com/gb/en/)')
+    add_arguments(parser)
+    args = parser.parse_args()
+    profile = BrowserProfile.from_args(args)
+    clear_driver_path() # The first start resolves the driver again, like a new container
+    cold = start_scraper(args.url, profile)
+    warm = [start_scraper(args.url, profile) for _ in range(max(1, args.runs))]
+    print_timings('Cold start', [cold])
+    print_timings('Warm start', warm)
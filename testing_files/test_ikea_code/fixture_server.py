@@ -0,0 +1,137 @@
+'''
+Serves the saved Ikea pages in testing_files/fixtures/ikea_site from a local HTTP server, so tests and benchmarks run without network access
+'''
+import os
+import re
+import json
+import threading
+from time import sleep
+from urllib.parse import urlparse, parse_qs
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+FIXTURE_SITE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures', 'ikea_site')
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass # Keeps the test output clean
+
+class FixtureServer:
+
+    '''
+    Starts the local fixture site on a free port:
+
+    with FixtureServer() as server:
+        server.url('/gb/en/p/micke-desk-oak-effect-20351742/')
+    '''
+    def __init__(self, directory: str = FIXTURE_SITE):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=directory))
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path: str = '/') -> str:
+        return f'http://127.0.0.1:{self.httpd.server_port}{path}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+PRODUCT_TEMPLATE = os.path.join(FIXTURE_SITE, 'gb', 'en', 'p', 'micke-desk-oak-effect-20351742', 'index.html')
+
+HOME_PAGE = '''<!DOCTYPE html>
+<html lang="en-GB">
+<head><meta charset="utf-8"><title>IKEA</title></head>
+<body>
+<button id="onetrust-accept-btn-handler" onclick="document.cookie = 'OptanonAlertBoxClosed=1; path=/'; this.remove();">Accept All Cookies</button>
+<div class="search-field"><form action="/gb/en/search/" method="get"><input type="search" name="q" autofocus style="width: 100%"></form></div>
+</body>
+</html>
+'''
+
+# The results are added by the 'show more' button, like on the live site
+SEARCH_PAGE = '''<!DOCTYPE html>
+<html lang="en-GB">
+<head><meta charset="utf-8"><title>Search - IKEA</title></head>
+<body>
+<section class="results"><div class="serp-grid"></div></section>
+<a class="show-more__button button button--secondary button--small" href="#">Show more</a>
+<script>
+const links = %(links)s;
+const pageSize = %(page_size)d;
+const grid = document.querySelector('.serp-grid');
+const button = document.querySelector('.show-more__button');
+function showMore() {
+  const shown = grid.children.length;
+  for (const link of links.slice(shown, shown + pageSize)) {
+    const item = document.createElement('div');
+    item.className = 'serp-grid__item search-grid__item product-fragment';
+    item.innerHTML = '<a href="' + link + '">' + link + '</a>';
+    grid.appendChild(item);
+  }
+  if (grid.children.length >= links.length) button.remove();
+}
+button.addEventListener('click', event => { event.preventDefault(); showMore(); });
+showMore();
+</script>
+</body>
+</html>
+'''
+
+class SiteHandler(QuietHandler):
+
+    '''
+    Serves a site of generated products built from the saved product page:
+    /gb/en/ (search box and cookies banner), /gb/en/search/?q=<word>, /gb/en/p/bench-<word>-<id>/ and their images
+    '''
+    num_products = 50
+    page_size = 24
+    latency = 0
+
+    def product_ids(self) -> list:
+        return [f'{30000000 + k:08d}' for k in range(self.num_products)]
+
+    def send_page(self, body: bytes, content_type: str = 'text/html; charset=utf-8'):
+        if self.latency:
+            sleep(self.latency) # The server time of the live site
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/gb/en/':
+            return self.send_page(HOME_PAGE.encode('utf-8'))
+        if url.path == '/gb/en/search/':
+            word = re.sub(r'[^a-z0-9]+', '-', parse_qs(url.query).get('q', ['desk'])[0].lower()).strip('-') or 'desk'
+            links = [f'/gb/en/p/bench-{word}-{product_id}/' for product_id in self.product_ids()]
+            return self.send_page((SEARCH_PAGE % {'links': json.dumps(links), 'page_size': self.page_size}).encode('utf-8'))
+        product = re.match(r'^/gb/en/p/bench-[a-z0-9-]+-(\d{8})/$', url.path)
+        if product:
+            with open(PRODUCT_TEMPLATE) as fp:
+                page = fp.read()
+            page = page.replace('20351742', product.group(1)).replace('micke-desk-oak-effect__', f'bench-{product.group(1)}__') # Each product has its own images
+            return self.send_page(page.encode('utf-8'))
+        image = re.match(r'^/gb/en/images/products/bench-\d{8}__(.+\.jpg)$', url.path)
+        if image:
+            with open(os.path.join(FIXTURE_SITE, 'gb', 'en', 'images', 'products', f'micke-desk-oak-effect__{image.group(1)}'), 'rb') as fp:
+                return self.send_page(fp.read(), 'image/jpeg')
+        return super().do_GET()
+
+class FixtureSite(FixtureServer):
+
+    '''
+    Starts a local site of generated products on a free port, for the benchmarks and the browser tests:
+
+    with FixtureSite(num_products=200) as site:
+        site.url('/gb/en/')
+    '''
+    def __init__(self, num_products: int = 50, page_size: int = 24, latency: float = 0, directory: str = FIXTURE_SITE):
+        handler = type('Handler', (SiteHandler,), {'num_products': num_products, 'page_size': page_size, 'latency': latency})
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=directory))
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
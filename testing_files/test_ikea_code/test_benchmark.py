@@ -0,0 +1,59 @@
+import os
+import unittest
+import requests
+from utils.static_engine import StaticEngine
+from testing_files.test_ikea_code.fixture_server import FixtureSite
+from testing_files.benchmarks.benchmark_pipeline import run_once, compare, chrome_available
+
+def result(engine: str, sinks: str, products_per_s: float, failed: int = 0) -> dict:
+    return {'engine': engine, 'sinks': sinks, 'workers': 1, 'products': 50, 'failed': failed, 'products_per_s': products_per_s}
+
+class BenchmarkTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.site = FixtureSite(num_products=30, page_size=12).__enter__()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.site.__exit__()
+
+    def test_search_page_lists_every_product(self):
+        page = requests.get(self.site.url('/gb/en/search/?q=office+chair')).text
+        self.assertIn('/gb/en/p/bench-office-chair-30000000/', page)
+        self.assertIn('/gb/en/p/bench-office-chair-30000029/', page)
+        self.assertNotIn('30000030', page)
+
+    def test_generated_products(self):
+        engine = StaticEngine(pool_size=2, timeout=5)
+        product = engine.retrieve_product_details(self.site.url('/gb/en/p/bench-desk-30000007/'))
+        engine.close()
+        self.assertEqual(product['Product_id'], ['30000007'])
+        self.assertEqual(len(product['Image_all_links'][0]), 3)
+        image = requests.get(product['Image_all_links'][0][1])
+        self.assertEqual(image.status_code, 200)
+        self.assertEqual(image.headers['Content-Type'], 'image/jpeg')
+
+    def test_saved_pages_are_still_served(self):
+        self.assertEqual(requests.get(self.site.url('/gb/en/p/micke-desk-oak-effect-20351742/')).status_code, 200)
+
+    def test_compare_finds_regressions(self):
+        baseline = [result('static', 'local', 10), result('selenium', 'all', 2)]
+        self.assertEqual(compare([result('static', 'local', 9), result('selenium', 'all', 2.1)], baseline, tolerance=0.2), [])
+        regressions = compare([result('static', 'local', 7), result('selenium', 'all', 2, failed=1), result('static', 'rds', 1)], baseline, tolerance=0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('static/local', regressions[0])
+        self.assertIn('failed', regressions[1])
+
+    @unittest.skipUnless(chrome_available(), 'Chrome is needed')
+    def test_run_once(self):
+        folder = os.getcwd()
+        run = run_once(self.site, 'static', 'all', num_products=5)
+        self.assertEqual(os.getcwd(), folder)
+        self.assertEqual(run['products'], 5)
+        self.assertEqual(run['failed'], 0)
+        self.assertGreater(run['products_per_s'], 0)
+        self.assertIn('product', run['latency_ms'])
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,69 @@
+import sys
+import argparse
+import subprocess
+import unittest
+from unittest.mock import Mock
+from utils.browser_profile import BrowserProfile, PageLoadMeter, add_arguments
+
+class BrowserProfileTest(unittest.TestCase):
+
+    def test_import_is_light(self):
+        check = "import sys, utils.browser_profile; print([name for name in ['requests', 'selenium.webdriver'] if name in sys.modules])"
+        result = subprocess.run([sys.executable, '-c', check], check=True, capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_default_profile_keeps_chrome_settings(self):
+        profile = BrowserProfile()
+        options = profile.options(headless=True)
+        self.assertIn('--headless', options.arguments)
+        self.assertEqual(options.page_load_strategy, 'normal')
+        self.assertEqual(profile.blocked_urls(), [])
+        driver = Mock()
+        profile.apply(driver)
+        driver.execute_cdp_cmd.assert_not_called()
+
+    def test_lean_profile(self):
+        profile = BrowserProfile(lean=True, block_types=['font'], block_patterns=['*youtube.com*'])
+        options = profile.options()
+        self.assertEqual(options.page_load_strategy, 'eager')
+        self.assertNotIn('--blink-settings=imagesEnabled=false', options.arguments) # Images are not blocked
+        driver = Mock()
+        profile.apply(driver)
+        blocked_urls = driver.execute_cdp_cmd.call_args.args[1]['urls']
+        self.assertIn('*.woff2*', blocked_urls)
+        self.assertIn('*youtube.com*', blocked_urls)
+        self.assertIn('*googletagmanager.com*', blocked_urls)
+        self.assertNotIn('*.jpg*', blocked_urls)
+
+    def test_from_args(self):
+        parser = argparse.ArgumentParser()
+        add_arguments(parser)
+        profile = BrowserProfile.from_args(parser.parse_args(['--lean', '--block', 'image,media', '--block-url', '*vimeo.com*']))
+        self.assertTrue(profile.lean)
+        self.assertEqual(profile.block_types, ['image', 'media'])
+        self.assertIn('--blink-settings=imagesEnabled=false', profile.options().arguments)
+        with self.assertRaises(ValueError):
+            BrowserProfile.from_args(parser.parse_args(['--block', 'video']))
+
+    def test_persistent_and_attached_sessions(self):
+        profile = BrowserProfile(user_data_dir='/tmp/chrome_profile', debugger_addresses=['127.0.0.1:9222', '127.0.0.1:9223'])
+        self.assertEqual(profile.options().experimental_options['debuggerAddress'], '127.0.0.1:9222')
+        worker_profile = profile.for_worker(1)
+        self.assertEqual(worker_profile.options().experimental_options['debuggerAddress'], '127.0.0.1:9223')
+        worker_profile = profile.for_worker(2) # No running Chrome left, it starts one with its own profile folder
+        self.assertIn('--user-data-dir=/tmp/chrome_profile-worker-2', worker_profile.options(headless=True).arguments)
+
+    def test_page_load_meter(self):
+        meter = PageLoadMeter()
+        driver = Mock()
+        for load_ms, num_bytes in [(800, 2048), (1200, 4096), (None, 0)]:
+            driver.execute_script.return_value = {'load_ms': load_ms, 'bytes': num_bytes, 'requests': 10}
+            meter.record(driver, 'https://www.ikea.com/gb/en/p/micke-desk-oak-effect-20351742/')
+        worker_meter = PageLoadMeter()
+        driver.execute_script.side_effect = Exception('no such window')
+        self.assertIsNone(worker_meter.record(driver, 'https://www.ikea.com/'))
+        meter.merge(worker_meter)
+        self.assertEqual(meter.stats(), {'pages': 2, 'p50_ms': 800, 'p95_ms': 1200, 'mean_bytes': 3072, 'total_bytes': 6144})
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
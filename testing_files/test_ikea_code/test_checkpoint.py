@@ -0,0 +1,76 @@
+import unittest
+import tempfile
+from unittest.mock import Mock
+from concurrent.futures import Future
+from utils.checkpoint import CrawlCheckpoint
+from utils.pipeline import StoragePipeline
+from utils.ikea import DataCollection, StoreData
+
+def product(product_id: str) -> dict:
+    return {'Product_id': [product_id], 'Name': ['MICKE'], 'Image_link': ['a.jpg'], 'Image_all_links': [['a.jpg']]}
+
+class CrawlCheckpointTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.links = [f'https://www.ikea.com/gb/en/p/desk-{k:08d}/' for k in range(5)]
+        self.checkpoint = CrawlCheckpoint('desk', 'https://www.ikea.com/gb/en/', self.tmp_dir.name)
+        return super().setUp()
+
+    def test_resume_after_restart(self):
+        self.assertFalse(self.checkpoint.discovery_complete())
+        self.checkpoint.save_links(self.links)
+        self.checkpoint.mark_done(self.links[0])
+        self.checkpoint.mark_failed(self.links[1], 'Chrome crashed')
+        self.checkpoint.close()
+        self.checkpoint = CrawlCheckpoint('desk', 'https://www.ikea.com/gb/en/', self.tmp_dir.name)
+        self.assertTrue(self.checkpoint.discovery_complete())
+        self.assertEqual(self.checkpoint.pending_links(), self.links[1:])
+        self.assertEqual(self.checkpoint.counts(), {'done': 1, 'failed': 1, 'pending': 3})
+
+    def test_jobs_are_separate(self):
+        self.assertNotEqual(CrawlCheckpoint.job_name('desk', 'https://www.ikea.com/gb/en/'), CrawlCheckpoint.job_name('desk', 'https://www.ikea.com/us/en/'))
+        other = CrawlCheckpoint('chair', 'https://www.ikea.com/gb/en/', self.tmp_dir.name)
+        self.checkpoint.save_links(self.links)
+        self.assertFalse(other.discovery_complete())
+        other.close()
+
+    def test_scrape_product_updates_checkpoint(self):
+        scraper_obj = DataCollection.__new__(DataCollection) # Skips opening a browser
+        StoreData.__init__(scraper_obj)
+        scraper_obj.checkpoint = self.checkpoint
+        scraper_obj.open_product_page = Mock()
+        scraper_obj.retrieve_product_details = Mock(side_effect=[product('00000000'), RuntimeError('no such element')])
+        self.checkpoint.save_links(self.links[:2])
+        scraper_obj.scrape_product(self.links[0])
+        with self.assertRaises(RuntimeError):
+            scraper_obj.scrape_product(self.links[1])
+        self.assertEqual(self.checkpoint.counts(), {'done': 1, 'failed': 1})
+
+    def test_link_is_done_once_stored(self):
+        scraper_obj = DataCollection.__new__(DataCollection)
+        StoreData.__init__(scraper_obj)
+        scraper_obj.checkpoint = self.checkpoint
+        scraper_obj.store_data_locally = True
+        scraper_obj.store_data_in_rds_table = True
+        batches = {'local': Future(), 'rds': Future()}
+        scraper_obj.pipeline = StoragePipeline({sink: lambda task, sink=sink: batches[sink] for sink in batches}, on_stored=scraper_obj._product_stored)
+        scraper_obj.open_product_page = Mock()
+        scraper_obj.retrieve_product_details = Mock(side_effect=[product('00000000'), product('00000001')])
+        self.checkpoint.save_links(self.links[:2])
+        scraper_obj.scrape_product(self.links[0])
+        scraper_obj.scrape_product(self.links[1])
+        scraper_obj.pipeline.close()
+        self.assertEqual(self.checkpoint.pending_links(), self.links[:2]) # Handed to the sinks, not written yet
+        batches['local'].set_result(True)
+        self.assertEqual(self.checkpoint.counts(), {'pending': 2})
+        batches['rds'].set_exception(OSError('connection lost'))
+        self.assertEqual(self.checkpoint.counts(), {'failed': 2}) # Tried again on resume
+
+    def tearDown(self) -> None:
+        self.checkpoint.close()
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import Mock
+from selenium.common.exceptions import NoSuchElementException
+from utils.dom_extraction import extract, EXTRACT_SCRIPT
+from utils.product_fields import PRODUCT_FIELDS, PRODUCT_LIST_FIELDS, RESULT_LIST_FIELDS
+from utils.ikea import DataCollection, StoreData
+from utils.wait_policy import WaitPolicy
+
+PAGE_VALUES = {'product_id': '20351742', 'price': '75', 'currency': '£', 'name': 'MICKE', 'description': 'Desk, oak effect,',
+               'src_img': 'https://www.ikea.com/gb/en/images/products/micke-desk-oak-effect__0.jpg',
+               'src_multi_img': ['https://www.ikea.com/gb/en/images/products/micke-desk-oak-effect__0.jpg',
+                                 'https://www.ikea.com/gb/en/images/products/micke-desk-oak-effect__1.jpg']}
+
+class DomExtractionTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.scraper_obj = DataCollection.__new__(DataCollection) # Skips opening a browser
+        StoreData.__init__(self.scraper_obj)
+        self.scraper_obj.driver = Mock()
+        self.scraper_obj.wait = WaitPolicy(self.scraper_obj.driver)
+        self.scraper_obj.pages_loaded = 0
+        return super().setUp()
+
+    def test_one_round_trip_per_product(self):
+        self.scraper_obj.driver.execute_script.return_value = dict(PAGE_VALUES)
+        dict_properties = self.scraper_obj.retrieve_product_details()
+        self.scraper_obj.driver.execute_script.assert_called_once()
+        self.scraper_obj.driver.find_element.assert_not_called()
+        script, fields, list_fields = self.scraper_obj.driver.execute_script.call_args.args
+        self.assertEqual(script, EXTRACT_SCRIPT)
+        self.assertEqual([field[0] for field in fields], list(PRODUCT_FIELDS))
+        self.assertEqual([field[0] for field in list_fields], list(PRODUCT_LIST_FIELDS))
+        self.assertEqual(dict_properties['Product_id'], ['20351742'])
+        self.assertEqual(dict_properties['Price'], ['£75'])
+        self.assertEqual(dict_properties['Image_all_links'], [PAGE_VALUES['src_multi_img']])
+
+    def test_missing_field_raises(self):
+        self.scraper_obj.driver.execute_script.return_value = dict(PAGE_VALUES, price=None)
+        with self.assertRaises(NoSuchElementException):
+            self.scraper_obj.retrieve_product_details()
+
+    def test_waits_for_images_gallery(self):
+        self.scraper_obj.driver.execute_script.side_effect = [dict(PAGE_VALUES, src_multi_img=[]), {'src_multi_img': []}, {'src_multi_img': PAGE_VALUES['src_multi_img']}]
+        self.scraper_obj.driver.find_element.return_value = Mock() # The gallery is present
+        dict_properties = self.scraper_obj.retrieve_product_details()
+        self.assertEqual(dict_properties['Image_all_links'], [PAGE_VALUES['src_multi_img']])
+
+    def test_product_links_in_one_call(self):
+        links = [f'https://www.ikea.com/gb/en/p/desk-{k:08d}/' for k in range(24)]
+        self.scraper_obj.driver.find_elements.return_value = [None] * 24
+        self.scraper_obj.driver.execute_script.return_value = {'links': links}
+        self.scraper_obj.wait.idle_time = 0
+        self.assertEqual(sorted(self.scraper_obj.get_product_links(1)), links)
+        self.assertEqual(extract(self.scraper_obj.driver, list_fields=RESULT_LIST_FIELDS)['links'], links)
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,51 @@
+import os
+import unittest
+import tempfile
+from unittest.mock import Mock, patch
+from utils import driver_cache
+from utils.driver_cache import driver_path, clear_driver_path
+
+class DriverCacheTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmp_dir.name, 'cache', 'driver_path.json')
+        self.binary = os.path.join(self.tmp_dir.name, 'chromedriver')
+        with open(self.binary, 'w') as fp:
+            fp.write('#!/bin/sh\n')
+        os.chmod(self.binary, 0o755)
+        driver_cache._paths.clear()
+        return super().setUp()
+
+    @patch.dict(os.environ, {'CHROMEDRIVER_PATH': ''})
+    def test_install_once(self):
+        install = Mock(return_value=self.binary)
+        self.assertEqual(driver_path('chromium', self.cache_file, install), self.binary)
+        driver_cache._paths.clear() # Like a new process
+        self.assertEqual(driver_path('chromium', self.cache_file, install), self.binary)
+        install.assert_called_once()
+
+    @patch.dict(os.environ, {'CHROMEDRIVER_PATH': ''})
+    def test_install_again_if_removed(self):
+        install = Mock(return_value=self.binary)
+        driver_path('chromium', self.cache_file, install)
+        driver_cache._paths.clear()
+        os.remove(self.binary)
+        driver_path('chromium', self.cache_file, install)
+        self.assertEqual(install.call_count, 2)
+        clear_driver_path(self.cache_file)
+        self.assertFalse(os.path.exists(self.cache_file))
+
+    @patch.dict(os.environ, {'CHROMEDRIVER_PATH': '/usr/local/bin/chromedriver'})
+    def test_environment_variable(self):
+        install = Mock()
+        self.assertEqual(driver_path('chromium', self.cache_file, install), '/usr/local/bin/chromedriver')
+        install.assert_not_called()
+
+    def tearDown(self) -> None:
+        driver_cache._paths.clear()
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
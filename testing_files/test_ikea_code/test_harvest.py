@@ -0,0 +1,134 @@
+import unittest
+import tempfile
+from time import perf_counter
+from unittest.mock import Mock, patch
+from utils.ikea import DataCollection, StoreData
+from utils.wait_policy import WaitPolicy, SETTLED_SCRIPT
+from utils.page_cache import PageCache
+
+class ResultsPage:
+
+    '''
+    Stands for a search results page: shows 24 more results each time 'show more' is clicked
+    '''
+    def __init__(self, total: int, first_id: int = 0):
+        self.links = [f'https://www.ikea.com/gb/en/p/desk-{first_id + k:08d}/' for k in range(total)]
+        self.shown = min(24, total)
+        self.reads = []
+
+    def find_elements(self, by, value):
+        return [None] * self.shown
+
+    def find_element(self, by, value):
+        if self.shown >= len(self.links):
+            raise Exception('no such element')
+        button = Mock()
+        button.click.side_effect = lambda: setattr(self, 'shown', min(self.shown + 24, len(self.links)))
+        return button
+
+    def quit(self):
+        pass
+
+    def execute_script(self, script, *args):
+        if script == SETTLED_SCRIPT:
+            return True # The results are loaded
+        fields, list_fields = args
+        xpath = list_fields[0][1]
+        skip = int(xpath.rsplit('position() > ', 1)[1].rstrip(']')) if 'position()' in xpath else 0
+        self.reads.append(self.shown - skip)
+        return {'links': self.links[skip:self.shown]}
+
+class HarvestTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.scraper_obj = DataCollection.__new__(DataCollection) # Skips opening a browser
+        StoreData.__init__(self.scraper_obj)
+        self.scraper_obj.pages_loaded = 0
+        return super().setUp()
+
+    def use_page(self, scraper_obj, page: ResultsPage):
+        scraper_obj.driver = page
+        scraper_obj.wait = WaitPolicy(page, timeout=1, poll_frequency=0.01, idle_time=0)
+
+    def test_stops_at_target(self):
+        page = ResultsPage(200)
+        self.use_page(self.scraper_obj, page)
+        links = self.scraper_obj.harvest_links(target=30, max_pages=50)
+        self.assertEqual(links, page.links[:30])
+        self.assertEqual(page.reads, [24, 24]) # Only the new results are read after 'show more'
+        self.assertEqual(self.scraper_obj.pages_loaded, 2)
+
+    def test_stops_without_show_more(self):
+        page = ResultsPage(50)
+        self.use_page(self.scraper_obj, page)
+        self.assertEqual(self.scraper_obj.harvest_links(max_pages=50), page.links)
+        self.assertEqual(self.scraper_obj.pages_loaded, 3)
+
+    def test_show_more_adding_nothing_stops_early(self):
+        page = ResultsPage(200)
+        page.find_element = lambda by, value: Mock() # The button is there but shows no more results
+        self.use_page(self.scraper_obj, page)
+        start = perf_counter()
+        self.assertEqual(self.scraper_obj.harvest_links(max_pages=50), page.links[:24])
+        self.assertLess(perf_counter() - start, 0.5) # Not the whole timeout
+
+    def test_target_counts_new_products(self):
+        page = ResultsPage(100)
+        self.use_page(self.scraper_obj, page)
+        self.scraper_obj.store_data_locally = True
+        self.scraper_obj.pid_list_locally = [f'{k:08d}' for k in range(40)] # Stored in a previous run
+        links = self.scraper_obj.harvest_links(target=10, keep=self.scraper_obj.is_new_link)
+        self.assertEqual(links, page.links[40:50])
+
+    def test_every_link_is_new_without_sinks(self):
+        page = ResultsPage(30)
+        self.use_page(self.scraper_obj, page)
+        links = self.scraper_obj.harvest_links(target=10, keep=self.scraper_obj.is_new_link) # Like a --coordinator run
+        self.assertEqual(links, page.links[:10])
+
+    def test_cache_keeps_every_harvested_link(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            obj = self.scraper_obj
+            obj.url = 'https://www.ikea.com/gb/en/'
+            obj.page_cache = PageCache(tmp_dir)
+            obj.search_box = Mock()
+            obj.scrol_down = Mock()
+            obj.store_data_locally = True
+            obj.pid_list_locally = [f'{k:08d}' for k in range(40)]
+            page = ResultsPage(100)
+            self.use_page(obj, page)
+            page.current_url = obj.url
+            self.assertEqual(obj.harvest_keyword('desk', target=10), page.links[40:50])
+            obj.pid_list_locally += [f'{k:08d}' for k in range(40, 50)] # Stored since
+            obj.search_box.reset_mock()
+            self.assertEqual(obj.harvest_keyword('desk', target=10), page.links[50:60]) # The stored links are left out of the cached ones
+            obj.search_box.assert_not_called()
+            self.assertEqual(obj.harvest_keyword('desk', target=30), page.links[50:80]) # Not enough links in the cache, searched again
+            obj.search_box.assert_called_once()
+            obj.page_cache.close()
+
+    def test_keywords_are_shared_and_unique(self):
+        pages = {'desk': ResultsPage(30), 'table': ResultsPage(30, first_id=20), 'chair': ResultsPage(10, first_id=100)}
+        def harvest_keyword(worker, search_word, target, max_pages):
+            self.use_page(worker, pages[search_word])
+            return worker.harvest_links(target, max_pages)
+        workers = []
+        def spawn_worker():
+            worker = DataCollection.__new__(DataCollection)
+            worker.__dict__.update(self.scraper_obj.__dict__)
+            worker.driver = Mock()
+            worker.wait = WaitPolicy(None)
+            worker.pages_loaded = 0
+            workers.append(worker)
+            return worker
+        self.scraper_obj.num_workers = 2
+        self.scraper_obj.wait = WaitPolicy(None)
+        with patch.object(DataCollection, 'harvest_keyword', harvest_keyword), patch.object(self.scraper_obj, 'spawn_worker', side_effect=spawn_worker):
+            links = self.scraper_obj.discover_links(['desk', 'table', 'chair'], max_pages=5)
+        self.assertEqual(len(workers), 1)
+        self.assertEqual(len(links), 60) # 10 products are found for both desk and table
+        self.assertEqual(links[:30], pages['desk'].links)
+        self.assertEqual(self.scraper_obj.pages_loaded, 5)
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -1,51 +1,78 @@
-import sys, os
-sys.path.insert(0, '/Users/behzad/AiCore/DataCollectionPipeline/utils/')
-import unittest 
-from utils.ikea import DataCollection
+import os
+import unittest
+import tempfile
 from unittest.mock import patch, Mock, call
-from time import sleep
+from utils.ikea import DataCollection
+from testing_files.test_ikea_code.fixture_server import FixtureSite
+from testing_files.benchmarks.benchmark_pipeline import chrome_available
 
+@unittest.skipUnless(chrome_available(), 'Chrome is needed')
 class DataCollectionTest(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.site = FixtureSite(num_products=30, page_size=12).__enter__() # A local site, no network access is needed
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.site.__exit__()
+
     def setUp(self) -> None:
-        self.scraper_obj = DataCollection(url="https://www.ikea.com/gb/en/")
-        self.scraper_obj.pass_cookies()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.scraper_obj = DataCollection(url=self.site.url('/gb/en/'), headless=True)
+        self.scraper_obj.folder_name = os.path.join(self.tmp_dir.name, 'raw_data')
+        self.scraper_obj.accept_cookies()
         return super().setUp()
 
-    def test_get_product_links(self):
-        self.scraper_obj.driver.get("https://www.ikea.com/gb/en/search/products/?q=desk")
-        check_list_product = self.scraper_obj._get_product_links()
-        self.assertEqual(len(check_list_product), 22)
-        self.assertEqual(check_list_product[-1], "https://www.ikea.com/gb/en/p/smastad-desk-white-grey-with-2-drawers-s19392258/")
+    def test_accept_cookies(self):
+        self.assertIsNotNone(self.scraper_obj.driver.get_cookie('OptanonAlertBoxClosed'))
 
-    def test_get_more_product_links(self):
-        self.scraper_obj.driver.get("https://www.ikea.com/gb/en/search/products/?q=desk")
-        check_more_list_product = self.scraper_obj._get_more_product_links(num_page = 3)
-        self.assertEqual(len(check_more_list_product), 70)
+    def test_harvest_links(self):
+        self.scraper_obj.search_box('desk')
+        check_list_product = self.scraper_obj.harvest_links(max_pages=1)
+        self.assertEqual(len(check_list_product), 12)
+        self.assertEqual(check_list_product[-1], self.site.url('/gb/en/p/bench-desk-30000011/'))
+
+    def test_harvest_more_links(self):
+        self.scraper_obj.search_box('desk')
+        check_more_list_product = self.scraper_obj.harvest_links(target=20, max_pages=3)
+        self.assertEqual(len(check_more_list_product), 20)
+        self.assertEqual(self.scraper_obj.pages_loaded, 2)
 
     def test_get_href_image(self):
-        self.scraper_obj.driver.get("https://www.ikea.com/gb/en/p/micke-desk-oak-effect-20351742/")
+        self.scraper_obj.driver.get(self.site.url('/gb/en/p/bench-desk-30000001/'))
         test_get_href = self.scraper_obj._get_href_image()
-        self.assertEqual(test_get_href, "https://www.ikea.com/gb/en/images/products/micke-desk-oak-effect__0515989_pe640126_s5.jpg?f=s")
+        self.assertEqual(test_get_href, self.site.url('/gb/en/images/products/bench-30000001__0515989_pe640126_s5.jpg?f=s'))
 
     def test_download_image(self):
-        self.scraper_obj.driver.get("https://www.ikea.com/gb/en/p/micke-desk-oak-effect-20351742/")
-        test_download_false = self.scraper_obj._download_image("image_name", "check_directory")
-        self.assertTrue(os.path.exists('raw_data/check_directory'))
+        self.scraper_obj.driver.get(self.site.url('/gb/en/p/bench-desk-30000001/'))
+        futures = self.scraper_obj._download_image("image_name", "check_directory")
+        self.assertTrue(futures[0].result())
+        self.assertTrue(os.path.exists(f'{self.scraper_obj.folder_name}/check_directory/image/image_name_check_directory.jpg'))
 
     def test_get_href_list_images(self):
-        self.scraper_obj.driver.get("https://www.ikea.com/gb/en/p/micke-desk-oak-effect-20351742/")
+        self.scraper_obj.driver.get(self.site.url('/gb/en/p/bench-desk-30000001/'))
         test_download_true = self.scraper_obj._get_href_list_images()
-        self.assertEqual(len(test_download_true), 8)
-        self.assertEqual(test_download_true[0], "https://www.ikea.com/gb/en/images/products/micke-desk-oak-effect__0515989_pe640126_s5.jpg?f=s")
+        self.assertEqual(len(test_download_true), 3)
+        self.assertEqual(test_download_true[0], self.site.url('/gb/en/images/products/bench-30000001__0515989_pe640126_s5.jpg?f=s'))
+
+    def test_download_multiple_images(self):
+        self.scraper_obj.driver.get(self.site.url('/gb/en/p/bench-desk-30000001/'))
+        futures = self.scraper_obj._download_multiple_images("image_name", "check_multi_directory")
+        self.assertEqual(len(futures), 3)
+        for future in futures:
+            future.result()
+        self.assertEqual(len(os.listdir(f'{self.scraper_obj.folder_name}/check_multi_directory/images')), 3)
 
-    def test_download_multiple_images_true(self):
-        self.scraper_obj.driver.get("https://www.ikea.com/gb/en/p/micke-desk-oak-effect-20351742/")
-        test_download_multi = self.scraper_obj._download_multiple_images("image_name", "check_multi_directory")
-        self.assertTrue(os.path.exists('raw_data/check_multi_directory'))
+    def test_retrieve_product_details(self):
+        self.scraper_obj.open_product_page(self.site.url('/gb/en/p/bench-desk-30000002/'))
+        product = self.scraper_obj.retrieve_product_details()
+        self.assertEqual(product['Product_id'], ['30000002'])
+        self.assertEqual(product['Price'], ['£75'])
+        self.assertEqual(len(product['Image_all_links'][0]), 3)
 
     @patch("selenium.webdriver.remote.webdriver.WebDriver.execute_script")
-    def test_search_box(self, mock_execute_script: Mock):
+    def test_scrol_down(self, mock_execute_script: Mock):
         self.scraper_obj.scrol_down()
         mock_execute_script.assert_has_calls(calls=[call("window.scrollTo(0, 300)"), call("window.scrollTo(0, 600)")])
 
@@ -54,20 +81,14 @@ class DataCollectionTest(unittest.TestCase):
         self.assertEqual(len(check_uuid), 36)
 
     def test_store_raw_data_locally(self):
-        check_store = self.scraper_obj.store_raw_data_locally({'test':1, 'this':2}, 'check_dict_dir')
-        self.assertTrue(os.path.exists('raw_data/check_dict_dir'))
-        self.assertTrue(os.path.exists('raw_data/check_dict_dir/data.json'))
-
-    def test_psycopg2_create_engine(self):
-        pass
-
-    def test_create_df(self):
-        check_df = self.scraper_obj.create_df({'this':[1], 'is':[2], 'a_dict':[3]})
-        self.assertEqual(check_df.iloc[0]['this'], 1)
+        self.scraper_obj.store_raw_data_locally({'test':1, 'this':2}, 'check_dict_dir')
+        self.assertTrue(os.path.exists(f'{self.scraper_obj.folder_name}/check_dict_dir/data.json'))
 
     def tearDown(self) -> None:
         self.scraper_obj.driver.quit()
+        self.scraper_obj.downloader.close()
+        self.tmp_dir.cleanup()
         return super().tearDown()
 
 if __name__ == "__main__":
-    unittest.main(argv=[""], verbosity=3, exit=True)
\ No newline at end of file
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,50 @@
+import os
+import unittest
+import tempfile
+from utils.image_downloader import ImageDownloader, percentile
+from testing_files.test_ikea_code.fixture_server import FixtureServer, FIXTURE_SITE
+
+class ImageDownloaderTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = FixtureServer().__enter__()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.__exit__()
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.downloader = ImageDownloader(max_workers=2)
+        return super().setUp()
+
+    def test_download_images_in_background(self):
+        names = ['micke-desk-oak-effect__0515989_pe640126_s5.jpg', 'micke-desk-oak-effect__0736020_pe740346_s5.jpg', 'micke-desk-oak-effect__0736019_pe740345_s5.jpg']
+        futures = [self.downloader.submit(self.server.url(f'/gb/en/images/products/{name}?f=s'), os.path.join(self.tmp_dir.name, 'images', name)) for name in names]
+        self.assertTrue(all(future.result() for future in futures))
+        expected_bytes = sum(os.path.getsize(os.path.join(FIXTURE_SITE, 'gb/en/images/products', name)) for name in names)
+        stats = self.downloader.stats()
+        self.assertEqual(stats['images'], 3)
+        self.assertEqual(stats['bytes'], expected_bytes)
+        self.assertEqual(stats['failures'], 0)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmp_dir.name, 'images'))), sorted(names))
+
+    def test_failed_download_leaves_no_file(self):
+        path = os.path.join(self.tmp_dir.name, 'missing.jpg')
+        self.assertFalse(self.downloader.submit(self.server.url('/gb/en/images/products/missing.jpg'), path).result())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(f'{path}.part'))
+        self.assertEqual(self.downloader.stats()['failures'], 1)
+
+    def test_percentile(self):
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile([], 50), 0)
+
+    def tearDown(self) -> None:
+        self.downloader.close()
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,114 @@
+import os
+import shutil
+import hashlib
+import unittest
+import tempfile
+from concurrent.futures import Future
+from utils.ikea import DataCollection, StoreData
+from utils.pipeline import StorageTask
+from utils.image_downloader import ImageDownloader
+from utils.image_processor import ImageProcessor, make_thumbnail, parse_size
+from testing_files.test_ikea_code.fixture_server import FixtureServer, FIXTURE_SITE
+
+IMAGE = os.path.join(FIXTURE_SITE, 'gb', 'en', 'images', 'products', 'micke-desk-oak-effect__0736020_pe740346_s5.jpg')
+
+def done(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+class ImageProcessorTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.processor = ImageProcessor((64, 48), 'webp', quality=70, max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.processor.close()
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.image = os.path.join(self.tmp_dir.name, 'desk_0_20351742.jpg')
+        shutil.copy(IMAGE, self.image)
+        return super().setUp()
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size('256'), (256, 256))
+        self.assertEqual(parse_size('320x240'), (320, 240))
+
+    def test_make_thumbnail(self):
+        from PIL import Image
+        thumbnail = make_thumbnail(self.image, (64, 48), 'jpeg', 80)
+        path = os.path.join(self.tmp_dir.name, 'desk_0_20351742.thumb.jpeg')
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (64, 48))
+            self.assertEqual(image.format, 'JPEG')
+        with open(path, 'rb') as fp:
+            self.assertEqual(thumbnail['sha256'], hashlib.sha256(fp.read()).hexdigest())
+        self.assertEqual(thumbnail['file'], 'desk_0_20351742.thumb.jpeg')
+        self.assertEqual(thumbnail['original_bytes'], os.path.getsize(IMAGE))
+        self.assertLess(thumbnail['bytes'], thumbnail['original_bytes'])
+        self.assertTrue(os.path.exists(self.image))
+
+    def test_drop_original(self):
+        make_thumbnail(self.image, (32, 32), 'webp', 80, keep_original=False)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['desk_0_20351742.thumb.webp'])
+
+    def test_process_after_download(self):
+        thumbnail = self.processor.process(done(True), self.image).result(timeout=60)
+        self.assertEqual((thumbnail['width'], thumbnail['height'], thumbnail['format']), (64, 48, 'webp'))
+        self.assertNotIn('seconds', thumbnail)
+        self.assertIsNone(self.processor.process(done(False), self.image).result(timeout=60)) # The download failed
+        broken = os.path.join(self.tmp_dir.name, 'broken.jpg')
+        with open(broken, 'wb') as fp:
+            fp.write(b'not an image')
+        self.assertIsNone(self.processor.process(done(True), broken).result(timeout=60))
+        self.assertGreaterEqual(self.processor.stats()['failures'], 1)
+
+    def test_thumbnails_in_the_record(self):
+        obj = DataCollection.__new__(DataCollection)
+        StoreData.__init__(obj)
+        obj.folder_name = 'raw_data'
+        obj.image_processor = self.processor
+        task = StorageTask({'Product_id': ['20351742'], 'Name': ['MICKE'], 'Image_link': ['a'], 'Image_all_links': [['a']]})
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name) # The data folder is relative to the working folder
+        with FixtureServer() as server:
+            obj.downloader = ImageDownloader(max_workers=2)
+            links = [server.url('/gb/en/images/products/micke-desk-oak-effect__0736020_pe740346_s5.jpg?f=s'),
+                     server.url('/gb/en/images/products/missing.jpg')]
+            task.images.set_result(obj._download_multiple_images('MICKE_', '20351742', links))
+            record = obj._task_record(task)
+            obj.downloader.close()
+        os.chdir(cwd)
+        self.assertNotIn('Thumbnails', task.dict_properties) # The record of the other sinks isn't changed
+        self.assertEqual(len(record['Thumbnails'][0]), 1)
+        self.assertEqual(record['Thumbnails'][0][0]['file'], 'MICKE__0_20351742.thumb.webp')
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, 'raw_data', '20351742', 'images', 'MICKE__0_20351742.thumb.webp')))
+
+    def test_thumbnails_of_images_not_downloaded_again(self):
+        obj = DataCollection.__new__(DataCollection)
+        StoreData.__init__(obj)
+        obj.folder_name = 'raw_data'
+        obj.image_processor = self.processor
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name) # The data folder is relative to the working folder
+        try:
+            obj.sink('images').save_thumbnails('20351742', [done({'file': 'MICKE__0_20351742.thumb.webp'}), done(None)]) # Saved by the first run
+            task = StorageTask({'Product_id': ['20351742'], 'Name': ['MICKE'], 'Image_link': ['a'], 'Image_all_links': [['a']]})
+            task.images.set_result([]) # Refreshed, the image links didn't change
+            self.assertEqual(obj._task_record(task)['Thumbnails'], [[{'file': 'MICKE__0_20351742.thumb.webp'}]])
+            task = StorageTask({'Product_id': ['10253025'], 'Name': ['BEKANT'], 'Image_link': ['a'], 'Image_all_links': [['a']]})
+            task.images.set_result([])
+            self.assertEqual(obj._task_record(task)['Thumbnails'], [[]]) # Stored before --thumbnails was set
+        finally:
+            os.chdir(cwd)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, 'raw_data', 'thumbnails', '20351742.json')))
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,83 @@
+import os
+import unittest
+import tempfile
+from unittest.mock import patch
+from utils.image_store import ImageStore
+from utils.image_downloader import ImageDownloader
+from testing_files.test_ikea_code.fixture_server import FixtureServer
+
+class ImageStoreTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = FixtureServer().__enter__()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.__exit__()
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self.tmp_dir.name, 'raw_data')
+        self.main_image = self.server.url('/gb/en/images/products/micke-desk-oak-effect__0515989_pe640126_s5.jpg?f=s')
+        return super().setUp()
+
+    def download(self, requests: list) -> ImageDownloader:
+        downloader = ImageDownloader(max_workers=4, store=ImageStore(self.folder))
+        futures = [downloader.submit(url, os.path.join(self.folder, path)) for url, path in requests]
+        self.assertTrue(all(future.result() for future in futures))
+        downloader.close()
+        return downloader
+
+    def test_same_image_is_downloaded_once(self):
+        downloader = self.download([(self.main_image, '20351742/image/MICKE___20351742.jpg'),
+                                    (self.main_image, '20351742/images/MICKE___0_20351742.jpg'),
+                                    (self.main_image, '30351743/images/MICKE___0_30351743.jpg')])
+        self.assertEqual(downloader.stats()['images'], 1)
+        self.assertEqual(downloader.stats()['deduplicated'], 2)
+        main = os.stat(os.path.join(self.folder, '20351742/image/MICKE___20351742.jpg'))
+        first = os.stat(os.path.join(self.folder, '20351742/images/MICKE___0_20351742.jpg'))
+        self.assertEqual(main.st_ino, first.st_ino) # Hardlinks of the same stored file
+
+    def test_index_is_kept_between_runs(self):
+        self.download([(self.main_image, '20351742/image/MICKE___20351742.jpg')])
+        downloader = self.download([(self.main_image, '20351742/images/MICKE___0_20351742.jpg')])
+        self.assertEqual(downloader.stats()['images'], 0)
+        self.assertTrue(os.path.exists(os.path.join(self.folder, '20351742/images/MICKE___0_20351742.jpg')))
+
+    def test_failed_download_is_retried(self):
+        downloader = ImageDownloader(max_workers=2, store=ImageStore(self.folder))
+        path = os.path.join(self.folder, '20351742/images/MICKE___0_20351742.jpg')
+        with patch.object(downloader, '_download_to_store', return_value=None): # Like a timeout
+            self.assertFalse(downloader.submit(self.main_image, path).result(timeout=10))
+        self.assertTrue(downloader.submit(self.main_image, path).result(timeout=10)) # Downloaded again
+        with patch.object(downloader.store, 'link', side_effect=RuntimeError('disk gone')):
+            self.assertFalse(downloader.submit(self.main_image, path).result(timeout=10)) # Resolved, the sinks don't wait forever
+        downloader.close()
+
+    def test_normalize_url(self):
+        self.assertEqual(ImageStore.normalize_url('HTTPS://WWW.IKEA.com/a.jpg?f=s&b=1#top'), ImageStore.normalize_url('https://www.ikea.com/a.jpg?b=1&f=s'))
+        self.assertNotEqual(ImageStore.normalize_url('https://www.ikea.com/a.jpg?f=s'), ImageStore.normalize_url('https://www.ikea.com/a.jpg?f=xl'))
+
+    def test_mark_uploaded(self):
+        store = ImageStore(self.folder)
+        self.assertFalse(store.is_uploaded('ab' * 32))
+        store.mark_uploaded('ab' * 32)
+        store.save()
+        self.assertTrue(ImageStore(self.folder).is_uploaded('ab' * 32))
+
+    def test_concurrent_stores_merge_their_index(self):
+        first, second = ImageStore(self.folder), ImageStore(self.folder) # Two jobs on the same folder
+        first.mark_uploaded('ab' * 32)
+        second.mark_uploaded('cd' * 32)
+        first.save()
+        second.save()
+        store = ImageStore(self.folder)
+        self.assertTrue(store.is_uploaded('ab' * 32) and store.is_uploaded('cd' * 32))
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
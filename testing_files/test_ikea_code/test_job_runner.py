@@ -0,0 +1,98 @@
+import os
+import json
+import unittest
+import tempfile
+import threading
+from time import perf_counter
+from unittest.mock import Mock
+from utils.metrics import METRICS
+from utils.job_runner import CrawlJob, JobRunner, JobStatus, read_jobs
+from utils.rate_limiter import HostRateLimiter, TokenBucket
+
+class JobRunnerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.jobs_file = os.path.join(self.tmp_dir.name, 'jobs.jsonl')
+        with open(self.jobs_file, 'w') as fp:
+            fp.write(json.dumps({'keyword': 'desk', 'sinks': ['local', 'images'], 'target': 10}) + '\n')
+            fp.write('# A comment\n\n')
+            fp.write(json.dumps({'keyword': ['chair', 'stool'], 'url': 'https://www.ikea.com/us/en/', 'priority': 5}) + '\n')
+            fp.write(json.dumps({'keyword': 'broken', 'priority': 1}) + '\n')
+        self.status = JobStatus(os.path.join(self.tmp_dir.name, 'jobs_status.sqlite'))
+        self.started = []
+        return super().setUp()
+
+    def scraper_factory(self, url: str):
+        scraper = Mock()
+        def scrape_data(argv):
+            self.started.append(argv[1])
+            if argv[1] == 'broken':
+                raise RuntimeError('no such element')
+        scraper.scrape_data.side_effect = scrape_data
+        return scraper
+
+    def test_read_jobs(self):
+        jobs = read_jobs(self.jobs_file)
+        self.assertEqual(len(jobs), 3)
+        self.assertEqual(jobs[0].argv(['--lean']), ['--word', 'desk', '--local', '--imgs', '--target', '10', '--lean'])
+        self.assertEqual(jobs[1].keyword, 'chair,stool')
+        with self.assertRaises(ValueError):
+            CrawlJob({'keyword': 'desk', 'sinks': ['dropbox']})
+        self.assertNotEqual(CrawlJob({'keyword': 'desk'}).job_id, CrawlJob({'keyword': 'desk', 'sinks': ['rds']}).job_id) # Not skipped as done
+        self.assertNotEqual(CrawlJob({'keyword': 'desk'}).job_id, CrawlJob({'keyword': 'desk', 'args': ['--refresh']}).job_id)
+        with open(self.jobs_file, 'a') as fp:
+            fp.write(json.dumps({'keyword': 'broken', 'priority': 3}) + '\n') # The same job again
+        with self.assertRaises(ValueError):
+            read_jobs(self.jobs_file)
+
+    def test_run_by_priority_and_track_status(self):
+        runner = JobRunner(read_jobs(self.jobs_file), self.status, num_workers=1, scraper_factory=self.scraper_factory)
+        self.assertEqual(runner.run(), {'done': 2, 'failed': 1})
+        self.assertEqual(self.started, ['chair,stool', 'broken', 'desk'])
+        self.started.clear()
+        runner.run() # Only the failed job runs again
+        self.assertEqual(self.started, ['broken'])
+        runner.run(rerun=True)
+        self.assertEqual(len(self.started), 4)
+
+    def test_metrics_are_exported_once(self):
+        scrapers = []
+        def scraper_factory(url: str):
+            scrapers.append(self.scraper_factory(url))
+            return scrapers[-1]
+        report_path = os.path.join(self.tmp_dir.name, 'run_report.json')
+        METRICS.reset()
+        METRICS.serve(0)
+        runner = JobRunner(read_jobs(self.jobs_file), self.status, num_workers=2, common_args=['--metrics-json', report_path], scraper_factory=scraper_factory)
+        runner.run()
+        self.assertTrue(all(scraper.shared_metrics for scraper in scrapers)) # The jobs don't export or stop the server themselves
+        self.assertTrue(os.path.exists(report_path))
+        self.assertIsNone(METRICS.server)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=50, burst=2)
+        start = perf_counter()
+        waits = [bucket.acquire() for _ in range(6)]
+        self.assertEqual(waits[:2], [0, 0]) # The burst goes through at once
+        self.assertGreaterEqual(perf_counter() - start, 4 / 50 * 0.9)
+
+    def test_host_rate_limiter(self):
+        limiter = HostRateLimiter(rate=100, burst=1)
+        threads = [threading.Thread(target=limiter.acquire, args=(f'https://www.ikea.com/gb/en/p/desk-{k}/',)) for k in range(5)]
+        threads.append(threading.Thread(target=limiter.acquire, args=('https://images.example.com/a.jpg',)))
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        stats = limiter.stats()
+        self.assertEqual(stats['www.ikea.com']['requests'], 5)
+        self.assertEqual(stats['images.example.com']['waited'], 0) # Another host has its own bucket
+        limiter.throttled('https://www.ikea.com/gb/en/')
+        self.assertLess(limiter.stats()['www.ikea.com']['rate'], 100)
+
+    def tearDown(self) -> None:
+        self.status.close()
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,54 @@
+import unittest
+from utils.ikea import DataCollection, StoreData
+from utils.seen_index import SeenIndex
+from utils.product_fields import IMAGE_FINGERPRINT_FIELDS, product_id_from_link, product_fingerprint
+
+class LinkFilterTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.scraper_obj = DataCollection.__new__(DataCollection) # Skips opening a browser
+        StoreData.__init__(self.scraper_obj)
+        self.links = ['https://www.ikea.com/gb/en/p/micke-desk-oak-effect-20351742/',
+                      'https://www.ikea.com/gb/en/p/smastad-desk-white-grey-with-2-drawers-s19392258/',
+                      'https://www.ikea.com/gb/en/p/bekant-corner-table-top-white-10253025/?itm_content=1']
+        return super().setUp()
+
+    def test_product_id_from_link(self):
+        self.assertEqual([product_id_from_link(link) for link in self.links], ['20351742', 'S19392258', '10253025'])
+        self.assertIsNone(product_id_from_link('https://www.ikea.com/gb/en/search/products/?q=desk'))
+
+    def test_drop_links_stored_in_every_sink(self):
+        self.scraper_obj.store_data_locally = True
+        self.scraper_obj.store_data_on_S3 = True
+        self.scraper_obj.pid_list_locally = ['20351742', 'S19392258']
+        self.scraper_obj.pid_list_s3 = ['20351742']
+        self.assertEqual(self.scraper_obj.filter_new_links(self.links), self.links[1:])
+
+    def test_refresh_keeps_old_records(self):
+        index = SeenIndex(':memory:')
+        self.scraper_obj.store_data_locally = True
+        self.scraper_obj.pid_list_locally = index.view('local:raw_data')
+        for pid in ['20351742', 'S19392258', '10253025']:
+            self.scraper_obj.pid_list_locally.append(pid)
+        index.conn.execute("UPDATE seen SET stored_at = 0 WHERE product_id = '20351742'") # Stored a long time ago
+        self.assertEqual(self.scraper_obj.filter_new_links(self.links), [])
+        self.scraper_obj.refresh = True
+        self.scraper_obj.refresh_age = 24
+        self.assertEqual(self.scraper_obj.filter_new_links(self.links), self.links[:1])
+        self.scraper_obj.refresh_age = 0
+        self.assertEqual(self.scraper_obj.filter_new_links(self.links), self.links)
+        index.close()
+
+    def test_fingerprint_ignores_uuid(self):
+        record = {'Product_id': ['20351742'], 'UUID_number': ['a'], 'Price': ['£75'], 'Name': ['MICKE'], 'Description': ['Desk'],
+                  'Image_link': ['https://www.ikea.com/a.jpg'], 'Image_all_links': [['https://www.ikea.com/a.jpg']]}
+        fingerprint = product_fingerprint(record)
+        self.assertEqual(product_fingerprint(dict(record, UUID_number=['b'])), fingerprint)
+        self.assertNotEqual(product_fingerprint(dict(record, Price=['£70'])), fingerprint)
+        self.assertEqual(product_fingerprint(dict(record, Price=['£70']), IMAGE_FINGERPRINT_FIELDS), product_fingerprint(record, IMAGE_FINGERPRINT_FIELDS))
+
+    def test_keep_links_without_sinks(self):
+        self.assertEqual(self.scraper_obj.filter_new_links(self.links), self.links)
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,95 @@
+import os
+import json
+import unittest
+import tempfile
+import urllib.request
+from unittest.mock import Mock
+from utils.metrics import Metrics, METRICS
+from utils.rate_limiter import HostRateLimiter
+from utils.ikea import DataCollection, StoreData
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.metrics = Metrics()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        return super().setUp()
+
+    def test_report(self):
+        for seconds in [0.1, 0.2, 0.3, 0.4]:
+            self.metrics.observe('page_load', seconds)
+        self.metrics.inc('images', 3)
+        self.metrics.inc('image_bytes', 1024)
+        report = self.metrics.report()
+        stage = report['stages']['page_load']
+        self.assertEqual(stage['count'], 4)
+        self.assertAlmostEqual(stage['total'], 1.0)
+        self.assertEqual(stage['p50'], 0.2)
+        self.assertEqual(stage['max'], 0.4)
+        self.assertEqual(report['counters'], {'images': 3, 'image_bytes': 1024})
+        self.assertIn('images', report['throughput'])
+
+    def test_timer_records_errors(self):
+        with self.assertRaises(ValueError):
+            with self.metrics.timer('extraction'):
+                raise ValueError('no product')
+        self.assertEqual(self.metrics.report()['stages']['extraction']['count'], 1)
+
+    def test_prometheus(self):
+        self.metrics.observe('rds_write', 0.02)
+        self.metrics.observe('rds_write', 100)
+        self.metrics.inc('rds_rows', 500)
+        text = self.metrics.to_prometheus()
+        self.assertIn('ikea_stage_seconds_bucket{stage="rds_write",le="0.025"} 1', text)
+        self.assertIn('ikea_stage_seconds_bucket{stage="rds_write",le="+Inf"} 2', text)
+        self.assertIn('ikea_stage_seconds_count{stage="rds_write"} 2', text)
+        self.assertIn('ikea_rds_rows_total 500', text)
+
+    def test_write_files(self):
+        self.metrics.inc('products')
+        report_path = os.path.join(self.tmp_dir.name, 'report.json')
+        prom_path = os.path.join(self.tmp_dir.name, 'ikea.prom')
+        self.metrics.write_report(report_path)
+        self.metrics.write_prometheus(prom_path)
+        with open(report_path) as fp:
+            self.assertEqual(json.load(fp)['counters'], {'products': 1})
+        with open(prom_path) as fp:
+            self.assertIn('ikea_products_total 1', fp.read())
+
+    def test_serve(self):
+        self.metrics.inc('pages', 2)
+        self.metrics.serve(0) # Any free port
+        try:
+            with urllib.request.urlopen(f'http://localhost:{self.metrics.server.server_port}/metrics') as response:
+                self.assertIn('ikea_pages_total 2', response.read().decode('utf-8'))
+        finally:
+            self.metrics.close()
+        self.assertIsNone(self.metrics.server)
+
+    def test_rate_limiter_feeds_metrics(self):
+        METRICS.reset()
+        limiter = HostRateLimiter(rate=100, burst=1)
+        limiter.acquire('https://www.ikea.com/gb/en/')
+        self.assertEqual(METRICS.report()['stages']['rate_limit_wait']['count'], 1)
+
+    def test_scrape_product_counts(self):
+        METRICS.reset()
+        obj = DataCollection.__new__(DataCollection)
+        StoreData.__init__(obj)
+        obj.static_engine = Mock()
+        obj.static_engine.retrieve_product_page.return_value = ({'product_id': '123'}, b'<html></html>')
+        obj.store_data_final = Mock(side_effect=[None, RuntimeError('full disk')])
+        obj.scrape_product('https://www.ikea.com/gb/en/p/desk-123/')
+        with self.assertRaises(RuntimeError):
+            obj.scrape_product('https://www.ikea.com/gb/en/p/desk-456/')
+        report = METRICS.report()
+        self.assertEqual(report['counters'], {'products': 1, 'products_failed': 1})
+        self.assertEqual(report['stages']['product']['count'], 1)
+
+    def tearDown(self) -> None:
+        self.metrics.close()
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
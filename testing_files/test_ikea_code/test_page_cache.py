@@ -0,0 +1,115 @@
+import os
+import unittest
+import tempfile
+from unittest.mock import Mock
+from utils.page_cache import PageCache, CacheMiss
+from utils.static_engine import StaticEngine
+from utils.ikea import DataCollection, StoreData
+from testing_files.test_ikea_code.fixture_server import FixtureServer
+
+PRODUCT_PATH = '/gb/en/p/micke-desk-oak-effect-20351742/'
+
+class PageCacheTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self.tmp_dir.name, 'page_cache')
+        self.cache = PageCache(self.folder)
+        return super().setUp()
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.cache.get('https://www.ikea.com/gb/en/p/a-12345678/'))
+        self.cache.put('https://www.ikea.com/gb/en/p/a-12345678/', b'<html>a</html>' * 100)
+        self.assertEqual(self.cache.get('https://WWW.ikea.com/gb/en/p/a-12345678/#reviews'), b'<html>a</html>' * 100)
+        self.assertLess(self.cache.stats()['size'], 1400) # Compressed
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_locale_is_part_of_the_key(self):
+        self.assertEqual(PageCache.locale('https://www.ikea.com/gb/en/p/a-12345678/'), 'gb/en')
+        self.cache.put('https://www.ikea.com/gb/en/p/a-12345678/', b'en', locale='gb/en')
+        self.cache.put('https://www.ikea.com/gb/en/p/a-12345678/', b'cy', locale='gb/cy')
+        self.assertEqual(self.cache.get('https://www.ikea.com/gb/en/p/a-12345678/'), b'en')
+        self.assertEqual(self.cache.get('https://www.ikea.com/gb/en/p/a-12345678/', locale='gb/cy'), b'cy')
+
+    def test_expired_pages(self):
+        cache = PageCache(self.folder, ttl=60)
+        cache.put('https://www.ikea.com/gb/en/p/a-12345678/', b'old')
+        with cache.conn:
+            cache.conn.execute('UPDATE pages SET stored_at = stored_at - 120')
+        self.assertIsNone(cache.get('https://www.ikea.com/gb/en/p/a-12345678/'))
+        cache.close()
+        replay = PageCache(self.folder, ttl=60, replay=True)
+        self.assertEqual(replay.get('https://www.ikea.com/gb/en/p/a-12345678/'), b'old') # Replay serves what was recorded
+        replay.close()
+
+    def test_lru_eviction(self):
+        cache = PageCache(self.folder, max_size=2500)
+        pages = {f'https://www.ikea.com/gb/en/p/a-1234567{k}/': os.urandom(1000) for k in range(3)} # Random bytes don't compress
+        urls = list(pages)
+        cache.put(urls[0], pages[urls[0]])
+        cache.put(urls[1], pages[urls[1]])
+        with cache.conn:
+            cache.conn.execute('UPDATE pages SET used_at = used_at - 10') # Both were used before
+        cache.get(urls[0]) # The first page is used again, the second one is now the least recently used
+        cache.put(urls[2], pages[urls[2]])
+        self.assertEqual(cache.stats()['evicted'], 1)
+        self.assertIsNone(cache.get(urls[1]))
+        self.assertEqual(cache.get(urls[0]), pages[urls[0]])
+        self.assertEqual(cache.get(urls[2]), pages[urls[2]])
+        self.assertLessEqual(cache.stats()['size'], 2500)
+        self.assertEqual(len([name for _, _, names in os.walk(self.folder) for name in names if name.endswith('.gz')]), 2)
+        cache.close()
+
+    def test_replay_miss(self):
+        replay = PageCache(self.folder, replay=True)
+        with self.assertRaises(CacheMiss):
+            replay.get('https://www.ikea.com/gb/en/p/a-12345678/')
+        replay.close()
+
+    def test_static_engine_records_and_replays(self):
+        with FixtureServer() as server:
+            url = server.url(PRODUCT_PATH)
+            engine = StaticEngine(pool_size=2, timeout=5, page_cache=self.cache)
+            self.assertEqual(engine.retrieve_product_details(url)['Product_id'], ['20351742'])
+            engine.close()
+        replay = PageCache(self.folder, replay=True)
+        engine = StaticEngine(pool_size=2, timeout=5, page_cache=replay) # The server is stopped
+        product = engine.retrieve_product_details(url)
+        self.assertEqual(product['Product_id'], ['20351742'])
+        self.assertEqual(product['Image_link'][0], server.url('/gb/en/images/products/micke-desk-oak-effect__0515989_pe640126_s5.jpg?f=s'))
+        engine.close()
+        replay.close()
+
+    def test_scrape_product_replays_without_the_browser(self):
+        with FixtureServer() as server:
+            url = server.url(PRODUCT_PATH)
+            engine = StaticEngine(pool_size=2, timeout=5, page_cache=self.cache)
+            engine.fetch(url)
+            engine.close()
+        self.cache.close()
+        obj = DataCollection.__new__(DataCollection)
+        StoreData.__init__(obj)
+        obj.page_cache = PageCache(self.folder, replay=True)
+        obj.store_data_final = Mock()
+        obj.open_product_page = Mock()
+        obj.scrape_product(url)
+        self.assertEqual(obj.store_data_final.call_args[0][0]['Product_id'], ['20351742'])
+        with self.assertRaises(CacheMiss):
+            obj.scrape_product(server.url('/gb/en/p/other-desk-12345678/'))
+        obj.open_product_page.assert_not_called()
+        obj.page_cache.close()
+
+    def test_replay_starts_no_browser(self):
+        obj = DataCollection('https://www.ikea.com/gb/en/', browser=False) # Would start Chrome and load the home page otherwise
+        obj.accept_cookies()
+        self.assertIsNone(obj.driver)
+        self.assertIsNone(obj.spawn_worker().driver) # Nor for the workers
+
+    def tearDown(self) -> None:
+        self.cache.close()
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,51 @@
+import unittest
+import threading
+from unittest.mock import patch, Mock
+from utils.ikea import DataCollection, StoreData
+from utils.wait_policy import WaitPolicy
+from utils.browser_profile import PageLoadMeter
+
+class ParallelScrapingTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.scraper_obj = DataCollection.__new__(DataCollection) # Skips opening a browser
+        StoreData.__init__(self.scraper_obj)
+        return super().setUp()
+
+    def test_claim_product_once_across_threads(self):
+        results = []
+        def claim():
+            results.append(self.scraper_obj._claim_product(self.scraper_obj.pid_list_locally, '10253025'))
+        threads = [threading.Thread(target=claim) for _ in range(8)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(self.scraper_obj.pid_list_locally, []) # Recorded only once it is stored
+        self.scraper_obj._release_product(self.scraper_obj.pid_list_locally, '10253025')
+        self.assertEqual(self.scraper_obj.pid_list_locally, ['10253025'])
+
+    def test_scrape_in_parallel_visits_every_link(self):
+        workers = []
+        self.scraper_obj.wait = WaitPolicy(None)
+        self.scraper_obj.page_meter = PageLoadMeter()
+        def spawn_worker():
+            worker = Mock()
+            worker.wait = WaitPolicy(None)
+            worker.page_meter = PageLoadMeter()
+            workers.append(worker)
+            return worker
+        self.scraper_obj.num_workers = 3
+        links = [f'https://www.ikea.com/gb/en/p/desk-{k}/' for k in range(10)]
+        self.scraper_obj.driver = Mock()
+        with patch.object(self.scraper_obj, 'spawn_worker', side_effect=spawn_worker), \
+             patch.object(self.scraper_obj, 'scrape_product') as scrape_product:
+            self.scraper_obj.scrape_in_parallel(links)
+        visited = [c.args[0] for scraper in [scrape_product] + [worker.scrape_product for worker in workers] for c in scraper.call_args_list]
+        self.assertEqual(len(workers), 2) # This scraper's browser is the third one
+        self.assertEqual(sorted(visited), sorted(links))
+        for worker in workers:
+            worker.driver.quit.assert_called_once()
+        self.scraper_obj.driver.quit.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,84 @@
+import unittest
+import threading
+from time import perf_counter
+from concurrent.futures import Future
+from utils.pipeline import StoragePipeline, StorageTask
+from utils.ikea import DataCollection, StoreData
+
+def product(product_id: str) -> dict:
+    return {'Product_id': [product_id], 'Name': ['MICKE'], 'Image_link': ['a.jpg'], 'Image_all_links': [['a.jpg']]}
+
+class StoragePipelineTest(unittest.TestCase):
+
+    def test_close_drains_every_sink(self):
+        stored = {'local': [], 'rds': []}
+        pipeline = StoragePipeline({sink: stored[sink].append for sink in stored}, maxsize=2)
+        for k in range(20):
+            pipeline.submit(StorageTask(product(f'{k:08d}')), ['local', 'rds'] if k % 2 else ['local'])
+        pipeline.close()
+        self.assertEqual(len(stored['local']), 20)
+        self.assertEqual(len(stored['rds']), 10)
+        self.assertEqual(pipeline.stats()['local']['stored'], 20)
+
+    def test_full_queue_blocks_the_producer(self):
+        release = threading.Event()
+        pipeline = StoragePipeline({'s3': lambda task: release.wait()}, maxsize=1)
+        pipeline.submit(StorageTask(product('00000001')), ['s3']) # Taken by the worker, which then waits
+        pipeline.submit(StorageTask(product('00000002')), ['s3']) # Fills the queue
+        producer = threading.Thread(target=pipeline.submit, args=(StorageTask(product('00000003')), ['s3']))
+        producer.start()
+        producer.join(0.2)
+        self.assertTrue(producer.is_alive()) # Backpressure
+        release.set()
+        producer.join()
+        pipeline.close()
+        self.assertEqual(pipeline.stats()['s3']['stored'], 3)
+
+    def test_failed_sink_does_not_block_others(self):
+        def fail(task):
+            raise OSError('disk full')
+        pipeline = StoragePipeline({'images': fail}, maxsize=1)
+        task = StorageTask(product('00000001'))
+        pipeline.submit(task, ['images'])
+        pipeline.close()
+        self.assertEqual(task.images.result(timeout=1), [])
+        self.assertEqual(pipeline.stats()['images']['failed'], 1)
+
+    def test_background_sink_reports_once_stored(self):
+        written = Future()
+        reported, done = [], []
+        pipeline = StoragePipeline({'rds': lambda task: written}, on_stored=lambda task, sink, error: reported.append((sink, error)))
+        task = StorageTask(product('00000001'), on_done=done.append)
+        task.expect(['rds'])
+        pipeline.submit(task, ['rds'])
+        pipeline.close()
+        self.assertEqual(reported, []) # Handed to the sink, not written yet
+        written.set_exception(OSError('connection lost'))
+        self.assertEqual(reported[0][0], 'rds')
+        self.assertEqual(done, [task])
+        self.assertIsInstance(task.errors['rds'], OSError)
+        self.assertEqual(pipeline.stats()['rds']['failed'], 1)
+
+    def test_store_data_final_does_not_wait_for_storage(self):
+        scraper_obj = DataCollection.__new__(DataCollection) # Skips opening a browser
+        StoreData.__init__(scraper_obj)
+        scraper_obj.store_data_on_S3 = True
+        scraper_obj.save_img = True
+        downloads = Future()
+        uploaded = []
+        scraper_obj._download_image = lambda *args: [downloads]
+        scraper_obj._download_multiple_images = lambda *args: []
+        scraper_obj.sink('s3').upload = lambda product_id, dict_properties, from_memory=False: uploaded.append(product_id)
+        scraper_obj.folder_name = 'raw_data'
+        handlers = scraper_obj.storage_handlers()
+        scraper_obj.pipeline = StoragePipeline({'images': handlers['images'], 's3': handlers['s3']})
+        start = perf_counter()
+        scraper_obj.store_data_final(product('20351742'))
+        self.assertLess(perf_counter() - start, 0.5)
+        self.assertEqual(uploaded, []) # S3 waits for the images
+        downloads.set_result(True)
+        scraper_obj.pipeline.close()
+        self.assertEqual(uploaded, ['20351742'])
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
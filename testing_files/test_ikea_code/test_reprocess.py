@@ -0,0 +1,88 @@
+import os
+import json
+import unittest
+import tempfile
+from utils.ikea import DataCollection, StoreData
+from utils.wait_policy import WaitPolicy
+from utils.static_engine import StaticEngine
+from utils.reprocess import PageArchive, extract_page, reprocess
+from testing_files.test_ikea_code.fixture_server import FixtureServer, PRODUCT_TEMPLATE
+
+def product_page(product_id: str, price: str = '75') -> bytes:
+    with open(PRODUCT_TEMPLATE) as fp:
+        page = fp.read()
+    return page.replace('20351742', product_id).replace('>75<', f'>{price}<').encode('utf-8')
+
+class ReprocessTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name) # The data folder is relative to the working folder
+        self.folder = 'raw_data'
+        self.archive = PageArchive(self.folder)
+        return super().setUp()
+
+    def new_collection(self, option: str = '--refresh') -> DataCollection:
+        collection = DataCollection.__new__(DataCollection)
+        StoreData.__init__(collection)
+        collection.wait = WaitPolicy(None)
+        collection.user_store_data_options(['--local', '--folder', self.folder, '--index', 'seen_index.sqlite', option])
+        return collection
+
+    def stored_price(self, product_id: str) -> str:
+        with open(os.path.join(self.folder, product_id, 'data.json')) as fp:
+            return json.load(fp)['Price'][0]
+
+    def test_save_and_load(self):
+        self.archive.save('20351742', product_page('20351742'), 'https://www.ikea.com/gb/en/p/micke-desk-oak-effect-20351742/')
+        html, url = self.archive.load('20351742')
+        self.assertEqual(html, product_page('20351742'))
+        self.assertEqual(url, 'https://www.ikea.com/gb/en/p/micke-desk-oak-effect-20351742/')
+        self.assertEqual([page[0] for page in self.archive.pages()], ['20351742'])
+
+    def test_extract_page(self):
+        self.archive.save('20351742', product_page('20351742'), 'https://www.ikea.com/gb/en/p/micke-desk-oak-effect-20351742/')
+        self.archive.save('00000001', b'<html><body>Please enable JavaScript</body></html>', 'https://www.ikea.com/gb/en/p/a-00000001/')
+        results = {product_id: (dict_properties, error) for product_id, dict_properties, error in map(extract_page, self.archive.pages())}
+        self.assertEqual(results['20351742'][0]['Image_link'], ['https://www.ikea.com/gb/en/images/products/micke-desk-oak-effect__0515989_pe640126_s5.jpg?f=s'])
+        self.assertIsNone(results['00000001'][0])
+        self.assertIn('not found', results['00000001'][1])
+
+    def test_reprocess_rewrites_changed_records(self):
+        for k in range(5):
+            self.archive.save(f'3000000{k}', product_page(f'3000000{k}'), f'https://www.ikea.com/gb/en/p/a-3000000{k}/')
+        collection = self.new_collection()
+        counts = reprocess(collection, self.archive, processes=2, chunksize=2)
+        collection.close_storage()
+        self.assertEqual((counts['pages'], counts['extracted'], counts['failed']), (5, 5, 0))
+        self.assertEqual(self.stored_price('30000003'), '£75')
+        with open(os.path.join(self.folder, '30000001', 'data.json')) as fp:
+            unchanged = fp.read()
+
+        self.archive.save('30000003', product_page('30000003', price='80'), 'https://www.ikea.com/gb/en/p/a-30000003/') # Like a new extraction rule
+        collection = self.new_collection()
+        reprocess(collection, self.archive, processes=2)
+        collection.close_storage()
+        self.assertEqual(self.stored_price('30000003'), '£80')
+        with open(os.path.join(self.folder, '30000001', 'data.json')) as fp:
+            self.assertEqual(fp.read(), unchanged) # Same fields, not rewritten
+
+    def test_scrape_product_archives_the_page(self):
+        collection = self.new_collection('--archive')
+        with FixtureServer() as server:
+            url = server.url('/gb/en/p/micke-desk-oak-effect-20351742/')
+            collection.static_engine = StaticEngine(pool_size=2, timeout=5)
+            collection.scrape_product(url)
+            collection.close_storage()
+        html, archived_url = collection.page_archive.load('20351742')
+        self.assertIn(b'data-product-id="20351742"', html)
+        self.assertEqual(archived_url, url)
+
+    def tearDown(self) -> None:
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,105 @@
+import os
+import json
+import unittest
+import tempfile
+import boto3
+from concurrent.futures import Future
+from unittest.mock import Mock
+from moto import mock_aws
+from utils.s3_sink import S3Sink, S3RecordSink
+from utils.image_store import ImageStore
+
+class S3SinkTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+        self.mock = mock_aws() # A local stand-in for S3, no network access is needed
+        self.mock.start()
+        self.client = boto3.client('s3', aws_access_key_id='testing', aws_secret_access_key='testing')
+        self.client.create_bucket(Bucket='test-bucket')
+        self.sink = S3Sink(self.client, 'test-bucket', max_concurrency=4)
+        return super().setUp()
+
+    def test_list_product_ids_reads_every_page(self):
+        for k in range(1005):
+            self.client.put_object(Bucket='test-bucket', Key=f'raw_data/{k:08d}/data.json', Body=b'{}')
+        self.client.put_object(Bucket='test-bucket', Key='other/00000001/data.json', Body=b'{}')
+        pid_list = self.sink.list_product_ids('raw_data/')
+        self.assertEqual(len(pid_list), 1005)
+        self.assertIn('00000000', pid_list) # lstrip('raw_data/') used to strip the leading zeros too
+        self.assertIn('00001004', pid_list)
+
+    def test_put_json_from_memory(self):
+        record = {'Product_id': ['10253025'], 'Price': ['£95']}
+        upload = self.sink.put_json('raw_data/10253025/data.json', record)
+        self.sink.wait()
+        self.assertEqual(upload.result(timeout=0), 'raw_data/10253025/data.json') # Resolved before wait() returns
+        body = self.client.get_object(Bucket='test-bucket', Key='raw_data/10253025/data.json')['Body'].read()
+        self.assertEqual(json.loads(body), record)
+        self.assertEqual(self.sink.uploaded, 1)
+
+    def test_upload_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as fp:
+            fp.write(b'\xff\xd8image')
+        self.sink.upload_file(fp.name, 'raw_data/image_store/ab/ab.jpg')
+        self.sink.wait()
+        os.remove(fp.name)
+        body = self.client.get_object(Bucket='test-bucket', Key='raw_data/image_store/ab/ab.jpg')['Body'].read()
+        self.assertEqual(body, b'\xff\xd8image')
+
+    def test_failed_upload_is_reported(self):
+        sink = S3Sink(self.client, 'missing-bucket')
+        upload = sink.put_bytes('raw_data/10253025/data.json', b'{}')
+        sink.close()
+        self.assertEqual(sink.failures, ['raw_data/10253025/data.json'])
+        self.assertIsNotNone(upload.exception(timeout=0)) # The record isn't confirmed
+
+    def test_folder_is_removed_after_reading_the_thumbnails(self):
+        collection = Mock(folder_name='raw_data', store_data_locally=False, s3_sink=self.sink)
+        collection.downloader.store = None
+        collection._task_record.side_effect = lambda task: {'Product_id': [task.product_id]}
+        task = Mock(product_id='10253025', images=Future())
+        task.images.set_result([])
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                os.makedirs('raw_data/10253025/thumbnails')
+                with open('raw_data/10253025/thumbnails/10253025_0.webp', 'wb') as fp:
+                    fp.write(b'RIFFthumb')
+                stored = S3RecordSink(collection).store(task)
+                self.assertFalse(os.path.exists('raw_data/10253025')) # Removed while the uploads may still run
+                self.assertTrue(stored.result(timeout=10))
+            finally:
+                os.chdir(cwd)
+        body = self.client.get_object(Bucket='test-bucket', Key='raw_data/10253025/thumbnails/10253025_0.webp')['Body'].read()
+        self.assertEqual(body, b'RIFFthumb')
+
+    def test_blob_is_marked_uploaded_once_on_s3(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = ImageStore(tmp_dir)
+            sha = 'ab' * 32
+            os.makedirs(os.path.dirname(store.blob_path(sha)))
+            with open(store.blob_path(sha), 'wb') as fp:
+                fp.write(b'\xff\xd8image')
+            broken = S3Sink(self.client, 'missing-bucket')
+            collection = Mock(s3_sink=broken)
+            collection.downloader.store = store
+            record_sink = S3RecordSink(collection)
+            upload = record_sink._upload_blob(sha, 'raw_data/image_store/ab/ab.jpg')
+            broken.close()
+            self.assertIsNotNone(upload.exception(timeout=0))
+            self.assertFalse(store.is_uploaded(sha)) # Uploaded again by the next product
+            collection.s3_sink = self.sink
+            upload = record_sink._upload_blob(sha, 'raw_data/image_store/ab/ab.jpg')
+            self.sink.wait()
+            self.assertTrue(store.is_uploaded(sha))
+            self.assertIs(record_sink._upload_blob(sha, 'raw_data/image_store/ab/ab.jpg'), upload) # Shared while this run goes on
+
+    def tearDown(self) -> None:
+        self.sink.close()
+        self.mock.stop()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,118 @@
+import os
+import json
+import unittest
+import tempfile
+import threading
+from utils.seen_index import SeenIndex
+from utils.ikea import DataCollection, StoreData
+
+class SeenIndexTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'seen_index.sqlite')
+        self.index = SeenIndex(self.path)
+        return super().setUp()
+
+    def test_view_behaves_like_a_list(self):
+        view = self.index.view('local:raw_data')
+        self.assertNotIn('10253025', view)
+        view.append('10253025')
+        self.assertIn('10253025', view)
+        self.assertNotIn('10253025', self.index.view('s3:bucket/raw_data'))
+        self.assertEqual(len(view), 1)
+
+    def test_index_is_persistent(self):
+        self.index.add('rds:table_name', '10253025')
+        self.index.close()
+        self.index = SeenIndex(self.path)
+        self.assertTrue(self.index.contains('rds:table_name', '10253025'))
+
+    def test_reconcile_replaces_sink(self):
+        self.index.add('local:raw_data', 'deleted')
+        self.index.reconcile('local:raw_data', ['00487652', '10253025'])
+        self.assertEqual(sorted(self.index.product_ids('local:raw_data')), ['00487652', '10253025'])
+
+    def test_reconcile_keeps_fingerprints(self):
+        self.index.add('local:raw_data', '10253025', 'abc')
+        self.index.reconcile('local:raw_data', ['00487652', '10253025'])
+        self.assertEqual(self.index.fingerprint('local:raw_data', '10253025'), 'abc')
+        self.assertIsNone(self.index.fingerprint('local:raw_data', '00487652'))
+
+    def test_refresh_claims_changed_products(self):
+        scraper_obj = DataCollection.__new__(DataCollection)
+        StoreData.__init__(scraper_obj)
+        scraper_obj.refresh = True
+        view = self.index.view('rds:table_name')
+        self.assertTrue(scraper_obj._claim_product(view, '10253025', 'price-95'))
+        scraper_obj._release_product(view, '10253025', 'price-95') # Stored by the sink
+        self.index.conn.execute("UPDATE seen SET stored_at = 0") # Stored a long time ago
+        self.assertFalse(scraper_obj._claim_product(view, '10253025', 'price-95'))
+        self.assertGreater(view.stored_at('10253025'), 0) # Recorded as checked
+        self.assertTrue(scraper_obj._claim_product(view, '10253025', 'price-85'))
+        self.assertEqual(view.fingerprint('10253025'), 'price-95') # Until the new record is stored
+        scraper_obj._release_product(view, '10253025', 'price-85')
+        self.assertEqual(view.fingerprint('10253025'), 'price-85')
+        scraper_obj.refresh = False
+        self.assertFalse(scraper_obj._claim_product(view, '10253025', 'price-75'))
+
+    def test_claim_product_once_across_threads(self):
+        scraper_obj = DataCollection.__new__(DataCollection) # Skips opening a browser
+        StoreData.__init__(scraper_obj)
+        view = self.index.view('local:raw_data')
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(scraper_obj._claim_product(view, '10253025'))) for _ in range(8)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(results.count(True), 1)
+
+    def test_failed_store_is_not_indexed(self):
+        scraper_obj = DataCollection.__new__(DataCollection)
+        StoreData.__init__(scraper_obj)
+        scraper_obj.store_data_locally = True
+        scraper_obj.pid_list_locally = self.index.view('local:raw_data')
+        def fail(task):
+            raise OSError('disk full')
+        scraper_obj.sink('local').store = fail
+        done = []
+        record = {'Product_id': ['10253025'], 'Name': ['MICKE'], 'Image_link': ['a'], 'Image_all_links': [['a']]}
+        scraper_obj.store_data_final(record, on_done=done.append)
+        self.assertNotIn('10253025', scraper_obj.pid_list_locally)
+        self.assertEqual(list(done[0].errors), ['local'])
+        self.assertEqual(scraper_obj.filter_new_links(['https://www.ikea.com/gb/en/p/micke-desk-10253025/']), ['https://www.ikea.com/gb/en/p/micke-desk-10253025/'])
+        scraper_obj.sink('local').store = lambda task: None
+        scraper_obj.store_data_final(record) # Claimed again, the failure released it
+        self.assertIn('10253025', scraper_obj.pid_list_locally)
+
+    def test_check_data_exist_locally(self):
+        scraper_obj = DataCollection.__new__(DataCollection)
+        StoreData.__init__(scraper_obj)
+        scraper_obj.folder_name = os.path.relpath(os.path.join(self.tmp_dir.name, 'raw_data'))
+        for pid in ['10253025', '10473555']:
+            os.makedirs(os.path.join(scraper_obj.folder_name, pid))
+            with open(os.path.join(scraper_obj.folder_name, pid, 'data.json'), 'w') as fp:
+                json.dump({'Product_id': [pid]}, fp)
+        os.makedirs(os.path.join(scraper_obj.folder_name, 'image_store'))
+        scraper_obj.pid_list_locally = self.index.view('local:raw_data')
+        scraper_obj.check_data_exist_locally()
+        self.assertEqual(sorted(scraper_obj.pid_list_locally), ['10253025', '10473555'])
+
+    def test_check_data_exist_locally_before_the_index(self):
+        scraper_obj = DataCollection.__new__(DataCollection)
+        StoreData.__init__(scraper_obj)
+        scraper_obj.folder_name = os.path.relpath(os.path.join(self.tmp_dir.name, 'raw_data'))
+        os.makedirs(os.path.join(scraper_obj.folder_name, '10253025'))
+        with open(os.path.join(scraper_obj.folder_name, '10253025', 'data.json'), 'w') as fp:
+            json.dump({'Product_id': ['10253025']}, fp)
+        scraper_obj.check_data_exist_locally() # The list is still a plain list
+        scraper_obj.check_images_exist()
+        self.assertEqual(scraper_obj.pid_list_locally, ['10253025'])
+        self.assertEqual(scraper_obj.pid_list_images, [])
+
+    def tearDown(self) -> None:
+        self.index.close()
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,107 @@
+import os
+import json
+import unittest
+import tempfile
+from unittest.mock import patch
+from utils.segment_store import SegmentStore, migrate
+from utils.seen_index import SeenIndex
+from utils.ikea import DataCollection, StoreData
+
+def product(product_id: str, price: str = '£95') -> dict:
+    return {'Product_id': [product_id], 'UUID_number': ['a055f6bc-5875-4f0f-9bee-8638e42788cd'], 'Price': [price], 'Name': ['BEKANT'],
+            'Description': ['Left-hand corner table top, white,'], 'Image_link': ['https://www.ikea.com/a.jpg?f=s'],
+            'Image_all_links': [['https://www.ikea.com/a.jpg?f=s', 'https://www.ikea.com/b.jpg?f=s']]}
+
+class SegmentStoreTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self.tmp_dir.name, 'raw_data')
+        return super().setUp()
+
+    def check_format(self, fmt: str):
+        store = SegmentStore(self.folder, fmt, segment_size=4, batch_size=3)
+        for k in range(10):
+            store.append(product(f'{k:08d}'))
+        store.append(product('00000002', '£85')) # Stored again
+        store.close()
+        store = SegmentStore(self.folder, fmt, segment_size=4, batch_size=3)
+        self.assertEqual(len(store), 10)
+        self.assertEqual(store.get('00000007'), product('00000007'))
+        self.assertEqual(store.get('00000002')['Price'], ['£85'])
+        self.assertIsNone(store.get('10253025'))
+        store.close()
+        return [name for name in os.listdir(store.root) if name != 'index.sqlite']
+
+    def test_jsonl(self):
+        self.assertEqual(len(self.check_format('jsonl')), 4) # Batches of 3 in segments of 4 records
+
+    def test_jsonl_gz(self):
+        self.assertTrue(all(name.endswith('.jsonl.gz') for name in self.check_format('jsonl.gz')))
+
+    @unittest.skipUnless(__import__('importlib').util.find_spec('pyarrow'), 'pip install pyarrow to test Parquet segments')
+    def test_parquet(self):
+        self.check_format('parquet')
+
+    def test_flush_by_interval(self):
+        store = SegmentStore(self.folder, 'jsonl', batch_size=100, flush_interval=0.05)
+        written = store.append(product('10253025'))
+        self.assertTrue(written.result(timeout=1)) # Written before the batch is full
+        self.assertEqual(store.conn.execute('SELECT COUNT(*) FROM records').fetchone()[0], 1)
+        store.close()
+
+    def test_failed_batch_is_reported(self):
+        store = SegmentStore(self.folder, 'jsonl', batch_size=2, flush_interval=60)
+        with patch.object(store, '_write_jsonl', side_effect=OSError('No space left on device')):
+            written = [store.append(product(f'{k:08d}')) for k in range(2)]
+        self.assertTrue(all(isinstance(future.exception(timeout=0), OSError) for future in written)) # Not recorded in the index
+        self.assertEqual(store.product_ids(), [])
+        store.close()
+
+    def test_migrate(self):
+        for pid in ['10253025', '10473555']:
+            os.makedirs(os.path.join(self.folder, pid, 'images'))
+            with open(os.path.join(self.folder, pid, 'data.json'), 'w') as fp:
+                json.dump(product(pid), fp)
+        os.makedirs(os.path.join(self.folder, '20351742'))
+        with open(os.path.join(self.folder, '20351742', 'data.json'), 'w') as fp:
+            json.dump(product('20351742'), fp)
+        store = SegmentStore(self.folder, 'jsonl.gz')
+        self.assertEqual(migrate(self.folder, store, remove=True), 3)
+        self.assertEqual(sorted(store.product_ids()), ['10253025', '10473555', '20351742'])
+        self.assertFalse(os.path.exists(os.path.join(self.folder, '20351742')))
+        self.assertTrue(os.path.exists(os.path.join(self.folder, '10253025', 'images'))) # The images stay
+        store.close()
+
+    def test_failed_migration_keeps_the_records(self):
+        os.makedirs(os.path.join(self.folder, '10253025'))
+        with open(os.path.join(self.folder, '10253025', 'data.json'), 'w') as fp:
+            json.dump(product('10253025'), fp)
+        store = SegmentStore(self.folder, 'jsonl')
+        with patch.object(store, '_write_jsonl', side_effect=OSError('No space left on device')):
+            with self.assertRaises(OSError):
+                migrate(self.folder, store, remove=True)
+        self.assertTrue(os.path.exists(os.path.join(self.folder, '10253025', 'data.json')))
+        store.close()
+
+    def test_store_locally_in_segments(self):
+        scraper_obj = DataCollection.__new__(DataCollection) # Skips opening a browser
+        StoreData.__init__(scraper_obj)
+        scraper_obj.folder_name = self.folder
+        scraper_obj.segment_store = SegmentStore(self.folder, 'jsonl')
+        scraper_obj.pid_list_locally = []
+        scraper_obj.store_raw_data_locally(product('10253025'), '10253025')
+        self.assertFalse(os.path.exists(os.path.join(self.folder, '10253025')))
+        index = SeenIndex(':memory:')
+        scraper_obj.pid_list_locally = index.view(f'local:{self.folder}')
+        scraper_obj.check_data_exist_locally() # Rebuilt from the segment index
+        self.assertEqual(list(scraper_obj.pid_list_locally), ['10253025'])
+        scraper_obj.segment_store.close()
+        index.close()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import argparse
+import unittest
+import tempfile
+import subprocess
+from utils.ikea import DataCollection, StoreData
+from utils.wait_policy import WaitPolicy
+from utils.sinks import Sink, SINK_PLUGINS, IMPORT_TIMES, register_sink, load_sink, import_seconds
+
+HEAVY_MODULES = ['pandas', 'boto3', 'sqlalchemy', 'selenium.webdriver']
+
+class MemorySink(Sink):
+    name = 'local'
+
+    def __init__(self, collection):
+        super().__init__(collection)
+        self.stored = []
+
+    def index_key(self) -> str:
+        return 'memory:test'
+
+    def stored_ids(self) -> list:
+        return ['00000001']
+
+    def store(self, task):
+        self.stored.append(task.product_id)
+
+def loaded_modules(code: str, cwd: str = None) -> list:
+    check = f"{code}\nimport sys, json; print(json.dumps([name for name in {HEAVY_MODULES} if name in sys.modules]))"
+    result = subprocess.run([sys.executable, '-c', check], check=True, capture_output=True, text=True, cwd=cwd,
+                            env=dict(os.environ, PYTHONPATH=os.getcwd()))
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+class SinksTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.plugins = dict(SINK_PLUGINS)
+        return super().setUp()
+
+    def test_import_is_light(self):
+        self.assertEqual(loaded_modules('import utils.ikea'), [])
+
+    def test_local_run_imports_no_cloud_backend(self):
+        code = ('from utils.ikea import DataCollection, StoreData\nfrom utils.wait_policy import WaitPolicy\n'
+                'obj = DataCollection.__new__(DataCollection)\nStoreData.__init__(obj)\nobj.wait = WaitPolicy(None)\n'
+                "obj.user_store_data_options(['--local', '--imgs'])\nobj.close_storage()")
+        self.assertEqual(loaded_modules(code, cwd=self.tmp_dir.name), [])
+
+    def test_load_sink_records_import_time(self):
+        self.assertEqual(load_sink('local').__name__, 'LocalSink')
+        self.assertIn('local', IMPORT_TIMES)
+        with self.assertRaises(ValueError):
+            load_sink('ftp')
+
+    def test_registered_sink_stores_the_records(self):
+        register_sink('local', 'testing_files.test_ikea_code.test_sinks:MemorySink')
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        try:
+            obj = DataCollection.__new__(DataCollection)
+            StoreData.__init__(obj)
+            obj.wait = WaitPolicy(None)
+            obj.user_store_data_options(['--local', '--target', '1'])
+            self.assertEqual(list(obj.pid_list_locally), ['00000001']) # Read from the sink
+            obj.pipeline.close()
+            obj.pipeline = None # Stored before returning
+            obj.store_data_final({'Product_id': ['20351742'], 'Name': ['MICKE'], 'Image_link': ['a'], 'Image_all_links': [['a']]})
+            obj.close_storage()
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(obj.sink('local').stored, ['20351742'])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, 'raw_data', '20351742')))
+
+    def test_images_sink_closes_the_default_downloader(self):
+        obj = DataCollection.__new__(DataCollection)
+        StoreData.__init__(obj)
+        obj.folder_name = os.path.join(self.tmp_dir.name, 'raw_data')
+        default = obj.downloader
+        obj.sink('images').open(argparse.Namespace(image_workers=2, thumbnails=False))
+        self.assertIsNot(obj.downloader, default)
+        self.assertTrue(default.executor._shutdown) # Its threads and connections aren't left behind
+        obj.downloader.close()
+
+    def test_import_seconds(self):
+        self.assertGreater(import_seconds('json', runs=1), 0)
+
+    def tearDown(self) -> None:
+        SINK_PLUGINS.clear()
+        SINK_PLUGINS.update(self.plugins)
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
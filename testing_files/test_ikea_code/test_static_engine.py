@@ -0,0 +1,42 @@
+import unittest
+from utils.static_engine import StaticEngine, ExtractionError
+from testing_files.test_ikea_code.fixture_server import FixtureServer
+
+class StaticEngineTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = FixtureServer().__enter__()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.__exit__()
+
+    def setUp(self) -> None:
+        self.engine = StaticEngine(pool_size=2, timeout=5)
+        return super().setUp()
+
+    def test_retrieve_product_details(self):
+        product = self.engine.retrieve_product_details(self.server.url('/gb/en/p/micke-desk-oak-effect-20351742/'))
+        self.assertEqual(product['Product_id'], ['20351742'])
+        self.assertEqual(product['Price'], ['£75'])
+        self.assertEqual(product['Name'], ['MICKE'])
+        self.assertEqual(product['Description'], ['Desk, oak effect,'])
+        self.assertEqual(len(product['UUID_number'][0]), 36)
+        self.assertEqual(product['Image_link'], [self.server.url('/gb/en/images/products/micke-desk-oak-effect__0515989_pe640126_s5.jpg?f=s')])
+        self.assertEqual(len(product['Image_all_links'][0]), 3)
+        self.assertEqual(product['Image_all_links'][0][0], product['Image_link'][0])
+
+    def test_missing_page_falls_back(self):
+        self.assertIsNone(self.engine.retrieve_product_details(self.server.url('/gb/en/p/not-a-product-00000000/')))
+
+    def test_parse_raises_on_missing_field(self):
+        with self.assertRaises(ExtractionError):
+            self.engine.parse('<html><body><h1>Please enable JavaScript</h1></body></html>')
+
+    def tearDown(self) -> None:
+        self.engine.close()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
@@ -0,0 +1,62 @@
+import unittest
+from time import perf_counter
+from unittest.mock import Mock
+from utils.wait_policy import WaitPolicy
+
+class WaitPolicyTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.driver = Mock()
+        self.wait = WaitPolicy(self.driver, timeout=2, poll_frequency=0.01, idle_time=0.05)
+        return super().setUp()
+
+    def test_count_stable_waits_for_new_results(self):
+        counts = iter([24, 24, 48, 48, 48] + [48] * 100)
+        self.driver.find_elements.side_effect = lambda by, value: [None] * next(counts)
+        self.assertTrue(self.wait.count_stable('//a', min_count=25))
+        self.assertEqual(self.wait.report()['count_stable']['calls'], 1)
+
+    def test_network_idle_passes_fast_pages(self):
+        self.driver.execute_script.return_value = ['complete', 12]
+        start = perf_counter()
+        self.assertTrue(self.wait.network_idle())
+        self.assertLess(perf_counter() - start, 0.5)
+
+    def test_settled_page_skips_the_idle_time(self):
+        wait = WaitPolicy(self.driver, timeout=2, poll_frequency=0.01, idle_time=1)
+        self.driver.find_elements.return_value = [None] * 24
+        self.driver.execute_script.return_value = True # Loaded and no request for idle_time
+        start = perf_counter()
+        self.assertTrue(wait.count_stable('//a', min_count=24))
+        self.assertLess(perf_counter() - start, 0.5)
+
+    def test_busy_page_waits_for_the_idle_time(self):
+        self.driver.find_elements.return_value = [None] * 24
+        self.driver.execute_script.return_value = False # Still loading resources
+        start = perf_counter()
+        self.assertTrue(self.wait.count_stable('//a', min_count=24))
+        self.assertGreaterEqual(perf_counter() - start, 0.05)
+
+    def test_settled_page_without_new_results_stops_early(self):
+        self.driver.find_elements.return_value = [None] * 24
+        self.driver.execute_script.return_value = True # 'show more' added nothing and the page is idle
+        start = perf_counter()
+        self.assertFalse(self.wait.count_stable('//a', min_count=25))
+        self.assertLess(perf_counter() - start, 0.5)
+        self.assertEqual(self.wait.report()['count_stable']['timeouts'], 0)
+
+    def test_timeout_is_reported(self):
+        self.driver.find_elements.return_value = []
+        self.driver.execute_script.return_value = False # Still loading resources
+        self.assertIsNone(self.wait.count_stable('//a', timeout=0.1))
+        self.assertEqual(self.wait.report()['count_stable']['timeouts'], 1)
+
+    def test_merge_adds_worker_times(self):
+        worker_wait = WaitPolicy(Mock())
+        worker_wait.waited['element_present'] += 1.5
+        worker_wait.calls['element_present'] += 3
+        self.wait.merge(worker_wait)
+        self.assertEqual(self.wait.report()['element_present'], {'calls': 3, 'timeouts': 0, 'seconds': 1.5})
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
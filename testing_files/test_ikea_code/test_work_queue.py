@@ -0,0 +1,177 @@
+import os
+import json
+import unittest
+import tempfile
+import threading
+import multiprocessing
+from time import sleep, perf_counter
+from unittest.mock import Mock
+from concurrent.futures import Future
+from utils.ikea import DataCollection, StoreData
+from utils.wait_policy import WaitPolicy
+from utils.static_engine import StaticEngine
+from utils.pipeline import StoragePipeline
+from utils.work_queue import SQLiteWorkQueue, RedisWorkQueue, open_work_queue
+from testing_files.test_ikea_code.fixture_server import FixtureServer, FixtureSite
+from testing_files.benchmarks.benchmark_pipeline import run_nodes
+
+LINKS = [f'https://www.ikea.com/gb/en/p/desk-{k:08d}/' for k in range(6)]
+
+def drain(path: str, worker: str) -> list:
+    work_queue = SQLiteWorkQueue(path)
+    claimed = []
+    while True:
+        link = work_queue.claim(worker)
+        if link is None:
+            break
+        claimed.append(link)
+        work_queue.complete(link, worker)
+    work_queue.close()
+    return claimed
+
+def redis_available() -> bool:
+    try:
+        import redis
+        return redis.Redis.from_url('redis://localhost:6379/15').ping()
+    except Exception:
+        return False
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'work_queue.sqlite')
+        self.queue = SQLiteWorkQueue(self.path, lease=60, max_attempts=2)
+        return super().setUp()
+
+    def test_publish_and_claim(self):
+        self.assertFalse(self.queue.drained()) # Nothing published yet
+        self.assertEqual(self.queue.publish(LINKS[:4]), 4)
+        self.assertEqual(self.queue.publish(LINKS), 2) # Only the new links
+        self.assertEqual(self.queue.claim('a'), LINKS[0])
+        self.assertEqual(self.queue.claim('b'), LINKS[1])
+        self.queue.complete(LINKS[0], 'a')
+        self.assertEqual(self.queue.counts(), {'done': 1, 'leased': 1, 'pending': 4})
+        for link in LINKS[2:]:
+            self.assertEqual(self.queue.claim('a'), link)
+            self.queue.complete(link, 'a')
+        self.assertIsNone(self.queue.claim('a'))
+        self.assertFalse(self.queue.drained()) # b still has a lease
+        self.queue.complete(LINKS[1], 'b')
+        self.assertTrue(self.queue.drained())
+
+    def test_expired_lease_is_claimed_again(self):
+        work_queue = SQLiteWorkQueue(self.path, lease=0.05, max_attempts=2)
+        work_queue.publish(LINKS[:1])
+        self.assertEqual(work_queue.claim('a'), LINKS[0])
+        self.assertIsNone(work_queue.claim('b')) # Still leased to a
+        sleep(0.1)
+        self.assertEqual(work_queue.claim('b'), LINKS[0]) # a stopped
+        work_queue.fail(LINKS[0], 'a', 'too late') # Not a's lease anymore
+        self.assertEqual(work_queue.counts(), {'leased': 1})
+        sleep(0.1)
+        self.assertIsNone(work_queue.claim('c')) # Claimed max_attempts times
+        self.assertEqual(work_queue.counts(), {'failed': 1})
+        self.assertTrue(work_queue.drained())
+        work_queue.close()
+
+    def test_failed_link_is_retried(self):
+        self.queue.publish(LINKS[:1])
+        self.assertEqual(self.queue.claim('a'), LINKS[0])
+        self.queue.fail(LINKS[0], 'a', 'timeout')
+        self.assertEqual(self.queue.claim('b'), LINKS[0])
+        self.queue.fail(LINKS[0], 'b', 'timeout')
+        self.assertEqual(self.queue.counts(), {'failed': 1})
+
+    def test_nodes_never_share_a_link(self):
+        links = [f'https://www.ikea.com/gb/en/p/desk-{k:08d}/' for k in range(200)]
+        self.queue.publish(links)
+        with multiprocessing.get_context('spawn').Pool(3) as pool:
+            claimed = pool.starmap(drain, [(self.path, f'node{k}') for k in range(3)])
+        self.assertEqual(sorted(sum(claimed, [])), sorted(links)) # Each link exactly once
+        self.assertEqual(self.queue.counts(), {'done': 200})
+
+    def test_open_work_queue(self):
+        work_queue = open_work_queue(os.path.join(self.tmp_dir.name, 'queues', 'other.sqlite'))
+        self.assertIsInstance(work_queue, SQLiteWorkQueue)
+        work_queue.close()
+
+    def test_worker_scrapes_from_the_queue(self):
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name) # The data folder is relative to the working folder
+        collection = DataCollection.__new__(DataCollection)
+        StoreData.__init__(collection)
+        collection.wait = WaitPolicy(None)
+        collection.user_store_data_options(['--local', '--queue', 'work_queue.sqlite', '--max-attempts', '1'])
+        collection.queue_poll = 0.05
+        try:
+            with FixtureServer() as server:
+                collection.work_queue.publish([server.url('/gb/en/p/micke-desk-oak-effect-20351742/'), server.url('/gb/en/p/missing-00000001/')])
+                collection.static_engine = StaticEngine(pool_size=2, timeout=5)
+                collection.scrape_from_queue() # The missing page falls back to the browser, which isn't there
+                self.assertEqual(collection.work_queue.counts(), {'done': 1, 'failed': 1})
+                collection.close_storage()
+            with open(os.path.join('raw_data', '20351742', 'data.json')) as fp:
+                self.assertEqual(json.load(fp)['Product_id'], ['20351742'])
+        finally:
+            os.chdir(cwd)
+
+    def test_link_is_completed_once_stored(self):
+        collection = DataCollection.__new__(DataCollection)
+        StoreData.__init__(collection)
+        collection.work_queue = SQLiteWorkQueue(self.path, max_attempts=1)
+        collection.queue_poll = 0.01
+        collection.store_data_locally = True
+        written = {f'{k:08d}': Future() for k in range(2)}
+        collection.pipeline = StoragePipeline({'local': lambda task: written[task.product_id]}, on_stored=collection._product_stored)
+        collection.open_product_page = Mock()
+        collection.retrieve_product_details = Mock(side_effect=[{'Product_id': [product_id], 'Name': ['MICKE'], 'Image_link': ['a.jpg'],
+                                                                 'Image_all_links': [['a.jpg']]} for product_id in written])
+        collection.work_queue.publish(LINKS[:2])
+        worker = threading.Thread(target=collection.scrape_from_queue)
+        worker.start()
+        start = perf_counter()
+        while collection.retrieve_product_details.call_count < 2 and perf_counter() - start < 5:
+            sleep(0.01)
+        sleep(0.05)
+        self.assertEqual(collection.work_queue.counts(), {'leased': 2}) # Scraped, not stored yet
+        self.assertTrue(worker.is_alive())
+        written['00000000'].set_result(True)
+        written['00000001'].set_exception(OSError('connection lost'))
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(collection.work_queue.counts(), {'done': 1, 'failed': 1})
+        collection.pipeline.close()
+        collection.work_queue.close()
+
+    def test_run_nodes(self):
+        with FixtureSite(num_products=12) as site:
+            run = run_nodes(site, num_products=12, num_nodes=2)
+        self.assertEqual(run['products'], 12)
+        self.assertEqual(len(run['per_node']), 2)
+
+    @unittest.skipUnless(redis_available(), 'A Redis server on localhost and the redis package are needed')
+    def test_redis_queue(self):
+        work_queue = RedisWorkQueue('redis://localhost:6379/15', lease=0.05, max_attempts=2, name='ikea_test_queue')
+        work_queue.client.delete(*[f'ikea_test_queue:{key}' for key in ['pending', 'leases', 'attempts', 'status', 'published', 'errors', 'workers']])
+        self.assertEqual(work_queue.publish(LINKS[:2]), 2)
+        self.assertEqual(work_queue.publish(LINKS[:2]), 0)
+        self.assertEqual(work_queue.claim('a'), LINKS[0])
+        work_queue.complete(LINKS[0], 'a')
+        self.assertEqual(work_queue.claim('a'), LINKS[1])
+        sleep(0.1)
+        self.assertEqual(work_queue.claim('b'), LINKS[1]) # The lease of a expired
+        work_queue.fail(LINKS[1], 'a', 'timeout') # Leased to b now, nothing changes
+        self.assertEqual(work_queue.counts(), {'done': 1, 'leased': 1})
+        work_queue.fail(LINKS[1], 'b', 'timeout')
+        self.assertEqual(work_queue.counts(), {'done': 1, 'failed': 1})
+        self.assertTrue(work_queue.drained())
+        work_queue.close()
+
+    def tearDown(self) -> None:
+        self.queue.close()
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+if __name__ == "__main__":
+    unittest.main(argv=[""], verbosity=3, exit=True)
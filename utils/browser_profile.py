@@ -0,0 +1,258 @@
+'''
+This code is to work on Data Collection Pipeline project
+It sets up the Chrome options of the scraper and measures how long each page takes to load and how many bytes it downloads
+'''
+import os
+import copy
+import threading
+from typing import TYPE_CHECKING
+from utils.metrics import percentile
+if TYPE_CHECKING:
+    from selenium.webdriver.chrome.options import Options # Only for the annotations, selenium.webdriver is slow to import
+
+# URL patterns (Chrome DevTools wildcards) of each resource type that can be blocked
+RESOURCE_PATTERNS = {
+    'image': ['*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.avif*', '*.svg*', '*.ico*'],
+    'font': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*.eot*'],
+    'media': ['*.mp4*', '*.webm*', '*.m3u8*', '*.mp3*'],
+    'stylesheet': ['*.css*'],
+}
+
+# Analytics, ads and other third-party scripts the product details don't need
+TRACKER_PATTERNS = ['*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*facebook.net*', '*connect.facebook*',
+                    '*hotjar.com*', '*optimizely.com*', '*bat.bing.com*', '*pinterest.com*', '*analytics.tiktok.com*', '*snapchat.com*',
+                    '*demdex.net*', '*omtrdc.net*', '*adobedtm.com*', '*criteo*', '*quantummetric.com*', '*clarity.ms*']
+
+DEFAULT_BLOCK_TYPES = ['image', 'font', 'media']
+
+# Reads the timing of the page and of its resources from the browser (transferSize is 0 for cached or cross-origin resources without Timing-Allow-Origin)
+PAGE_LOAD_SCRIPT = '''
+const navigation = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+return {load_ms: navigation ? navigation.domContentLoadedEventEnd : null,
+        bytes: (navigation ? navigation.transferSize : 0) + resources.reduce((total, entry) => total + (entry.transferSize || 0), 0),
+        requests: resources.length + 1};
+'''
+
+def add_arguments(parser):
+
+    '''
+    Adds the browser profile options to an argparse parser (see BrowserProfile.from_args)
+    '''
+    parser.add_argument('--lean', action='store_true', default=False, help='Start Chrome with the eager page load strategy, blocking images, fonts, media and trackers')
+    parser.add_argument('--block', type=str, default=','.join(DEFAULT_BLOCK_TYPES), help=f'With --lean, resource types to block among {list(RESOURCE_PATTERNS)} (ex: image,font)')
+    parser.add_argument('--block-url', type=str, action='append', default=[], help='With --lean, an extra URL pattern to block, can be repeated (ex: *youtube.com*)')
+    parser.add_argument('--profile-dir', type=str, default=None, help='Keep the Chrome profile (cookies consent included) in this folder between runs (ex: chrome_profile)')
+    parser.add_argument('--attach', type=str, action='append', default=[], help='Use a running Chrome started with --remote-debugging-port, can be repeated for the workers (ex: 127.0.0.1:9222)')
+
+class BrowserProfile:
+
+    '''
+    This class builds the Chrome options of a session. The lean profile loads only what the scraper reads.
+    A session can keep its profile folder between runs or attach to a running Chrome instead of starting one.
+    It has the following methods:
+
+    __init__(self, lean: bool = False, block_types: list = DEFAULT_BLOCK_TYPES, block_patterns: list = None, user_data_dir: str = None, debugger_addresses: list = None)
+    from_args(args)
+    for_worker(self, worker_id: int)
+    blocked_urls(self)
+    options(self, headless: bool = False)
+    apply(self, driver)
+    '''
+    def __init__(self, lean: bool = False, block_types: list = DEFAULT_BLOCK_TYPES, block_patterns: list = None, user_data_dir: str = None, debugger_addresses: list = None):
+
+        '''
+        This function initialize the profile.
+
+        Parameters
+        ----------
+        lean (bool)
+            Uses the eager page load strategy, blocks resources and disables features the scraper doesn't need
+        block_types (list)
+            The resource types blocked by the lean profile (keys of RESOURCE_PATTERNS)
+        block_patterns (list)
+            More URL patterns blocked by the lean profile, in addition to TRACKER_PATTERNS
+        user_data_dir (str)
+            The folder of a persistent Chrome profile, so the cookies consent is stored once
+        debugger_addresses (list)
+            The addresses (host:port) of running Chrome sessions, the first one is used by this profile and the others by the workers
+        '''
+        unknown = [block_type for block_type in block_types if block_type not in RESOURCE_PATTERNS]
+        if unknown:
+            raise ValueError(f'Unknown resource types {unknown}, use some of {list(RESOURCE_PATTERNS)}')
+        self.lean = lean
+        self.block_types = list(block_types)
+        self.block_patterns = TRACKER_PATTERNS + list(block_patterns or [])
+        self.user_data_dir = os.path.abspath(user_data_dir) if user_data_dir else None
+        self.debugger_addresses = list(debugger_addresses or [])
+
+    @staticmethod
+    def from_args(args):
+
+        '''
+        Builds a profile from the options added by add_arguments
+        '''
+        block_types = [block_type.strip() for block_type in args.block.split(',') if block_type.strip()]
+        return BrowserProfile(args.lean, block_types, args.block_url, args.profile_dir, args.attach)
+
+    def for_worker(self, worker_id: int):
+
+        '''
+        Returns the profile of a worker (1, 2, ...): its own profile folder, as Chrome locks a profile folder while it runs,
+        and its own running Chrome if one was given for it
+
+        Parameters
+        ----------
+        worker_id (int)
+            The number of the worker
+        '''
+        profile = copy.copy(self)
+        profile.user_data_dir = f'{self.user_data_dir}-worker-{worker_id}' if self.user_data_dir else None
+        profile.debugger_addresses = self.debugger_addresses[worker_id:worker_id + 1]
+        return profile
+
+    def blocked_urls(self) -> list:
+
+        '''
+        Returns the URL patterns blocked by this profile (none if it isn't lean)
+        '''
+        if not self.lean:
+            return []
+        return [pattern for block_type in self.block_types for pattern in RESOURCE_PATTERNS[block_type]] + self.block_patterns
+
+    def options(self, headless: bool = False) -> 'Options':
+
+        '''
+        Returns the Chrome options of a session
+
+        Parameters
+        ----------
+        headless (bool)
+            It run the code without openning the chrome (headless) if headless is True
+        '''
+        from selenium.webdriver.chrome.options import Options # Imported when a browser starts, selenium.webdriver is slow to import
+        options = Options()
+        if self.debugger_addresses:
+            options.add_experimental_option('debuggerAddress', self.debugger_addresses[0]) # The running Chrome keeps its own flags
+            if self.lean: options.page_load_strategy = 'eager'
+            return options
+        if self.user_data_dir:
+            options.add_argument(f'--user-data-dir={self.user_data_dir}') # Keeps the cookies between runs
+        if headless:
+            options.add_argument('--headless')
+            options.add_argument('--disable-gpu')
+            options.add_argument('--no-sandbox')
+            options.add_argument("--disable-setuid-sandbox")
+            options.add_argument('--window-size=1920,1080')
+            options.add_argument('--start-maximized')
+            options.add_argument('--disable-dev-shm-usage')
+        if self.lean:
+            options.page_load_strategy = 'eager' # get() returns once the DOM is ready, without waiting for images and iframes
+            for argument in ['--disable-extensions', '--disable-background-networking', '--disable-sync', '--disable-default-apps',
+                             '--disable-component-update', '--disable-notifications', '--mute-audio', '--no-first-run',
+                             '--disable-features=Translate,MediaRouter,OptimizationHints', '--metrics-recording-only']:
+                options.add_argument(argument)
+            if 'image' in self.block_types:
+                options.add_argument('--blink-settings=imagesEnabled=false') # The src attributes are still in the page
+                options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        return options
+
+    def apply(self, driver):
+
+        '''
+        Blocks the resource URLs of the profile on a running session through the Chrome DevTools protocol
+
+        Parameters
+        ----------
+        driver (WebDriver)
+            A Chrome web driver
+        '''
+        blocked_urls = self.blocked_urls()
+        if not blocked_urls:
+            return
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_urls})
+
+class PageLoadMeter:
+
+    '''
+    This class records the load time and the bytes transferred of every page opened by the scraper.
+    It has the following methods:
+
+    __init__(self)
+    record(self, driver, url: str)
+    merge(self, other)
+    stats(self)
+    print_stats(self)
+    '''
+    def __init__(self):
+
+        '''
+        This function initialize the records.
+        '''
+        self.pages = []
+        self.lock = threading.Lock()
+
+    def record(self, driver, url: str):
+
+        '''
+        Reads the navigation and resource timing of the page opened in a driver
+
+        Parameters
+        ----------
+        driver (WebDriver)
+            The web driver the page is opened in
+        url (str)
+            The page link
+
+        Returns
+        -------
+        dict
+            The load time (ms until the DOM is ready), the bytes transferred and the number of requests, or None if they couldn't be read
+        '''
+        try:
+            page = driver.execute_script(PAGE_LOAD_SCRIPT)
+        except Exception as exc:
+            print(f"Couldn't measure {url}: {exc}")
+            return None
+        if not isinstance(page, dict) or page.get('load_ms') is None:
+            return None
+        page = {'url': url, 'load_ms': float(page['load_ms']), 'bytes': int(page['bytes'] or 0), 'requests': int(page['requests'] or 0)}
+        with self.lock:
+            self.pages.append(page)
+        return page
+
+    def merge(self, other):
+
+        '''
+        Adds the pages of another PageLoadMeter (like a worker's) to this one
+        '''
+        with other.lock:
+            pages = list(other.pages)
+        with self.lock:
+            self.pages += pages
+
+    def stats(self) -> dict:
+
+        '''
+        Returns
+        -------
+        dict
+            The number of pages, the load time percentiles (ms) and the bytes transferred (mean and total)
+        '''
+        with self.lock:
+            load_ms = [page['load_ms'] for page in self.pages]
+            num_bytes = [page['bytes'] for page in self.pages]
+        return {'pages': len(load_ms), 'p50_ms': round(percentile(load_ms, 50)), 'p95_ms': round(percentile(load_ms, 95)),
+                'mean_bytes': round(sum(num_bytes) / len(num_bytes)) if num_bytes else 0, 'total_bytes': sum(num_bytes)}
+
+    def print_stats(self):
+
+        '''
+        Prints the page load stats of this run
+        '''
+        stats = self.stats()
+        if not stats['pages']:
+            return
+        print(f"\nPages loaded: {stats['pages']}, load time p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, "
+              f"{stats['mean_bytes'] / 1024:.0f} KB per page ({stats['total_bytes'] / 1048576:.1f} MB in total)")
@@ -0,0 +1,127 @@
+'''
+This code is to work on Data Collection Pipeline project
+It saves the discovered product links of a crawl and the status of each one, so a crawl can be resumed
+'''
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+from time import time
+
+class CrawlCheckpoint:
+
+    '''
+    This class keeps the link frontier of one crawl job (a keyword on a locale) in a SQLite file.
+    It has the following methods:
+
+    __init__(self, keyword: str, locale_url: str, folder: str = 'checkpoints')
+    job_name(keyword: str, locale_url: str)
+    discovery_complete(self)
+    save_links(self, links_list: list)
+    pending_links(self)
+    mark_done(self, link: str)
+    mark_failed(self, link: str, error: str = '')
+    counts(self)
+    close(self)
+    '''
+    def __init__(self, keyword: str, locale_url: str, folder: str = 'checkpoints'):
+
+        '''
+        This function opens (or creates) the checkpoint of a crawl job.
+
+        Parameters
+        ----------
+        keyword (str)
+            The word typed in the search bar
+        locale_url (str)
+            The website of the crawl (ex: https://www.ikea.com/gb/en/)
+        folder (str)
+            The folder where the checkpoints are kept
+        '''
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, f'{self.job_name(keyword, locale_url)}.sqlite')
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False) # Shared by the worker threads behind the lock
+        with self.lock, self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS links (link TEXT PRIMARY KEY, position INTEGER NOT NULL, status TEXT NOT NULL, error TEXT, updated_at REAL NOT NULL)')
+            self.conn.executemany('INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)', [('keyword', keyword), ('locale_url', locale_url)])
+
+    @staticmethod
+    def job_name(keyword: str, locale_url: str) -> str:
+
+        '''
+        Returns a file name for a crawl job (ex: 'www_ikea_com_gb_en_desk_1a2b3c4d')
+        '''
+        readable = re.sub(r'[^A-Za-z0-9]+', '_', f"{re.sub(r'^https?://', '', locale_url)}_{keyword}").strip('_')
+        digest = hashlib.sha1(f'{locale_url}|{keyword}'.encode('utf-8')).hexdigest()[:8]
+        return f'{readable[:80]}_{digest}'
+
+    def discovery_complete(self) -> bool:
+
+        '''
+        Checks if the product links of this job were already discovered
+        '''
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM meta WHERE key = 'discovered'").fetchone() is not None
+
+    def save_links(self, links_list: list):
+
+        '''
+        Starts the job again with a new list of product links and marks the discovery as complete
+
+        Parameters
+        ----------
+        links_list (list)
+            The product links to be scraped
+        '''
+        now = time()
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM links')
+            self.conn.executemany("INSERT OR IGNORE INTO links (link, position, status, updated_at) VALUES (?, ?, 'pending', ?)",
+                                  ((link, position, now) for position, link in enumerate(links_list)))
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('discovered', ?)", (str(now),))
+
+    def pending_links(self) -> list:
+
+        '''
+        Returns the links which are not scraped yet (including the failed ones), in the order they were discovered
+        '''
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT link FROM links WHERE status != 'done' ORDER BY position")]
+
+    def mark_done(self, link: str):
+
+        '''
+        Records that a product link was scraped
+        '''
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE links SET status = 'done', error = NULL, updated_at = ? WHERE link = ?", (time(), link))
+
+    def mark_failed(self, link: str, error: str = ''):
+
+        '''
+        Records that a product link couldn't be scraped, it is tried again on resume
+        '''
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE links SET status = 'failed', error = ?, updated_at = ? WHERE link = ?", (error, time(), link))
+
+    def counts(self) -> dict:
+
+        '''
+        Returns
+        -------
+        dict
+            The number of links for each status (pending, done, failed)
+        '''
+        with self.lock:
+            return dict(self.conn.execute('SELECT status, COUNT(*) FROM links GROUP BY status').fetchall())
+
+    def close(self):
+
+        '''
+        Closes the checkpoint
+        '''
+        with self.lock:
+            self.conn.close()
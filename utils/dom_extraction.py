@@ -0,0 +1,58 @@
+'''
+This code is to work on Data Collection Pipeline project
+It reads every field of a page in one script run by the browser, instead of one WebDriver call per element and attribute
+'''
+from selenium.common.exceptions import NoSuchElementException
+
+# Runs in the page: arguments[0] are the single fields and arguments[1] the list fields, both as [name, xpath, 'text' or attribute]
+EXTRACT_SCRIPT = '''
+const read = (node, attribute) => {
+    if (attribute === 'text') return (node.innerText || '').trim();
+    if (attribute in node && typeof node[attribute] !== 'function') return node[attribute]; // Absolute links, like WebElement.get_attribute
+    return node.getAttribute(attribute);
+};
+const values = {};
+for (const [name, xpath, attribute] of arguments[0]) {
+    const node = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    values[name] = node ? read(node, attribute) : null;
+}
+for (const [name, xpath, attribute] of arguments[1]) {
+    const nodes = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    values[name] = [];
+    for (let k = 0; k < nodes.snapshotLength; k++) values[name].push(read(nodes.snapshotItem(k), attribute));
+}
+return values;
+'''
+
+def extract(driver, fields: dict = None, list_fields: dict = None) -> dict:
+
+    '''
+    Reads some fields of the page opened in a driver with one execute_script call
+
+    Parameters
+    ----------
+    driver (WebDriver)
+        The web driver the page is opened in
+    fields (dict)
+        The fields with one value, as: name -> (xpath, 'text' or the attribute to read) (ex: PRODUCT_FIELDS)
+    list_fields (dict)
+        The fields with a value for each element found, in the same format (ex: PRODUCT_LIST_FIELDS)
+
+    Returns
+    -------
+    dict
+        The value of each field (a list for the list fields)
+
+    Raises
+    ------
+    NoSuchElementException
+        If the element of a single field is not on the page, like find_element
+    '''
+    fields = fields or {}
+    list_fields = list_fields or {}
+    values = driver.execute_script(EXTRACT_SCRIPT, [[name, xpath, attribute] for name, (xpath, attribute) in fields.items()],
+                                   [[name, xpath, attribute] for name, (xpath, attribute) in list_fields.items()])
+    missing = [name for name in fields if values.get(name) is None]
+    if missing:
+        raise NoSuchElementException(f'No element found for {missing}: {[fields[name][0] for name in missing]}')
+    return values
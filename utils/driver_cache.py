@@ -0,0 +1,68 @@
+'''
+This code is to work on Data Collection Pipeline project
+It resolves the chromedriver binary once and keeps its path, so starting a browser doesn't check the network for a driver
+'''
+import os
+import json
+import threading
+
+CHROMIUM = 'chromium' # ChromeType.CHROMIUM of webdriver_manager, which is only imported when a driver is downloaded
+DRIVER_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'ikea_project', 'driver_path.json')
+
+_paths = {} # Paths already resolved by this process
+_lock = threading.Lock()
+
+def driver_path(chrome_type: str = CHROMIUM, cache_file: str = DRIVER_CACHE, install=None) -> str:
+
+    '''
+    Returns the path of the chromedriver binary.
+
+    The path comes from the CHROMEDRIVER_PATH environment variable, this process, the cache file or, the first time only,
+    from ChromeDriverManager (which checks the network). A cached path is installed again if the binary was removed.
+
+    Parameters
+    ----------
+    chrome_type (str)
+        The browser the driver is for (ex: 'chromium')
+    cache_file (str)
+        The json file keeping the path of each browser's driver
+    install (function)
+        Downloads the driver and returns its path (default: ChromeDriverManager(chrome_type=chrome_type).install)
+
+    Returns
+    -------
+    str
+        The path of the chromedriver binary
+    '''
+    if os.environ.get('CHROMEDRIVER_PATH'):
+        return os.environ['CHROMEDRIVER_PATH'] # Like the driver installed in the Docker image
+    with _lock:
+        if chrome_type in _paths:
+            return _paths[chrome_type]
+        try:
+            with open(cache_file) as fp:
+                cached = json.load(fp)
+        except (OSError, ValueError):
+            cached = {}
+        path = cached.get(chrome_type)
+        if not path or not os.access(path, os.X_OK):
+            if install is None:
+                from webdriver_manager.chrome import ChromeDriverManager # Slow to import, only needed the first time
+                install = ChromeDriverManager(chrome_type=chrome_type).install
+            path = install()
+            cached[chrome_type] = path
+            os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
+            with open(cache_file, 'w') as fp:
+                json.dump(cached, fp)
+        _paths[chrome_type] = path
+        return path
+
+def clear_driver_path(cache_file: str = DRIVER_CACHE):
+
+    '''
+    Forgets the cached driver paths (ex: after Chrome was updated and the driver doesn't match it anymore)
+    '''
+    with _lock:
+        _paths.clear()
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
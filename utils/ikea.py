@@ -3,37 +3,53 @@ This code is to work on Data Collection Pipeline project
 @author:    Behzad 
 @date:      9 September 2022
 '''
-import os, json, shutil, sys
+import os, json, sys
+import cProfile, pstats
 import argparse
 import uuid
-import urllib.request
-import boto3
-import pandas as pd
+import copy
+import queue
+import threading
 import configparser
 from getpass import getpass
-from os import walk
-from time import sleep
-from sqlalchemy import create_engine
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.core.utils import ChromeType
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import itertools
+from urllib.parse import quote_plus
+from time import time, perf_counter, sleep
+from concurrent.futures import ThreadPoolExecutor
 from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.chrome.options import Options
+from utils.wait_policy import WaitPolicy
+from utils.dom_extraction import extract
+from utils.driver_cache import driver_path, CHROMIUM
+from utils.browser_profile import BrowserProfile, PageLoadMeter, add_arguments as add_browser_arguments
+from utils.static_engine import StaticEngine, ExtractionError
+from utils.image_downloader import ImageDownloader
+from utils.seen_index import SeenIndex
+from utils.sinks import SINK_PLUGINS, load_sink
+from utils.pipeline import StoragePipeline, StorageTask, store_task
+from utils.checkpoint import CrawlCheckpoint
+from utils.rate_limiter import HostRateLimiter
+from utils.metrics import METRICS
+from utils.page_cache import PageCache, CacheMiss
+from utils.reprocess import PageArchive
+from utils.work_queue import open_work_queue, worker_name
+from utils.product_fields import (PRODUCT_FIELDS, PRODUCT_XPATH, IMAGE_XPATH, IMAGE_LIST_XPATH, RESULTS_XPATH,
+                                  SHOW_MORE_XPATH, PRODUCT_LIST_FIELDS, RESULT_LIST_FIELDS,
+                                  IMAGE_FINGERPRINT_FIELDS, product_dict, product_id_from_link, product_fingerprint)
+
+CONSENT_COOKIE = 'OptanonAlertBoxClosed' # Set by the cookies banner once it is accepted
 
 class Scraper:
 
     '''
     This class will load a website and accept the cookies if applicable and has the following methods:
 
-    __init__(self, url='https://www.ikea.com/gb/en/', headless: bool = False)
+    The time spent on each startup step (driver_path, launch, home_page, cookies) is kept in self.startup.
+    Without a browser (like with --replay, which reads every page from the page cache) self.driver is None.
+
+    __init__(self, url='https://www.ikea.com/gb/en/', headless: bool = False, profile: BrowserProfile = None, browser: bool = True)
     accept_cookies(self, xpath: str = '//*[@id="onetrust-accept-btn-handler"]')
     '''
-    def __init__(self, url='https://www.ikea.com/gb/en/', headless: bool = False):
+    def __init__(self, url='https://www.ikea.com/gb/en/', headless: bool = False, profile: BrowserProfile = None, browser: bool = True):
 
         '''
         This function initialize all attributes used in this class and loads the website.
@@ -44,20 +60,36 @@ class Scraper:
             The webpage link
         headless (bool)
             It run the code without openning the chrome (headless) if headless is True
+        profile (BrowserProfile)
+            The Chrome settings, a lean profile blocks the resources the scraper doesn't read (default: Chrome's own settings)
+        browser (bool)
+            Starts Chrome and loads the website, if False nothing is loaded (no network is used)
         '''
-        if headless:
-            options = Options()
-            options.add_argument('--headless')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--no-sandbox')
-            options.add_argument("--disable-setuid-sandbox")
-            options.add_argument('--window-size=1920,1080')
-            options.add_argument('--start-maximized')
-            options.add_argument('--disable-dev-shm-usage')
-            self.driver = webdriver.Chrome(ChromeDriverManager(chrome_type=ChromeType.CHROMIUM).install(), chrome_options=options) # Access the web driver w/o Chrome pops up
-        else:
-            self.driver = webdriver.Chrome(ChromeDriverManager(chrome_type=ChromeType.CHROMIUM).install()) # Access the Chrome web driver
+        self.profile = profile or BrowserProfile()
+        self.startup = {}
+        self.page_meter = PageLoadMeter() # Measures each product page
+        self.worker_ids = itertools.count(1)
+        self.pages_loaded = 0 # Search result pages loaded
+        self.url = url
+        if not browser:
+            self.driver = None
+            self.action = None
+            self.wait = WaitPolicy(None)
+            return
+        start = perf_counter()
+        from selenium import webdriver # Only imported when a browser starts, it is slow to import
+        from selenium.webdriver.common.action_chains import ActionChains
+        executable_path = driver_path(CHROMIUM) # Resolved once, then read from the cache
+        self.startup['driver_path'] = perf_counter() - start
+        options = self.profile.options(headless) # Access the web driver w/o Chrome pops up if headless
+        start = perf_counter()
+        self.driver = webdriver.Chrome(executable_path, options=options) # Starts Chrome, or attaches to a running one
+        self.profile.apply(self.driver) # Blocks images, fonts and trackers in a lean profile
+        self.startup['launch'] = perf_counter() - start
+        self.wait = WaitPolicy(self.driver) # Waits for pages to be ready instead of sleeping
+        start = perf_counter()
         self.driver.get(url)
+        self.startup['home_page'] = perf_counter() - start
         self.action = ActionChains(self.driver) # Sets action chains
     
     def accept_cookies(self, xpath: str = '//*[@id="onetrust-accept-btn-handler"]'):
@@ -65,38 +97,59 @@ class Scraper:
         '''
         This method accepts the cookies.
 
-        It has a delay setup (in seconds) to allow the cookies' frame pops up.
+        It has a delay setup (in seconds) to allow the cookies' frame pops up and waits for the frame to be closed after clicking.
+        It returns at once if the consent is already stored in the browser profile.
 
         Parameters
         ----------
         xpath (str)
             The xpath of the Accept Cookies botton
         '''
+        start = perf_counter()
+        if self.driver is None:
+            return # No browser
+        if self.driver.get_cookie(CONSENT_COOKIE) is not None:
+            self.startup['cookies'] = perf_counter() - start
+            return # Accepted in a previous run with the same profile
         delay = 3 # Sets a delay after the webside is loaded to allow the cookies' frame pops up  
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
         try:
             # Tries to wait for web driver to be accessed and the cookies frame pops up. Then, clicks 'accept cookies'
             accept_cookies_button = WebDriverWait(self.driver, delay).until(EC.presence_of_element_located((By.XPATH, xpath)))
             accept_cookies_button.click()
-            sleep(0.5)
+            self.wait.element_gone(xpath)
         except TimeoutException:
             print("Loading took too much time!")
+        self.startup['cookies'] = perf_counter() - start
 
 class StoreData:
 
     '''
-    This class is responsible for storing data locally or on AWS cloud and has the following methods:
+    This class is responsible for storing data locally or on AWS cloud. The backends are sinks (see utils.sinks),
+    whose modules are only imported when they are enabled. It has the following methods:
 
     __init__(self)
+    sink(self, name: str)
+    open_sink(self, name: str, args, reconcile: bool = False)
+    enabled_sinks(self)
     check_config_file(self)
+    _reconcile(self, pid_list: list, product_ids: list)
     check_data_exist_locally(self)
     check_images_exist(self)
     check_data_exist_on_s3(self)
     check_data_exist_on_rds(self)
-    user_store_data_options(self)
+    user_store_data_options(self, argv: list = None)
     store_raw_data_locally(self, dict: dict, dir_name: str = '_')
-    store_to_S3_boto3(self, dir_name: str = '_')
+    store_to_S3_boto3(self, dir_name: str = '_', dict_properties: dict = None)
     psycopg2_create_engine(self)
-    store_tables_on_rds(self, df_name: pd.DataFrame)
+    store_tables_on_rds(self, df_name)
+    _claim_product(self, pid_list: list, product_id: str, fingerprint: str = None)
+    _release_product(self, pid_list: list, product_id: str, fingerprint: str = None, stored: bool = True)
+    _sink_pid_list(self, sink: str)
+    _product_stored(self, task: StorageTask, sink: str, error: Exception = None)
+    _needs_refresh(self, pid_list: list, product_id: str)
     '''
     def __init__(self):
 
@@ -111,6 +164,34 @@ class StoreData:
         self.pid_list_s3 = []
         self.pid_list_rds = []
         self.pid_list_images = []
+        self.sinks = {} # Sink name -> Sink, created when first used
+        self.claims = set() # (id of a product id list, product id) being stored in this run, recorded in the list once stored
+        self.seen_index = None
+        self.segment_store = None
+        self.s3_sink = None
+        self.rds_writer = None
+        self.pipeline = None
+        self.checkpoint = None
+        self.rate_limiter = None
+        self.resume = False
+        self.refresh = False
+        self.refresh_age = 0
+        self.checkpoint_folder = 'checkpoints'
+        self.num_workers = 1
+        self.extraction_engine = 'selenium'
+        self.static_engine = None
+        self.page_cache = None
+        self.page_archive = None
+        self.image_processor = None
+        self.work_queue = None
+        self.coordinator = False
+        self.queue_poll = 2 # Seconds a worker waits before it asks the shared queue again
+        self.metrics_json = None
+        self.metrics_prom = None
+        self.shared_metrics = False # Set by the job runner, which exports the metrics of all its jobs once they are finished
+        self.cprofile_path = None
+        self.downloader = ImageDownloader() # Downloads images in the background
+        self.lock = threading.Lock() # Guards the product id lists when several workers store data at the same time
         self.config = configparser.ConfigParser() # Loads a config file to pass the passwords for S3 and RDS connections
         self.config.read('config_file') # Reads the config file
 
@@ -126,59 +207,98 @@ class StoreData:
             print('Please fill your config file for RDS Keys to process your data ...')
             sys.exit()
 
+    def sink(self, name: str):
+
+        '''
+        Returns the sink of a name (see utils.sinks), its module is imported the first time
+
+        Parameters
+        ----------
+        name (str)
+            The sink name (local, images, s3 or rds)
+        '''
+        if name not in self.sinks:
+            self.sinks[name] = load_sink(name)(self)
+        return self.sinks[name]
+
+    def open_sink(self, name: str, args, reconcile: bool = False):
+
+        '''
+        Connects a sink and returns the view of its stored products in the index.
+        The sink is scanned to build its view if the view is empty or reconcile is True
+
+        Parameters
+        ----------
+        name (str)
+            The sink name
+        args (argparse.Namespace)
+            The arguments of user_store_data_options
+        reconcile (bool)
+            Rebuilds the view from the sink
+        '''
+        sink = self.sink(name)
+        sink.open(args)
+        pid_list = self.seen_index.view(sink.index_key())
+        if reconcile or not len(pid_list):
+            pid_list.reconcile(sink.stored_ids())
+        return pid_list
+
+    def enabled_sinks(self) -> list:
+
+        '''
+        Returns the names of the enabled sinks, in the order they are handed a record
+        '''
+        enabled = {'local': self.store_data_locally, 'images': self.save_img, 's3': self.store_data_on_S3, 'rds': self.store_data_in_rds_table}
+        return [name for name in SINK_PLUGINS if enabled.get(name)]
+
+    def _reconcile(self, pid_list: list, product_ids: list):
+
+        '''
+        Rebuilds a product id list from the ids found in its sink. Before user_store_data_options opens the index
+        the lists are plain lists, which are refilled
+        '''
+        if isinstance(pid_list, list):
+            pid_list[:] = product_ids
+        else:
+            pid_list.reconcile(product_ids)
+
     def check_data_exist_locally(self):
 
         '''
-        Checks if the data is already exist locally to avoid rescraping
+        Checks if the data is already exist locally to avoid rescraping and rebuilds the index of the local records
         '''
-        self.pid_list_locally = next(walk(f'./{self.folder_name}/'), (None, None, []))[1] # Returns a list of previouse recordes to avoid data rescraping locally
-        if self.pid_list_locally==None:
-            self.pid_list_locally = ['pid'] # This is to hack if the product id list is empty, continue with processing
+        self._reconcile(self.pid_list_locally, self.sink('local').stored_ids())
 
     def check_images_exist(self):
 
         '''
-        Checks if the data is already exist locally to avoid rescraping
+        Checks if the images are already exist locally to avoid rescraping and rebuilds the index of the images
         '''
-        self.pid_list_images = next(walk(f'./{self.folder_name}/images'), (None, None, []))[1] # Returns a list of previouse recordes to avoid data rescraping locally
-        if self.pid_list_images==None:
-            self.pid_list_images = ['pid'] # This is to hack if the product id list is empty, continue with processing
+        self._reconcile(self.pid_list_images, self.sink('images').stored_ids())
 
     def check_data_exist_on_s3(self):
         
         '''
-        Checks if the data is already exist on AWS S3 to avoid rescraping
+        Checks if the data is already exist on AWS S3 to avoid rescraping and rebuilds the index of the S3 records
         '''
-        self.check_config_file()
-        self.s3_client = boto3.client('s3',aws_access_key_id=self.config.get('KEY','AWSAccessKeyId'), aws_secret_access_key= self.config.get('KEY','AWSSecretKey'))
-        try:
-            response = self.s3_client.list_objects_v2(Bucket=self.config.get('KEY','AWSBucketName'), Delimiter='/', Prefix=f'{self.folder_name}/')
-            self.pid_list_s3 = [obj["Prefix"].lstrip(f'{self.folder_name}/').rstrip('/') for obj in response["CommonPrefixes"]] # Returns a list of previouse recordes to avoid data rescraping on S3
-        except:
-            print('No data found on the Amazon S3')
-            self.pid_list_s3 = ['pid'] # This is to hack if the product id list is empty, continue with processing
+        self._reconcile(self.pid_list_s3, self.sink('s3').stored_ids())
 
     def check_data_exist_on_rds(self):
 
         '''
-        Checks if the data is already exist on AWS RDS to avoid rescraping
+        Checks if the data is already exist on AWS RDS to avoid rescraping and rebuilds the index of the RDS records
         ''' 
-        self.check_config_file()
-        self.engine = self.psycopg2_create_engine()
-        with self.engine.connect() as conn:
-            try:
-                product_id_column = conn.execute(f'SELECT "Product_id" FROM {self.table_name}')
-                for p_id in product_id_column:
-                    self.pid_list_rds.append(''.join(p_id)) # Returns a list of previouse recordes to avoid data rescraping on RDS
-                product_id_column.close()
-            except:
-                print(f'No table found with {self.table_name} name on the Amazon RDS')
-                self.pid_list_rds = ['pid'] # This is to hack if the product id list is empty, continue with processing
+        self._reconcile(self.pid_list_rds, self.sink('rds').stored_ids())
 
-    def user_store_data_options(self):
+    def user_store_data_options(self, argv: list = None):
 
         '''
         Gets arguments options from user to store data locally, on S3 or/and RDS
+
+        Parameters
+        ----------
+        argv (list)
+            The arguments (ex: ['--local', '--word', 'desk']), if None they are read from the command line
         '''
         parser = argparse.ArgumentParser()
         parser.add_argument('--local', action='store_true', default=False, help='Store data locally')
@@ -187,40 +307,117 @@ class StoreData:
         parser.add_argument('--imgs', action='store_true', default=False, help='Store images')
 
         parser.add_argument('--folder', type=str, default='raw_data', help='Folder\'s name to store data (ex: raw_data)')
-        parser.add_argument('--word', type=str, default='desk', help='word to be typed in search bar (ex: desk)')
+        parser.add_argument('--word', type=str, default='desk', help='word to be typed in search bar, several words are separated by commas (ex: desk,chair)')
+        parser.add_argument('--target', type=int, default=3, help='Number of new products to scrape for each word, 0 for all of them (ex: 100)')
+        parser.add_argument('--max-pages', type=int, default=2, help='Maximum number of search result pages loaded for each word (ex: 20)')
+        parser.add_argument('--local-format', type=str, default='dirs', choices=['dirs', 'jsonl', 'jsonl.gz', 'parquet'], help='Store local data as a data.json per product folder (dirs) or in segment files (ex: jsonl.gz)')
+        parser.add_argument('--segment-size', type=int, default=10000, help='Maximum number of records in a local JSONL segment file (ex: 10000)')
+        parser.add_argument('--local-flush-interval', type=float, default=5, help='Maximum seconds a record waits before it is written to the local segments (ex: 5)')
         parser.add_argument('--table', type=str, default='table_name', help='user rds table (ex: table_name)')
+        parser.add_argument('--workers', type=int, default=1, help='Number of parallel browser sessions to scrape products, the main one included (ex: 4)')
+        parser.add_argument('--wait-timeout', type=float, default=10, help='Maximum seconds to wait for a page element to be ready (ex: 10)')
+        parser.add_argument('--image-workers', type=int, default=8, help='Maximum number of images downloaded at the same time (ex: 8)')
+        parser.add_argument('--engine', type=str, default='selenium', choices=['selenium', 'static'], help='Engine to read product pages, static falls back to selenium if it fails (ex: static)')
+        parser.add_argument('--s3-uploads', type=int, default=10, help='Maximum number of uploads to S3 running at the same time (ex: 10)')
+        parser.add_argument('--rds-batch', type=int, default=500, help='Number of records written to RDS in one batch (ex: 500)')
+        parser.add_argument('--rds-flush-interval', type=float, default=5, help='Maximum seconds a record waits before it is written to RDS (ex: 5)')
+        parser.add_argument('--queue-size', type=int, default=100, help='Maximum number of records waiting for each storage worker (ex: 100)')
+        parser.add_argument('--resume', action='store_true', default=False, help='Continue the last crawl of this word from its checkpoint without searching again')
+        parser.add_argument('--checkpoints', type=str, default='checkpoints', help='Folder of the crawl checkpoints (ex: checkpoints)')
+        parser.add_argument('--refresh', action='store_true', default=False, help='Scrape stored products again and rewrite the ones that changed')
+        parser.add_argument('--refresh-age', type=float, default=0, help='With --refresh, only products stored (or checked) more than this many hours ago (ex: 24)')
+        add_browser_arguments(parser) # --lean, --block and --block-url, read by main.py before the browser starts
+        parser.add_argument('--index', type=str, default='seen_index.sqlite', help='File of the index of stored products (ex: seen_index.sqlite)')
+        parser.add_argument('--reconcile', action='store_true', default=False, help='Rebuild the index of stored products from the enabled sinks')
         
-        args = parser.parse_args()
+        parser.add_argument('--rate', type=float, default=0, help='Maximum requests per second to each host, 0 for no limit (ex: 2)')
+        parser.add_argument('--burst', type=int, default=4, help='Requests that can be sent at once to a host with --rate (ex: 4)')
+        parser.add_argument('--cache', type=str, default=None, help='Keep the downloaded pages in this folder and read them from it in the next runs (ex: page_cache)')
+        parser.add_argument('--cache-ttl', type=float, default=0, help='With --cache, hours a page is read from the cache before it is downloaded again, 0 for no limit (ex: 24)')
+        parser.add_argument('--cache-size', type=float, default=1024, help='With --cache, maximum size of the cache in MB, the least recently used pages are removed (ex: 500)')
+        parser.add_argument('--replay', action='store_true', default=False, help='With --cache, only read pages from the cache, a page which is not cached fails')
+        parser.add_argument('--thumbnails', action='store_true', default=False, help='With --imgs, make a resized and re-encoded thumbnail of each image and add their details to the records (needs Pillow)')
+        parser.add_argument('--thumb-size', type=str, default='256', help='With --thumbnails, width x height of the thumbnails, or one number for squares (ex: 224x224)')
+        parser.add_argument('--thumb-format', type=str, default='webp', choices=['webp', 'jpeg', 'png'], help='With --thumbnails, format of the thumbnails (ex: jpeg)')
+        parser.add_argument('--thumb-quality', type=int, default=80, help='With --thumbnails, encoding quality from 1 to 100 (ex: 85)')
+        parser.add_argument('--thumb-workers', type=int, default=None, help='With --thumbnails, number of processes making thumbnails, the number of cores by default (ex: 4)')
+        parser.add_argument('--drop-originals', action='store_true', default=False, help='With --thumbnails, keep only the thumbnails in the product folders and on S3')
+        parser.add_argument('--archive', action='store_true', default=False, help='Keep the HTML of each product page in <folder>/page_archive, to extract the products again later with utils.reprocess')
+        parser.add_argument('--queue', type=str, default=None, help='Share the product links with other nodes through this queue, a SQLite file or a redis:// link (ex: work_queue.sqlite)')
+        parser.add_argument('--coordinator', action='store_true', default=False, help='With --queue, only search the words and publish the product links, the workers scrape them')
+        parser.add_argument('--lease', type=float, default=600, help='With --queue, seconds a worker has to scrape a link before another worker can claim it (ex: 300)')
+        parser.add_argument('--max-attempts', type=int, default=3, help='With --queue, number of times a link is claimed before it is recorded as failed (ex: 3)')
+        parser.add_argument('--metrics-json', type=str, default=None, help='Save the run report (stage latencies, counters, throughput) to this json file (ex: run_report.json)')
+        parser.add_argument('--metrics-prom', type=str, default=None, help='Save the metrics in the Prometheus text format to this file (ex: ikea.prom)')
+        parser.add_argument('--metrics-port', type=int, default=None, help='Serve the metrics on http://localhost:<port>/metrics during the run (ex: 9100)')
+        parser.add_argument('--profile', type=str, default=None, help='Profile the run with cProfile and save the stats to this file (ex: run.prof)')
+        args = parser.parse_args(argv)
         self.search_word = args.word
+        self.keywords = list(dict.fromkeys(word.strip() for word in args.word.split(',') if word.strip()))
+        self.target = max(0, args.target)
+        self.max_pages = max(1, args.max_pages)
+        self.folder_name = args.folder
+        self.resume = args.resume
+        self.checkpoint_folder = args.checkpoints
+        self.refresh = args.refresh
+        self.refresh_age = max(0, args.refresh_age)
+        self.num_workers = max(1, args.workers)
+        self.wait.timeout = args.wait_timeout
+        self.metrics_json = args.metrics_json
+        self.metrics_prom = args.metrics_prom
+        self.cprofile_path = args.profile
+        if args.metrics_port is not None:
+            METRICS.serve(args.metrics_port)
+        if self.rate_limiter is None and args.rate > 0:
+            self.rate_limiter = HostRateLimiter(args.rate, args.burst) # Shared by the browsers, the static engine and the image downloads
+        if args.cache:
+            self.page_cache = PageCache(args.cache, args.cache_ttl * 3600, int(args.cache_size * 1048576), args.replay) # Shared by all workers
+        elif args.replay:
+            print('--replay needs the --cache folder of the pages to replay')
+            sys.exit()
+        if args.queue:
+            self.work_queue = open_work_queue(args.queue, max(1, args.lease), args.max_attempts) # Replaces the checkpoint of the crawl
+            self.coordinator = args.coordinator
+        elif args.coordinator:
+            print('--coordinator needs the --queue to publish the links to')
+            sys.exit()
+        if args.archive:
+            self.page_archive = PageArchive(self.folder_name)
+        self.extraction_engine = args.engine
+        if self.extraction_engine == 'static':
+            self.static_engine = StaticEngine(pool_size=max(10, self.num_workers), rate_limiter=self.rate_limiter, page_cache=self.page_cache) # Shared by all workers
 
+        # The sinks are only scanned if they have no index yet or --reconcile is set
+        self.seen_index = SeenIndex(args.index)
         if args.local:
-            self.folder_name = args.folder
             self.store_data_locally = True
-            self.check_data_exist_locally()
+            self.pid_list_locally = self.open_sink('local', args, args.reconcile)
         else:
             print('To store data locally add --local')
         if args.s3:
             self.store_data_on_S3 = True
-            self.check_data_exist_on_s3()
+            self.pid_list_s3 = self.open_sink('s3', args, args.reconcile)
         else:
             print('To store data on AWS S3 add --s3')
         if args.rds:
-            self.table_name = args.table
             self.store_data_in_rds_table = True
-            self.check_data_exist_on_rds()
+            self.pid_list_rds = self.open_sink('rds', args, args.reconcile)
         else:
             print('To store data on RDS add --rds')
         if args.imgs:
             self.save_img = True
-            self.check_images_exist()
+            self.pid_list_images = self.open_sink('images', args, args.reconcile)
         else:
             print('To store images add --imgs')
+        handlers = self.storage_handlers()
+        self.pipeline = StoragePipeline(handlers, maxsize=max(1, args.queue_size), on_stored=self._product_stored) # One storage worker per enabled sink
         print('\nData scraping is in progress ...\n')
         
     def store_raw_data_locally(self, dict: dict, dir_name: str = '_'):
 
         '''
-        This function used to store raw data locally. It stores each product dictionary as a jsone file.
+        This function used to store raw data locally. It stores each product dictionary as a jsone file,
+        or appends it to the segment files if a local format (jsonl, jsonl.gz or parquet) is set.
 
         Parameters
         ----------
@@ -229,39 +426,35 @@ class StoreData:
         dir_name (str)
             Defines a spesific directory named 'dir_name' (like production id or unique id) to store the dictionary as a json file 
         '''
-        print('Storing data locally ...')
-        if not os.path.exists(f'{self.folder_name}/{dir_name}'): os.makedirs(f'{self.folder_name}/{dir_name}') # Creats folders and subfolders if they're not exist
-        with open(f'./{self.folder_name}/{dir_name}/data.json', 'w') as fp:
-            json.dump(dict, fp) # Saves dict in a json file
+        return self.sink('local').write(dict, dir_name)
 
-    def store_to_S3_boto3(self, dir_name: str = '_'):
+    def store_to_S3_boto3(self, dir_name: str = '_', dict_properties: dict = None):
 
         '''
         This function used to store data on the AWS S3 using boto3 module. It stores data on AWS S3 and keeps the same structure as we store data locally.
 
+        The uploads run in the background through the shared S3 sink, it returns their futures.
+
         Parameters
         ----------
         dir_name (str)
             Defines a spesific directory named 'dir_name' (like production id or unique id) to store data 
+        dict_properties (dict)
+            The product dictionary, uploaded straight from memory as data.json. If None, data.json is uploaded from the local folder
         '''
-        print('Storing data on S3 ...')
-        bucket_name = self.config.get('KEY','AWSBucketName') # It's the bucket name from AWS S3
-        directory_name = f'{self.folder_name}/{dir_name}' 
-        for root,dirs,files in os.walk(directory_name):
-            #print(root,dirs,files)
-            for file in files:
-                self.s3_client.upload_file(os.path.join(root,file),bucket_name,os.path.join(root,file))
+        return self.sink('s3').upload(dir_name, dict_properties)
 
     def psycopg2_create_engine(self):
 
         '''
-        This method will create a psycopg2 engine 
+        This method will create a psycopg2 engine with a pool of connections shared by the workers
         
         Returns
         -------
         engine
             Returns engine to access to a postgresql database
         '''
+        from sqlalchemy import create_engine # Only imported with --rds, it is slow to import
         DATABASE_TYPE = self.config.get('KEY','DATABASE_TYPE')
         DBAPI = self.config.get('KEY','DBAPI')
         ENDPOINT = self.config.get('KEY','ENDPOINT')
@@ -269,11 +462,11 @@ class StoreData:
         PASSWORD = self.config.get('KEY','PASSWORD')
         PORT = self.config.get('KEY','PORT')
         DATABASE = self.config.get('KEY','DATABASE')
-        engine = create_engine(f"{DATABASE_TYPE}+{DBAPI}://{USER}:{PASSWORD}@{ENDPOINT}:{PORT}/{DATABASE}")       
+        engine = create_engine(f"{DATABASE_TYPE}+{DBAPI}://{USER}:{PASSWORD}@{ENDPOINT}:{PORT}/{DATABASE}", pool_size=5, max_overflow=5, pool_pre_ping=True)       
         #print(engine.connect())
         return engine
     
-    def store_tables_on_rds(self, df_name: pd.DataFrame):
+    def store_tables_on_rds(self, df_name):
 
         '''
         This functions stores data as a table on the AWS RDS
@@ -286,31 +479,133 @@ class StoreData:
         print('Storing data on RDS ...')
         df_name.to_sql(self.table_name, self.engine, if_exists='append') # if_exist='replace' or 'append'
 
+    def _claim_product(self, pid_list: list, product_id: str, fingerprint: str = None) -> bool:
+
+        '''
+        Checks and claims a product id in one step, so two workers never store the same product twice
+
+        The claim is only kept in memory: the product is recorded in the list once the sink stored it (see _release_product).
+        In refresh mode a stored product is claimed again if its fingerprint changed, otherwise it is recorded as checked.
+
+        Parameters
+        ----------
+        pid_list (list)
+            One of the product id lists (pid_list_locally, pid_list_images, pid_list_s3 or pid_list_rds)
+        product_id (str)
+            The product id to be claimed
+        fingerprint (str)
+            The fingerprint of the record (see product_fields.product_fingerprint)
+
+        Returns
+        -------
+        bool
+            True if the product was not stored before (or changed) and the caller should store it now
+        '''
+        with self.lock:
+            if (id(pid_list), product_id) in self.claims:
+                return False # Being stored by another worker
+            if product_id in pid_list:
+                if not self.refresh or isinstance(pid_list, list):
+                    return False
+                if pid_list.fingerprint(product_id) == fingerprint:
+                    pid_list.touch(product_id) # Unchanged, checked again later only after refresh_age
+                    return False
+            self.claims.add((id(pid_list), product_id))
+            return True
+
+    def _release_product(self, pid_list: list, product_id: str, fingerprint: str = None, stored: bool = True):
+
+        '''
+        Records a claimed product in its list once the sink stored it, or only drops the claim if the sink failed,
+        so the product is stored again by a later link or run
+
+        See help(_claim_product) for accurate signature
+        '''
+        with self.lock:
+            if stored and isinstance(pid_list, list):
+                if product_id not in pid_list: pid_list.append(product_id)
+            elif stored:
+                pid_list.append(product_id, fingerprint)
+            self.claims.discard((id(pid_list), product_id))
+
+    def _sink_pid_list(self, sink: str):
+
+        '''
+        Returns the product id list of a sink (local, images, s3 or rds)
+        '''
+        return {'local': self.pid_list_locally, 'images': self.pid_list_images, 's3': self.pid_list_s3, 'rds': self.pid_list_rds}[sink]
+
+    def _product_stored(self, task: StorageTask, sink: str, error: Exception = None):
+
+        '''
+        Records a product in the index of a sink once the sink confirmed it was stored, or releases its claim if it failed
+        '''
+        self._release_product(self._sink_pid_list(sink), task.product_id, task.fingerprints.get(sink), error is None)
+
+    def _needs_refresh(self, pid_list: list, product_id: str) -> bool:
+
+        '''
+        Checks if a product is missing from a sink or, in refresh mode, was stored (or checked) more than refresh_age hours ago
+
+        Parameters
+        ----------
+        pid_list (list)
+            One of the product id lists
+        product_id (str)
+            The product id
+        '''
+        if product_id not in pid_list:
+            return True
+        if not self.refresh or isinstance(pid_list, list):
+            return False
+        stored_at = pid_list.stored_at(product_id)
+        return stored_at is None or time() - stored_at >= self.refresh_age * 3600
+
 class DataCollection(Scraper, StoreData):
 
     '''
     This class will scrape the web details, download related images and store the data locally or/and on AWS cloud and has the following methods:
 
-    __init__(self, url='https://www.ikea.com/gb/en/', headless: bool = False)
+    __init__(self, url='https://www.ikea.com/gb/en/', headless: bool = False, profile: BrowserProfile = None, browser: bool = True)
     search_box(self, search_word: str, xpath_value: str='//div[@class="search-field"]')
     get_product_links(self, num_page: int = 1) 
+    harvest_links(self, target: int = 0, max_pages: int = 50, keep = None)
+    harvest_keyword(self, search_word: str, target: int = 0, max_pages: int = 50)
+    discover_links(self, keywords: list, target: int = 0, max_pages: int = 50)
     _get_href_image(self)
-    _download_image(self, img_name: str, dir_name: str = '_')
+    _download_image(self, img_name: str, dir_name: str = '_', src: str = None)
     _get_href_list_images(self)
-    _download_multiple_images(self, img_name: str, dir_name: str = '_')
+    _download_multiple_images(self, img_name: str, dir_name: str = '_', img_links_list: list = None)
+    _process_image(self, download, path: str)
     scrol_down(self, steps: int = 2, speed: int = 300)
     generate_uuid(self)
     retrieve_product_details(self)
-    store_data_final(self)
-    scrape_data(self)
+    store_data_final(self, dict_properties: dict = None)
+    storage_handlers(self)
+    _task_record(self, task: StorageTask)
+    filter_new_links(self, links_list: list)
+    _enabled_pid_lists(self)
+    is_new_link(self, link: str)
+    open_product_page(self, link: str)
+    retrieve_cached_product_page(self, link: str)
+    scrape_product(self, link: str, on_done = None)
+    _link_stored(self, link: str, task: StorageTask, on_done = None)
+    spawn_worker(self)
+    scrape_in_parallel(self, links_list: list)
+    _run_workers(self, run, num_workers: int)
+    scrape_from_queue(self)
+    scrape_data(self, argv: list = None)
+    crawl(self)
+    export_metrics(self)
+    close_storage(self)
     '''
-    def __init__(self, url='https://www.ikea.com/gb/en/', headless: bool = False):
+    def __init__(self, url='https://www.ikea.com/gb/en/', headless: bool = False, profile: BrowserProfile = None, browser: bool = True):
 
         '''
         Initialize the __init__ functions of StoreData and Scraper classes
         '''
         StoreData.__init__(self)
-        Scraper.__init__(self, url, headless) 
+        Scraper.__init__(self, url, headless, profile, browser) 
     
     def search_box(self, search_word: str, xpath_value: str='//div[@class="search-field"]'):
 
@@ -324,6 +619,8 @@ class DataCollection(Scraper, StoreData):
         xpath_value (str)
             The value for xpath to find the search box
         '''
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
         searchTextbox = self.driver.find_element(by=By.XPATH, value=xpath_value) # Finds the search text box position
         self.action.move_to_element(searchTextbox).click().send_keys(search_word).send_keys(Keys.RETURN).perform() # Types a word to the search box
 
@@ -336,24 +633,156 @@ class DataCollection(Scraper, StoreData):
         ----------
             num_page (int): The number of pages that need to be extracted
         '''
-        more_link_list = []
-        for _ in range(num_page):
-            links_list = []
-            sleep(3)
-            # Find all elements in a container or a table 
-            result_container = self.driver.find_elements(by=By.XPATH, value="//section[@class='results']//div[@class='serp-grid__item search-grid__item product-fragment']/a")
-            for result in result_container:
-                # Loops on all the elements of the container to extract their links
-                link = result.get_attribute("href") # Gets the web link
-                links_list.append(link)
-            more_link_list.append(links_list)
+        return self.harvest_links(max_pages=num_page)
+
+    def harvest_links(self, target: int = 0, max_pages: int = 50, keep = None) -> list:
+
+        '''
+        This method reads the search results page by page, clicking 'show more' until enough links are found.
+
+        After each click only the newly appended results are read. It stops as soon as the target is reached,
+        there is no 'show more' button or no new results appear.
+
+        Parameters
+        ----------
+        target (int)
+            The number of links wanted, 0 for all of them
+        max_pages (int)
+            The maximum number of result pages to load
+        keep (function)
+            Tells if a link is wanted (ex: is_new_link), the other links are dropped and not counted
+
+        Returns
+        -------
+        list
+            The product links, in the order of the results
+        '''
+        from selenium.webdriver.common.by import By
+        links = {}
+        num_results = 0
+        for page in range(1, max(1, max_pages) + 1):
+            if not self.wait.count_stable(RESULTS_XPATH, num_results + 1): # Waits until the new results are loaded
+                break # No new results
+            new_links = extract(self.driver, list_fields={name: (f'({xpath})[position() > {num_results}]', attribute)
+                                                          for name, (xpath, attribute) in RESULT_LIST_FIELDS.items()})['links'] # Reads only the new results
+            num_results += len(new_links)
+            links.update(dict.fromkeys(link for link in new_links if keep is None or keep(link)))
+            if (target and len(links) >= target) or page >= max_pages:
+                break
             try:
-                self.driver.find_element(By.XPATH, "//a[@class='show-more__button button button--secondary button--small']").click() # Clicks on next page or loading more products
-            except:
-                pass
-        all_link_list = list(set([k for sub in more_link_list for k in sub])) # flatten and unique the list of links
-        return all_link_list 
-    
+                self.driver.find_element(By.XPATH, SHOW_MORE_XPATH).click() # Clicks on next page or loading more products
+            except Exception:
+                break # Last page
+        with self.lock:
+            self.pages_loaded += page # Shared with the workers of discover_links
+        METRICS.inc('result_pages', page)
+        links_list = list(links)
+        return links_list[:target] if target else links_list
+
+    def harvest_keyword(self, search_word: str, target: int = 0, max_pages: int = 50) -> list:
+
+        '''
+        This method searches a word and harvests the links of its products which aren't stored yet (see help(harvest_links))
+
+        With a page cache every link read from the result pages is cached, the links already stored are left out after reading them,
+        so the cache stays right when products are stored or a different target is asked for.
+
+        Parameters
+        ----------
+        search_word (str)
+            The word that needs to be searched
+        '''
+        cache_url = f'{self.url}search/?q={quote_plus(search_word)}'
+        if self.page_cache is not None:
+            cached = self.page_cache.get(cache_url) # The links read from the result pages in a previous run
+            if cached is not None:
+                cached = json.loads(cached)
+                if isinstance(cached, list):
+                    cached = {'links': cached, 'max_pages': 0, 'complete': False} # Cached before the raw links were kept
+                links_list = [link for link in cached['links'] if self.is_new_link(link)]
+                if self.page_cache.replay or (target and len(links_list) >= target) or (cached['complete'] and cached['max_pages'] >= max_pages):
+                    links_list = links_list[:target] if target else links_list
+                    print(f"Found {len(links_list)} new products for '{search_word}' in the page cache")
+                    return links_list
+        if self.driver.current_url != self.url:
+            if self.rate_limiter is not None: self.rate_limiter.acquire(self.url)
+            self.driver.get(self.url) # The search box of the home page is empty
+        if self.rate_limiter is not None: self.rate_limiter.acquire(self.url) # Loads the results page
+        raw_links = []
+        def keep(link):
+            raw_links.append(link)
+            return self.is_new_link(link)
+        with METRICS.timer('search'):
+            self.search_box(search_word)
+            self.scrol_down(1)
+            links_list = self.harvest_links(target, max_pages, keep=keep) # Counts only the products which aren't stored yet
+        print(f"Found {len(links_list)} new products for '{search_word}'")
+        if self.page_cache is not None:
+            complete = not target or len(links_list) < target # Every result page up to max_pages was read
+            cached = {'links': list(dict.fromkeys(raw_links)), 'max_pages': max_pages, 'complete': complete}
+            self.page_cache.put(cache_url, json.dumps(cached).encode('utf-8'))
+        return links_list
+
+    def discover_links(self, keywords: list, target: int = 0, max_pages: int = 50) -> list:
+
+        '''
+        This method harvests the links of several search words, shared across the workers.
+
+        This scraper and up to num_workers - 1 new browser sessions take the next word from a shared queue.
+        Products found for several words are kept once.
+
+        Parameters
+        ----------
+        keywords (list)
+            The words to be searched
+        target (int)
+            The number of new links wanted for each word, 0 for all of them
+        max_pages (int)
+            The maximum number of result pages to load for each word
+
+        Returns
+        -------
+        list
+            The unique product links, in the order of the words
+        '''
+        keyword_queue = queue.Queue()
+        for search_word in keywords:
+            keyword_queue.put(search_word)
+        results = {}
+
+        def run_worker(worker):
+            try:
+                while True:
+                    try:
+                        search_word = keyword_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    try:
+                        results[search_word] = worker.harvest_keyword(search_word, target, max_pages)
+                    except Exception as exc:
+                        print(f"Couldn't search {search_word}: {exc}")
+            finally:
+                if worker is not self:
+                    if worker.driver is not None: worker.driver.quit()
+                    self.wait.merge(worker.wait)
+                    with self.lock:
+                        self.pages_loaded += worker.pages_loaded
+
+        num_workers = min(self.num_workers, len(keywords))
+        if num_workers <= 1:
+            run_worker(self)
+        else:
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                futures = [executor.submit(run_worker, self)] + [executor.submit(lambda: run_worker(self.spawn_worker())) for _ in range(num_workers - 1)]
+                for future in futures:
+                    future.result() # Raises the error if a worker couldn't start
+        links = {}
+        for search_word in keywords:
+            for link in results.get(search_word, []):
+                links.setdefault(product_id_from_link(link) or link, link) # The same product found with another word is kept once
+        print(f'{len(links)} unique new products found for {len(keywords)} words in {self.pages_loaded} result pages')
+        return list(links.values())
+
     def _get_href_image(self): 
 
         '''
@@ -364,10 +793,10 @@ class DataCollection(Scraper, StoreData):
         str
             the src link of the image
         '''
-        src = self.driver.find_element(by=By.XPATH, value='//div[@class="pip-product__left-top"]//img[@class="pip-aspect-ratio-image__image"]').get_attribute('src') # Prepares the image source to download
+        src = extract(self.driver, {'src_img': (IMAGE_XPATH, 'src')})['src_img'] # Prepares the image source to download
         return src
     
-    def _download_image(self, img_name: str, dir_name: str = '_'):
+    def _download_image(self, img_name: str, dir_name: str = '_', src: str = None):
         
         '''
         This function is used to download the main image for each product and save it to the 'images' folder
@@ -378,14 +807,19 @@ class DataCollection(Scraper, StoreData):
             Defines the name of the image
         dir_name (str)
             Gives the image name a spesific id (like production id or unique id) as well as creating a parent directory named dir_name for the 'images' folder  
+        src (str)
+            The image link, if None it is read from the page opened in the browser
+
+        Returns
+        -------
+        list
+            The futures of the queued download
         '''
-        src = self._get_href_image()
+        if src is None:
+            src = self._get_href_image()
         if not os.path.exists(f'{self.folder_name}/{dir_name}/image'): os.makedirs(f'{self.folder_name}/{dir_name}/image') # Creats 'folder_name, {id} and image' folders if it is not exist
-        sleep(1)
-        try:
-            urllib.request.urlretrieve(src, f"./{self.folder_name}/{dir_name}/image/{img_name}_{dir_name}.jpg") # saves images to the folder
-        except:
-            print(f"Couldn't download the main image: {src} for {dir_name} product")
+        path = f"./{self.folder_name}/{dir_name}/image/{img_name}_{dir_name}.jpg"
+        return [self._process_image(self.downloader.submit(src, path), path)] # Queues the image to be saved to the folder
 
     def _get_href_list_images(self):
 
@@ -397,29 +831,41 @@ class DataCollection(Scraper, StoreData):
         list
             list of images links
         '''
-        src_container = self.driver.find_elements(by=By.XPATH, value="//div[@class='pip-media-grid__grid ']//img") # Prepares an image container source to download
-        sleep(0.5)
-        img_links_list = []
-        for srcs in src_container:
-            # Loops on all the elements of the container to extract their links
-            img = srcs.get_attribute("src") # Gets the image link
-            img_links_list.append(img)
+        img_links_list = extract(self.driver, list_fields=PRODUCT_LIST_FIELDS)['src_multi_img'] # Gets all image links in one call
+        if not img_links_list:
+            self.wait.element_present(IMAGE_LIST_XPATH) # The images gallery is not loaded yet
+            img_links_list = extract(self.driver, list_fields=PRODUCT_LIST_FIELDS)['src_multi_img']
         return img_links_list
 
-    def _download_multiple_images(self, img_name: str, dir_name: str = '_') -> list:
+    def _download_multiple_images(self, img_name: str, dir_name: str = '_', img_links_list: list = None) -> list:
         
         '''
         This function is used to download multiple images of a product and save them to the 'multiple_images' folder
 
         See help(__download_image) for accurate signature
         '''
-        img_links_list = self._get_href_list_images()
+        if img_links_list is None:
+            img_links_list = self._get_href_list_images()
         if not os.path.exists(f'{self.folder_name}/{dir_name}/images'): os.makedirs(f'{self.folder_name}/{dir_name}/images') # Creats 'folder_name, {id} and images' folders if it is not exist
+        futures = []
         for k,link in enumerate(img_links_list):
-            try:
-                urllib.request.urlretrieve(link, f"./{self.folder_name}/{dir_name}/images/{img_name}_{k}_{dir_name}.jpg") # saves images to the folder
-            except:
-                print(f"Couldn't download this image: {link} for {dir_name} product")
+            path = f"./{self.folder_name}/{dir_name}/images/{img_name}_{k}_{dir_name}.jpg"
+            futures.append(self._process_image(self.downloader.submit(link, path), path)) # Queues the images to be saved to the folder
+        return futures
+
+    def _process_image(self, download, path: str):
+
+        '''
+        Queues the thumbnail of an image after its download if --thumbnails is set
+
+        Returns
+        -------
+        Future
+            The download, or the thumbnail made after it
+        '''
+        if self.image_processor is None:
+            return download
+        return self.image_processor.process(download, path)
     
     def scrol_down(self, steps: int = 2, speed: int = 300):
 
@@ -437,7 +883,7 @@ class DataCollection(Scraper, StoreData):
             # To scrol down step by step. In order to cover all page scrolling down the range should be larger
             self.driver.execute_script("window.scrollTo(0, "+str(scrol_speed)+")")
             scrol_speed += speed  
-            sleep(0.5)
+            self.wait.network_idle() # Waits for lazy loaded content instead of a fixed sleep
 
     def generate_uuid(self) -> str:
         '''
@@ -459,75 +905,462 @@ class DataCollection(Scraper, StoreData):
         '''
         This method retrieve product data
 
+        All the fields and image links are read with one script call. It waits for the images gallery only if it isn't loaded yet.
+
         Returns
         -------
         dict
             A product dictionary
         '''
-        dict_properties = {}
-        product_id = self.driver.find_element(By.XPATH, "//div[@class='pip-product__subgrid product-pip js-product-pip']").get_attribute('data-product-id') # Gets product id
+        with METRICS.timer('extraction'):
+            fields = extract(self.driver, PRODUCT_FIELDS, PRODUCT_LIST_FIELDS) # Gets product id, price, currency, name, description and the image links
+        src_multi_img = fields.pop('src_multi_img')
+        if not src_multi_img:
+            src_multi_img = self._get_href_list_images() # Waits for the images gallery
         uuid_number = self.generate_uuid() # Generates universal unique ids
-        price = self.driver.find_element(By.XPATH, "//span[@class='pip-price__integer']").text # Gets price
-        currency = self.driver.find_element(By.XPATH, "//span[@class='pip-price__currency-symbol pip-price__currency-symbol--leading\n        pip-price__currency-symbol--superscript']").text # Gets currency
-        name = self.driver.find_element(By.XPATH, "//span[@class='pip-header-section__title--big notranslate']").text # Gets name
-        description = self.driver.find_element(By.XPATH, "//span[@class='pip-header-section__description-text']").text # Gets description
-        src_img = self._get_href_image() # Gets the image link
-        src_multi_img = self._get_href_list_images() # Gets the images links
         # -------- Product dictionary -------- #
-        dict_properties.update({'Product_id': [product_id], 'UUID_number': [uuid_number],'Price': [currency + price], 'Name': [name], 'Description': [description], 'Image_link': [src_img], 'Image_all_links': [src_multi_img]})
+        dict_properties = product_dict(fields, uuid_number, src_multi_img)
+        product_id = fields['product_id']
         print(product_id)
         return dict_properties
 
-    def store_data_final(self):
+    def store_data_final(self, dict_properties: dict = None, on_done = None):
 
         '''
         This method will store data when is requested
+
+        The product is claimed in every enabled sink here and handed to the storage pipeline, whose sink workers
+        store it in the background. Without a pipeline (like in the tests) it is handed to the sinks before returning.
+        The product is recorded in the index of a sink only once that sink stored it.
+
+        Parameters
+        ----------
+        dict_properties (dict)
+            The product dictionary, if None it is retrieved from the page opened in the browser
+        on_done (function)
+            Called with the StorageTask once every sink stored the product or failed (see StorageTask.errors)
+        '''
+        if dict_properties is None:
+            dict_properties = self.retrieve_product_details()
+        task = StorageTask(dict_properties, on_done)
+        product_id = task.product_id
+        fingerprint = product_fingerprint(dict_properties) # Tells if the stored record changed
+        claims = [('local', self.store_data_locally, self.pid_list_locally, fingerprint),
+                  ('images', self.save_img, self.pid_list_images, product_fingerprint(dict_properties, IMAGE_FINGERPRINT_FIELDS)), # Images are downloaded again only if their links changed
+                  ('s3', self.store_data_on_S3, self.pid_list_s3, fingerprint), ('rds', self.store_data_in_rds_table, self.pid_list_rds, fingerprint)]
+        sinks = []
+        for sink, enabled, pid_list, sink_fingerprint in claims:
+            if enabled and self._claim_product(pid_list, product_id, sink_fingerprint):
+                task.fingerprints[sink] = sink_fingerprint
+                sinks.append(sink)
+        if 'images' not in sinks:
+            task.images.set_result([]) # No images to wait for
+        if self.refresh and not sinks:
+            print(f'{product_id} is unchanged')
+        task.expect(sinks)
+        if self.pipeline is not None:
+            self.pipeline.submit(task, sinks) # Stored by the sink workers while the browser moves on
+            return
+        def stored(task, sink, error):
+            if error is not None:
+                print(f"Couldn't store {product_id} in {sink}: {error}")
+            self._product_stored(task, sink, error)
+            task.sink_done(sink, error)
+        handlers = self.storage_handlers()
+        for sink in sinks:
+            store_task(handlers[sink], task, sink, stored)
+
+    def storage_handlers(self) -> dict:
+
+        '''
+        Returns
+        -------
+        dict
+            The name of each enabled sink -> the method storing a StorageTask in that sink
+        '''
+        return {name: self.sink(name).store for name in self.enabled_sinks()}
+
+    def _task_record(self, task: StorageTask) -> dict:
+
+        '''
+        Returns the record of a task, with the details of its thumbnails if --thumbnails is set (it waits for them).
+        If the images weren't downloaded again the details saved by the images sink are used
+        '''
+        if self.image_processor is None:
+            return task.dict_properties
+        thumbnails = [future.result() for future in task.images.result()]
+        if thumbnails:
+            thumbnails = [thumbnail for thumbnail in thumbnails if thumbnail]
+        else:
+            thumbnails = self.sink('images').stored_thumbnails(task.product_id) # The images weren't downloaded again
+        return dict(task.dict_properties, Thumbnails=[thumbnails])
+
+    def filter_new_links(self, links_list: list) -> list:
+
+        '''
+        This method drops the links of products already stored in every enabled sink, before any page is loaded.
+
+        The product id is read from the end of the link. Links without an id are always kept.
+        In refresh mode the stored products are kept too, unless they were stored (or checked) less than refresh_age hours ago.
+
+        Parameters
+        ----------
+        links_list (list)
+            The product links
+
+        Returns
+        -------
+        list
+            The links that still need to be scraped
+        '''
+        if not self._enabled_pid_lists():
+            return links_list
+        new_links = [link for link in links_list if self.is_new_link(link)]
+        print(f'{len(links_list) - len(new_links)} of {len(links_list)} products are already stored and will be skipped')
+        return new_links
+
+    def _enabled_pid_lists(self) -> list:
+        return [pid_list for enabled, pid_list in [(self.store_data_locally, self.pid_list_locally), (self.save_img, self.pid_list_images),
+                (self.store_data_on_S3, self.pid_list_s3), (self.store_data_in_rds_table, self.pid_list_rds)] if enabled]
+
+    def is_new_link(self, link: str) -> bool:
+
+        '''
+        Checks if a product link still needs to be scraped (see help(filter_new_links)), every link does if no sink is enabled
+        '''
+        pid_lists = self._enabled_pid_lists()
+        if not pid_lists:
+            return True # Nothing stored to compare with (like a --coordinator run)
+        product_id = product_id_from_link(link)
+        return product_id is None or any(self._needs_refresh(pid_list, product_id) for pid_list in pid_lists)
+
+    def open_product_page(self, link: str):
+
+        '''
+        This method opens a product page and waits until the product details are present
+
+        Parameters
+        ----------
+        link (str)
+            The product link
+        '''
+        if self.rate_limiter is not None: self.rate_limiter.acquire(link)
+        with METRICS.timer('page_load'):
+            self.driver.get(link) # Gets the link and open it
+            self.wait.element_present(PRODUCT_XPATH)
+        METRICS.inc('pages')
+        self.page_meter.record(self.driver, link)
+        if self.page_cache is not None:
+            self.page_cache.put(link, self.driver.page_source.encode('utf-8')) # Read by the next runs without the browser
+
+    def retrieve_cached_product_page(self, link: str) -> tuple:
+
+        '''
+        This method reads a product from the page cache without opening the browser
+
+        Parameters
+        ----------
+        link (str)
+            The product link
+
+        Returns
+        -------
+        tuple
+            A product dictionary and the HTML of the page, or (None, None) if the page isn't cached or can't be read (it raises in replay mode)
+        '''
+        html = self.page_cache.get(link) # Raises CacheMiss in replay mode
+        if html is None:
+            return None, None
+        try:
+            dict_properties = StaticEngine.parse(html, link)
+        except (ExtractionError, ValueError) as exc:
+            if self.page_cache.replay:
+                raise
+            print(f"Couldn't read the cached page of {link}: {exc}")
+            return None, None # Opened in the browser and cached again
+        print(dict_properties['Product_id'][0])
+        return dict_properties, html
+
+    def scrape_product(self, link: str, on_done = None):
+
         '''
-        dict_properties = self.retrieve_product_details()
-        product_id = dict_properties['Product_id'][0]
-        name = dict_properties['Name'][0].replace(" ", "")
-        # ------- Store Data locally ------- #
-        if self.store_data_locally and (product_id not in self.pid_list_locally): 
-            self.store_raw_data_locally(dict_properties, product_id) 
-            self.pid_list_locally.append(product_id)
-        # ---------- Store images ---------- #
-        if self.save_img and (product_id not in self.pid_list_images): 
-            self._download_image(f'{name}_', product_id) 
-            self._download_multiple_images(f'{name}_', product_id) 
-        # -------- Store Data on S3 -------- #
-        if self.store_data_on_S3 and (product_id not in self.pid_list_s3): 
-            if not self.store_data_locally:
-                self.store_raw_data_locally(dict_properties, product_id) # Locally stores the dictionary
-                self.store_to_S3_boto3(product_id) 
-                shutil.rmtree(f'./{self.folder_name}/{product_id}') # Removes directory after uploading on the S3 
-                print('Record removed successfully after storing it on the S3 bucket')
-                self.pid_list_s3.append(product_id)
+        This method extracts and stores one product.
+
+        With the static engine the page is read over HTTP and the browser is only used if that fails.
+        With a page cache the page is read from it first, and in replay mode the browser is never used.
+        The page is archived if --archive is set. The link is marked as failed in the crawl checkpoint if it can't be
+        extracted, and as done (or failed) once every sink stored the product (see help(_link_stored)).
+
+        Parameters
+        ----------
+        link (str)
+            The product link
+        on_done (function)
+            Called with the StorageTask once every sink stored the product or failed (see StorageTask.errors)
+        '''
+        dict_properties, html = None, None
+        start = perf_counter()
+        try:
+            if self.static_engine is not None:
+                dict_properties, html = self.static_engine.retrieve_product_page(link)
+            if dict_properties is None and self.static_engine is None and self.page_cache is not None:
+                dict_properties, html = self.retrieve_cached_product_page(link) # The static engine reads the page cache itself
+            if dict_properties is None:
+                if self.page_cache is not None and self.page_cache.replay:
+                    raise CacheMiss(f"{link} can't be read from the page cache")
+                self.open_product_page(link)
+                dict_properties = self.retrieve_product_details()
+                if self.page_archive is not None: html = self.driver.page_source.encode('utf-8')
+            if self.page_archive is not None:
+                self.page_archive.save(dict_properties['Product_id'][0], html, link)
+            self.store_data_final(dict_properties, on_done=lambda task: self._link_stored(link, task, on_done))
+        except Exception as exc:
+            METRICS.inc('products_failed')
+            if self.checkpoint is not None: self.checkpoint.mark_failed(link, str(exc)) # Tried again on resume
+            raise
+        METRICS.observe('product', perf_counter() - start) # Up to the hand-off to the storage pipeline
+        METRICS.inc('products')
+
+    def _link_stored(self, link: str, task: StorageTask, on_done = None):
+
+        '''
+        Marks a link as done in the crawl checkpoint once its product is stored in every sink, or as failed (it is tried again on resume)
+        '''
+        if self.checkpoint is not None:
+            if task.errors:
+                self.checkpoint.mark_failed(link, '; '.join(f'{sink}: {error}' for sink, error in task.errors.items()))
             else:
-                self.store_to_S3_boto3(product_id) 
-                self.pid_list_s3.append(product_id)
-        # -------- Store Data on RDS ------- #
-        if self.store_data_in_rds_table and (product_id not in self.pid_list_rds): 
-            df_products = pd.DataFrame(dict_properties)
-            self.store_tables_on_rds(df_products)
+                self.checkpoint.mark_done(link)
+        if on_done is not None:
+            on_done(task)
+
+    def spawn_worker(self):
+
+        '''
+        This method creates a new headless browser session that shares the storage settings of this object.
+
+        The product id lists, the lock and the S3/RDS clients are shared by reference, so every worker
+        sees the products already stored by the others.
+
+        Returns
+        -------
+        DataCollection
+            A worker with its own web driver
+        '''
+        worker = copy.copy(self) # Shallow copy keeps the same lists, lock and clients
+        Scraper.__init__(worker, self.url, headless=True, profile=self.profile.for_worker(next(self.worker_ids)),
+                         browser=self.driver is not None) # Gives the worker its own Chrome session and profile folder
+        worker.wait.timeout = self.wait.timeout
+        worker.accept_cookies()
+        return worker
+
+    def scrape_in_parallel(self, links_list: list):
+
+        '''
+        This method shares the product links across this scraper and num_workers - 1 new browser sessions.
+
+        Each worker takes the next link from a shared queue, opens it and stores the product details.
+
+        Parameters
+        ----------
+        links_list (list)
+            The product links to be scraped
+        '''
+        link_queue = queue.Queue()
+        for link in links_list:
+            link_queue.put(link)
+
+        def scrape_links(worker):
+            while True:
+                try:
+                    link = link_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    worker.scrape_product(link)
+                except Exception as exc:
+                    print(f"Couldn't scrape {link}: {exc}")
+
+        self._run_workers(scrape_links, min(self.num_workers, len(links_list)))
+
+    def _run_workers(self, run, num_workers: int):
+
+        '''
+        This method runs a function on this scraper and num_workers - 1 new browser sessions (see help(spawn_worker)),
+        and closes the new ones
+
+        Parameters
+        ----------
+        run (function)
+            Takes a worker and scrapes links with it
+        num_workers (int)
+            The number of browser sessions, this scraper's included
+        '''
+        def run_worker():
+            worker = self.spawn_worker()
+            try:
+                run(worker)
+            finally:
+                if worker.driver is not None: worker.driver.quit()
+                self.wait.merge(worker.wait) # Adds the worker's waiting times to the run report
+                self.page_meter.merge(worker.page_meter)
+
+        if num_workers < 1:
+            return # No links to scrape
+        if num_workers == 1:
+            return run(self)
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(run, self)] + [executor.submit(run_worker) for _ in range(num_workers - 1)]
+            for future in futures:
+                future.result() # Raises the error if a worker couldn't start
 
-    def scrape_data(self):
+    def scrape_from_queue(self):
+
+        '''
+        This method claims product links from the shared queue (see --queue) and scrapes them until the queue is drained.
+
+        Each link is leased to one worker at a time and completed once every sink stored its product. A link whose scraping
+        or storage failed goes back to the queue, and a link whose node stopped is claimed again once its lease expires.
+        The workers wait while the coordinator is still searching or the products of their links are being stored.
+        '''
+        def link_stored(link: str, name: str, task: StorageTask):
+            if task.errors:
+                self.work_queue.fail(link, name, '; '.join(f'{sink}: {error}' for sink, error in task.errors.items()))
+            else:
+                self.work_queue.complete(link, name)
+
+        def scrape_links(worker):
+            name = worker_name()
+            scraped = 0
+            while True:
+                link = self.work_queue.claim(name)
+                if link is None:
+                    if self.work_queue.drained():
+                        break
+                    sleep(self.queue_poll) # The other links are leased, being stored or not published yet
+                    continue
+                try:
+                    worker.scrape_product(link, on_done=lambda task, link=link: link_stored(link, name, task)) # Kept leased until it is stored
+                except Exception as exc:
+                    print(f"Couldn't scrape {link}: {exc}")
+                    self.work_queue.fail(link, name, str(exc))
+                    continue
+                scraped += 1
+            print(f'Worker {name} scraped {scraped} products')
+
+        self._run_workers(scrape_links, self.num_workers)
+        print(f'Shared queue {self.work_queue.path}: {self.work_queue.counts()}')
+
+    def scrape_data(self, argv: list = None):
 
         '''
         This function gets all the methods and actions to extrac/scrape all the necessary information from a website.
 
-        It first loads the Ikea page, gets to search box and types a keyword to be searched (like 'desk').
-        Then scrols down, and gets the URL of all products available, accessing each of them and extracting 
+        It first loads the Ikea page, gets to search box and types each keyword to be searched (like 'desk').
+        Then scrols down, and gets the URL of the new products (up to the target), accessing each of them and extracting 
         data for each product. The details will be stored in a dictionary. Then, stores data locally, on AWS 
         S3 or in a table on RDS.
+
+        Parameters
+        ----------
+        argv (list)
+            The arguments (see help(user_store_data_options)), if None they are read from the command line
+        '''
+        self.user_store_data_options(argv) 
+        profiler = None
+        if self.cprofile_path:
+            profiler = cProfile.Profile() # Profiles this thread, the workers' time shows up as waiting
+            profiler.enable()
+        try:
+            self.crawl()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.cprofile_path)
+                print(f'Profile saved to {self.cprofile_path}, the slowest calls:')
+                pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+            self.export_metrics()
+
+    def crawl(self):
+
+        '''
+        This method searches the keywords and scrapes and stores their products (see help(scrape_data)).
+
+        With --queue the links are shared with other nodes: the coordinator only publishes them and the workers only scrape them.
         '''
-        self.user_store_data_options() 
         self.accept_cookies() 
-        self.search_box(f'{self.search_word}') 
-        sleep(1)
-        self.scrol_down(1)
-        links_list = self.get_product_links(2) # Gets all links in multiple (n) pages
-        for link in links_list[:3]: ## temporary sets to first 3 products 
-            self.driver.get(link) # Gets each link and open it
-            sleep(0.5)
-            self.store_data_final()
-        self.driver.close()
\ No newline at end of file
+        links_list = []
+        if self.work_queue is not None:
+            if self.coordinator:
+                links_list = self.discover_links(self.keywords, self.target, self.max_pages)
+                print(f'Published {self.work_queue.publish(links_list)} new product links of {len(links_list)} to {self.work_queue.path}')
+                links_list = [] # Scraped by the workers
+        else:
+            self.checkpoint = CrawlCheckpoint(self.search_word, self.url, self.checkpoint_folder) # Keeps the links of this crawl in case it stops
+            if self.resume and self.checkpoint.discovery_complete():
+                links_list = self.checkpoint.pending_links() # Continues without searching again
+                print(f'Resuming the crawl of {self.search_word}: {len(links_list)} products left {self.checkpoint.counts()}')
+            else:
+                links_list = self.discover_links(self.keywords, self.target, self.max_pages) # Gets the links of new products, stops at the target
+                self.checkpoint.save_links(links_list)
+        try:
+            if self.work_queue is not None and not self.coordinator:
+                self.scrape_from_queue() # The links come from the coordinator
+            elif self.num_workers > 1:
+                self.scrape_in_parallel(links_list)
+            else:
+                for link in links_list:
+                    self.scrape_product(link)
+        finally:
+            if self.driver is not None: self.driver.close()
+            self.close_storage() # Stores everything already scraped, even if scraping stopped with an error
+        self.wait.print_report()
+        self.page_meter.print_stats()
+        if self.rate_limiter is not None:
+            self.rate_limiter.print_stats()
+
+    def export_metrics(self):
+
+        '''
+        This method saves the run metrics (see help(Metrics)) to the files set with --metrics-json and --metrics-prom
+        and stops the metrics server. It does nothing for a job of the job runner, other jobs still add to the metrics
+        '''
+        if self.shared_metrics:
+            return
+        report = METRICS.report()
+        print(f"\nRun metrics: {report['counters']} in {report['duration']:.1f}s")
+        if self.metrics_json:
+            METRICS.write_report(self.metrics_json)
+        if self.metrics_prom:
+            METRICS.write_prometheus(self.metrics_prom)
+        METRICS.close()
+
+    def close_storage(self):
+
+        '''
+        This method waits until every queued record, image and upload is stored and closes the connections
+        '''
+        if self.static_engine is not None:
+            self.static_engine.close()
+        if self.pipeline is not None:
+            self.pipeline.close() # Waits until every record is handed to its sinks
+            self.pipeline.print_stats()
+        self.downloader.close(save=False) # Waits for the images still in the queue
+        if self.save_img:
+            self.downloader.print_stats()
+        if self.image_processor is not None:
+            self.image_processor.close() # Waits for the thumbnails still in the queue
+            self.image_processor.print_stats()
+        for sink in self.sinks.values():
+            sink.close() # Waits for the uploads still running and writes the records left in the buffers
+        if self.downloader.store is not None:
+            self.downloader.store.save() # Once the S3 uploads of the images are done
+        if self.seen_index is not None:
+            self.seen_index.close()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+        if self.work_queue is not None:
+            self.work_queue.close()
+        if self.page_cache is not None:
+            self.page_cache.print_stats()
+            self.page_cache.close()
\ No newline at end of file
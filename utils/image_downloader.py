@@ -0,0 +1,237 @@
+'''
+This code is to work on Data Collection Pipeline project
+It downloads product images in the background over reused HTTP connections
+'''
+import os
+import hashlib
+import threading
+import requests
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor, Future
+from requests.adapters import HTTPAdapter
+from utils.image_store import ImageStore
+from utils.rate_limiter import HostRateLimiter
+from utils.metrics import METRICS, percentile
+
+class ImageDownloader:
+
+    '''
+    This class downloads images on a pool of threads. The scraper pushes images with submit() and continues without waiting.
+    With an ImageStore each image link is downloaded only once and linked to every path it is requested for.
+    It has the following methods:
+
+    __init__(self, max_workers: int = 8, timeout: float = 30, chunk_size: int = 65536, store: ImageStore = None, rate_limiter: HostRateLimiter = None)
+    submit(self, url: str, path: str)
+    _submit_to_store(self, url: str, path: str)
+    _forget(self, key: str, download: Future)
+    _stream(self, url: str, part_path: str)
+    _download(self, url: str, path: str)
+    _download_to_store(self, url: str, key: str)
+    close(self, save: bool = True)
+    stats(self)
+    print_stats(self)
+    '''
+    def __init__(self, max_workers: int = 8, timeout: float = 30, chunk_size: int = 65536, store: ImageStore = None, rate_limiter: HostRateLimiter = None):
+
+        '''
+        This function initialize the HTTP session and the pool of download threads.
+
+        Parameters
+        ----------
+        max_workers (int)
+            The maximum number of images downloaded at the same time
+        timeout (float)
+            The timeout (in seconds) of each request
+        chunk_size (int)
+            The number of bytes written to disk at a time
+        store (ImageStore)
+            The content addressed store to deduplicate images, if None every image is downloaded to its own path
+        rate_limiter (HostRateLimiter)
+            Spaces out the requests to each host, shared with the scraper (None for no limit)
+        '''
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers) # Keeps connections alive between images
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image')
+        self.lock = threading.Lock()
+        self.bytes_downloaded = 0
+        self.latencies = []
+        self.failures = []
+        self.store = store
+        self.rate_limiter = rate_limiter
+        self.in_flight = {} # Normalized image link -> future of its download in this run
+        self.deduplicated = 0
+
+    def submit(self, url: str, path: str):
+
+        '''
+        Queues an image to be downloaded and returns immediately
+
+        Parameters
+        ----------
+        url (str)
+            The image link
+        path (str)
+            Where the image is saved
+
+        Returns
+        -------
+        Future
+            Resolves to True if the image was saved
+        '''
+        if self.store is not None:
+            return self._submit_to_store(url, path)
+        return self.executor.submit(self._download, url, path)
+
+    def _submit_to_store(self, url: str, path: str):
+
+        '''
+        Downloads an image link into the store only if it wasn't downloaded before, then links it to path
+        '''
+        key = self.store.normalize_url(url)
+        with self.lock:
+            download = self.in_flight.get(key)
+            if download is None:
+                sha = self.store.lookup(key)
+                if sha is None:
+                    download = self.executor.submit(self._download_to_store, url, key)
+                else:
+                    download = Future()
+                    download.set_result(sha) # Downloaded in a previous run
+                    self.deduplicated += 1
+                self.in_flight[key] = download
+            else:
+                self.deduplicated += 1
+        linked = Future()
+        def link(download: Future):
+            try:
+                sha = download.result()
+                if sha is None:
+                    self._forget(key, download) # Downloaded again if another product asks for it
+                linked.set_result(sha is not None and self.store.link(sha, path))
+            except Exception as exc:
+                print(f"Couldn't store this image: {url} ({exc})")
+                self._forget(key, download)
+                linked.set_result(False) # Always resolved, the sinks wait for it
+        download.add_done_callback(link)
+        return linked
+
+    def _forget(self, key: str, download: Future):
+
+        '''
+        Drops a failed download of an image link, so a later request downloads it again
+        '''
+        with self.lock:
+            if self.in_flight.get(key) is download:
+                del self.in_flight[key]
+
+    def _stream(self, url: str, part_path: str) -> str:
+
+        '''
+        Streams an image to a temporary file and records the stats
+
+        Returns
+        -------
+        str
+            The sha256 of the content, or None if the download failed
+        '''
+        start = perf_counter()
+        size = 0
+        sha = hashlib.sha256()
+        try:
+            os.makedirs(os.path.dirname(part_path) or '.', exist_ok=True)
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(url)
+            with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                with open(part_path, 'wb') as fp:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        fp.write(chunk)
+                        sha.update(chunk)
+                        size += len(chunk)
+        except (requests.RequestException, OSError) as exc:
+            print(f"Couldn't download this image: {url} ({exc})")
+            if self.rate_limiter is not None and getattr(getattr(exc, 'response', None), 'status_code', None) in (429, 503):
+                self.rate_limiter.throttled(url)
+            if os.path.exists(part_path): os.remove(part_path)
+            with self.lock:
+                self.failures.append(url)
+            METRICS.inc('image_failures')
+            return None
+        latency = perf_counter() - start
+        with self.lock:
+            self.bytes_downloaded += size
+            self.latencies.append(latency)
+        METRICS.observe('image_download', latency)
+        METRICS.inc('images')
+        METRICS.inc('image_bytes', size)
+        return sha.hexdigest()
+
+    def _download(self, url: str, path: str) -> bool:
+
+        '''
+        Streams an image to disk. It is written to a temporary file first, so a failed download never leaves a broken image
+        '''
+        part_path = f'{path}.part'
+        if self._stream(url, part_path) is None:
+            return False
+        os.replace(part_path, path)
+        return True
+
+    def _download_to_store(self, url: str, key: str):
+
+        '''
+        Streams an image into the store
+
+        Returns
+        -------
+        str
+            The content hash, or None if the download failed
+        '''
+        tmp_path = self.store.tmp_path()
+        sha = self._stream(url, tmp_path)
+        if sha is None:
+            return None
+        return self.store.add(key, tmp_path, sha)
+
+    def close(self, save: bool = True):
+
+        '''
+        Waits for the queued images and closes the connections
+
+        Parameters
+        ----------
+        save (bool)
+            Saves the index of the image store, or leaves it to the caller (like after the S3 uploads of its images)
+        '''
+        self.executor.shutdown(wait=True)
+        self.session.close()
+        if save and self.store is not None:
+            self.store.save()
+
+    def stats(self) -> dict:
+
+        '''
+        Returns
+        -------
+        dict
+            The number of images and bytes downloaded, the failures and the latency percentiles (in seconds)
+        '''
+        with self.lock:
+            latencies = list(self.latencies)
+            return {'images': len(latencies), 'bytes': self.bytes_downloaded, 'failures': len(self.failures), 'deduplicated': self.deduplicated,
+                    'latency_p50': round(percentile(latencies, 50), 4), 'latency_p95': round(percentile(latencies, 95), 4),
+                    'latency_p99': round(percentile(latencies, 99), 4)}
+
+    def print_stats(self):
+
+        '''
+        Prints the download stats of this run
+        '''
+        stats = self.stats()
+        print(f"\nImages downloaded: {stats['images']} ({stats['bytes'] / 1e6:.2f} MB), deduplicated: {stats['deduplicated']}, failures: {stats['failures']}")
+        print(f"  latency p50: {stats['latency_p50']}s, p95: {stats['latency_p95']}s, p99: {stats['latency_p99']}s")
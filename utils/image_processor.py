@@ -0,0 +1,186 @@
+'''
+This code is to work on Data Collection Pipeline project
+It turns the downloaded images into fixed-size thumbnails (resized and re-encoded) on a pool of processes
+'''
+import os
+import hashlib
+import threading
+import multiprocessing
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor, Future
+from utils.metrics import METRICS
+
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG', 'png': 'PNG'}
+
+def parse_size(size: str) -> tuple:
+
+    '''
+    Reads a thumbnail size like '256' (a square) or '320x240' (width x height)
+    '''
+    width, _, height = str(size).lower().partition('x')
+    return int(width), int(height or width)
+
+def make_thumbnail(path: str, size: tuple, fmt: str = 'webp', quality: int = 80, keep_original: bool = True) -> dict:
+
+    '''
+    Resizes an image to a thumbnail of exactly size (centered and cropped to the same aspect ratio) and re-encodes it, in a worker process
+
+    Parameters
+    ----------
+    path (str)
+        The downloaded image
+    size (tuple)
+        The width and height of the thumbnail
+    fmt (str)
+        The format of the thumbnail (a key of FORMATS)
+    quality (int)
+        The encoding quality, from 1 to 100 (ignored for png)
+    keep_original (bool)
+        Keeps the downloaded image next to its thumbnail, or removes it from the product folder
+
+    Returns
+    -------
+    dict
+        The thumbnail file name, its size, format, bytes and sha256, and the bytes and sha256 of the original image
+    '''
+    from PIL import Image, ImageOps
+    start = perf_counter()
+    with open(path, 'rb') as fp:
+        original = fp.read()
+    thumbnail_path = f'{os.path.splitext(path)[0]}.thumb.{fmt}'
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if fmt != 'jpeg' and image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        thumbnail = ImageOps.fit(image, size, Image.LANCZOS)
+        options = {} if fmt == 'png' else {'quality': quality}
+        thumbnail.save(f'{thumbnail_path}.tmp', FORMATS[fmt], **options)
+    os.replace(f'{thumbnail_path}.tmp', thumbnail_path)
+    with open(thumbnail_path, 'rb') as fp:
+        encoded = fp.read()
+    if not keep_original:
+        os.remove(path) # Only the product folder link, the image store keeps its copy
+    return {'file': os.path.basename(thumbnail_path), 'width': size[0], 'height': size[1], 'format': fmt, 'bytes': len(encoded),
+            'sha256': hashlib.sha256(encoded).hexdigest(), 'original': os.path.basename(path), 'original_bytes': len(original),
+            'original_sha256': hashlib.sha256(original).hexdigest(), 'seconds': perf_counter() - start}
+
+class ImageProcessor:
+
+    '''
+    This class makes a thumbnail of each downloaded image on a pool of processes, as resizing and encoding are CPU bound.
+    It needs Pillow (pip install Pillow).
+    It has the following methods:
+
+    __init__(self, size: tuple = (256, 256), fmt: str = 'webp', quality: int = 80, keep_originals: bool = True, max_workers: int = None)
+    process(self, download: Future, path: str)
+    close(self)
+    stats(self)
+    print_stats(self)
+    '''
+    def __init__(self, size: tuple = (256, 256), fmt: str = 'webp', quality: int = 80, keep_originals: bool = True, max_workers: int = None):
+
+        '''
+        This function starts the pool of processes.
+
+        Parameters
+        ----------
+        size (tuple)
+            The width and height of the thumbnails
+        fmt (str)
+            The format of the thumbnails (a key of FORMATS)
+        quality (int)
+            The encoding quality, from 1 to 100
+        keep_originals (bool)
+            Keeps the downloaded images in the product folders (and on S3) next to their thumbnails
+        max_workers (int)
+            The number of processes (default: the number of cores)
+        '''
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown thumbnail format {fmt}, use one of {list(FORMATS)}')
+        import PIL # Checks the optional dependency before anything is scraped (pip install Pillow)
+        self.size = tuple(size)
+        self.fmt = fmt
+        self.quality = min(100, max(1, quality))
+        self.keep_originals = keep_originals
+        self.executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) # The scraper threads aren't copied into the workers
+        self.lock = threading.Lock()
+        self.thumbnails = 0
+        self.failures = 0
+        self.original_bytes = 0
+        self.thumbnail_bytes = 0
+
+    def process(self, download: Future, path: str) -> Future:
+
+        '''
+        Makes the thumbnail of an image once its download is done
+
+        Parameters
+        ----------
+        download (Future)
+            The download of the image (see ImageDownloader.submit)
+        path (str)
+            The path the image is downloaded to
+
+        Returns
+        -------
+        Future
+            Resolved with the thumbnail details (see help(make_thumbnail)), or None if the download or the processing failed
+        '''
+        processed = Future()
+        path = os.path.abspath(path) # The worker processes may not share the working folder
+        def done(thumbnail: Future):
+            try:
+                result = thumbnail.result()
+            except Exception as exc:
+                print(f"Couldn't make the thumbnail of {path}: {exc}")
+                with self.lock:
+                    self.failures += 1
+                processed.set_result(None)
+                return
+            seconds = result.pop('seconds')
+            with self.lock:
+                self.thumbnails += 1
+                self.original_bytes += result['original_bytes']
+                self.thumbnail_bytes += result['bytes']
+            METRICS.observe('image_resize', seconds)
+            METRICS.inc('thumbnails')
+            METRICS.inc('thumbnail_bytes', result['bytes'])
+            processed.set_result(result)
+        def downloaded(download: Future):
+            if download.exception() is not None or not download.result():
+                processed.set_result(None) # The download failed
+                return
+            try:
+                self.executor.submit(make_thumbnail, path, self.size, self.fmt, self.quality, self.keep_originals).add_done_callback(done)
+            except RuntimeError as exc: # The pool is closed
+                print(f"Couldn't make the thumbnail of {path}: {exc}")
+                processed.set_result(None)
+        download.add_done_callback(downloaded)
+        return processed
+
+    def close(self):
+
+        '''
+        Waits for the queued thumbnails and stops the processes
+        '''
+        self.executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+
+        '''
+        Returns
+        -------
+        dict
+            The number of thumbnails and failures, and the bytes of the originals and of their thumbnails
+        '''
+        with self.lock:
+            return {'thumbnails': self.thumbnails, 'failures': self.failures, 'original_bytes': self.original_bytes, 'thumbnail_bytes': self.thumbnail_bytes}
+
+    def print_stats(self):
+
+        '''
+        Prints the thumbnail stats of this run
+        '''
+        stats = self.stats()
+        ratio = stats['original_bytes'] / stats['thumbnail_bytes'] if stats['thumbnail_bytes'] else 0
+        print(f"Thumbnails: {stats['thumbnails']} made, {stats['failures']} failed, {stats['original_bytes'] / 1048576:.1f} MB of images "
+              f"-> {stats['thumbnail_bytes'] / 1048576:.1f} MB ({ratio:.1f}x smaller)")
@@ -0,0 +1,200 @@
+'''
+This code is to work on Data Collection Pipeline project
+It keeps one copy of each image, addressed by the hash of its content, and links it into the product folders
+'''
+import os
+import json
+import uuid
+import shutil
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+SAVE_LOCK = threading.Lock() # The stores of concurrent jobs (see utils.job_runner) save the same index one at a time
+
+class ImageStore:
+
+    '''
+    This class stores every unique image once under 'image_store/<hash>' and hardlinks it into the product folders.
+    It has the following methods:
+
+    __init__(self, folder_name: str = 'raw_data')
+    normalize_url(url: str)
+    lookup(self, key: str)
+    tmp_path(self)
+    blob_path(self, sha: str)
+    add(self, key: str, tmp_path: str, sha: str)
+    link(self, sha: str, path: str)
+    sha_of(self, path: str)
+    is_uploaded(self, sha: str)
+    mark_uploaded(self, sha: str)
+    save(self)
+    '''
+    def __init__(self, folder_name: str = 'raw_data'):
+
+        '''
+        This function loads the index of the images downloaded in previous runs.
+
+        Parameters
+        ----------
+        folder_name (str)
+            The folder where data is stored, the store is created in '<folder_name>/image_store'
+        '''
+        self.root = os.path.join(folder_name, 'image_store')
+        self.index_path = os.path.join(self.root, 'index.json')
+        self.lock = threading.Lock()
+        self.urls = {} # Normalized image link -> content hash
+        self.uploaded = set() # Content hashes already uploaded to S3
+        self.paths = {} # Product image path -> content hash, for the images linked in this run
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as fp:
+                index = json.load(fp)
+            self.urls = index.get('urls', {})
+            self.uploaded = set(index.get('uploaded', []))
+
+    @staticmethod
+    def normalize_url(url: str) -> str:
+
+        '''
+        Normalizes an image link, so the same image requested with a different case or parameter order has one key
+
+        Parameters
+        ----------
+        url (str)
+            The image link
+
+        Returns
+        -------
+        str
+            The normalized link
+        '''
+        parts = urlsplit(url.strip())
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, '')) # Drops the fragment
+
+    def lookup(self, key: str):
+
+        '''
+        Returns the content hash of an image link downloaded before, or None
+        '''
+        with self.lock:
+            sha = self.urls.get(key)
+        if sha is not None and os.path.exists(self.blob_path(sha)):
+            return sha
+        return None
+
+    def tmp_path(self) -> str:
+
+        '''
+        Returns a unique temporary path inside the store to download an image to
+        '''
+        os.makedirs(os.path.join(self.root, 'tmp'), exist_ok=True)
+        return os.path.join(self.root, 'tmp', f'{uuid.uuid4()}.part')
+
+    def blob_path(self, sha: str) -> str:
+
+        '''
+        Returns the path of an image in the store
+        '''
+        return os.path.join(self.root, sha[:2], f'{sha}.jpg')
+
+    def add(self, key: str, tmp_path: str, sha: str) -> str:
+
+        '''
+        Moves a downloaded image into the store. If the same content is already stored, the download is discarded.
+
+        Parameters
+        ----------
+        key (str)
+            The normalized image link
+        tmp_path (str)
+            The downloaded file
+        sha (str)
+            The sha256 of the file content
+
+        Returns
+        -------
+        str
+            The content hash
+        '''
+        blob_path = self.blob_path(sha)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        with self.lock:
+            if os.path.exists(blob_path):
+                os.remove(tmp_path) # Another link served the same image
+            else:
+                os.replace(tmp_path, blob_path)
+            self.urls[key] = sha
+        return sha
+
+    def link(self, sha: str, path: str) -> bool:
+
+        '''
+        Links an image of the store into a product folder (copies it if the file system has no hardlinks)
+
+        Parameters
+        ----------
+        sha (str)
+            The content hash
+        path (str)
+            The path of the image in the product folder
+
+        Returns
+        -------
+        bool
+            True if the image was linked
+        '''
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        try:
+            if os.path.exists(path): os.remove(path)
+            try:
+                os.link(self.blob_path(sha), path)
+            except OSError:
+                shutil.copyfile(self.blob_path(sha), path)
+        except OSError as exc:
+            print(f"Couldn't link image {sha} to {path} ({exc})")
+            return False
+        with self.lock:
+            self.paths[os.path.normpath(path)] = sha
+        return True
+
+    def sha_of(self, path: str):
+
+        '''
+        Returns the content hash of a product image linked in this run, or None
+        '''
+        with self.lock:
+            return self.paths.get(os.path.normpath(path))
+
+    def is_uploaded(self, sha: str) -> bool:
+
+        '''
+        Checks if an image is on S3 already (uploaded in this run or a previous one)
+        '''
+        with self.lock:
+            return sha in self.uploaded
+
+    def mark_uploaded(self, sha: str):
+
+        '''
+        Records that an image is on S3, once its upload succeeded
+        '''
+        with self.lock:
+            self.uploaded.add(sha)
+
+    def save(self):
+
+        '''
+        Saves the index, so the next runs don't download or upload the same images again.
+        It is merged with the index on disk, which other jobs on the same folder may have saved meanwhile
+        '''
+        os.makedirs(self.root, exist_ok=True)
+        with SAVE_LOCK:
+            saved = {}
+            if os.path.exists(self.index_path):
+                with open(self.index_path) as fp:
+                    saved = json.load(fp)
+            with self.lock:
+                index = {'urls': dict(saved.get('urls', {}), **self.urls), 'uploaded': sorted(self.uploaded.union(saved.get('uploaded', [])))}
+            with open(f'{self.index_path}.tmp', 'w') as fp:
+                json.dump(index, fp)
+            os.replace(f'{self.index_path}.tmp', self.index_path)
@@ -0,0 +1,321 @@
+'''
+This code is to work on Data Collection Pipeline project
+It runs a file of crawl jobs (keyword, locale, sinks, priority) over a pool of workers sharing one rate limiter per host
+'''
+import json
+import queue
+import hashlib
+import sqlite3
+import argparse
+import threading
+from time import time
+from utils.metrics import METRICS
+from utils.checkpoint import CrawlCheckpoint
+from utils.rate_limiter import HostRateLimiter
+from utils.browser_profile import BrowserProfile, add_arguments as add_browser_arguments
+
+SINK_FLAGS = {'local': '--local', 's3': '--s3', 'rds': '--rds', 'images': '--imgs', 'imgs': '--imgs'}
+
+class CrawlJob:
+
+    '''
+    A crawl job, read from a line of a jobs file like:
+    {"keyword": "desk", "url": "https://www.ikea.com/gb/en/", "sinks": ["local", "images"], "priority": 2, "target": 50, "args": ["--engine", "static"]}
+
+    keyword can be a list of words. url, sinks (default ["local"]), priority (higher runs first, default 0), target and args are optional.
+    The id (default: from the keyword, url, sinks, target and args) keeps the status of the job between runs.
+    '''
+    def __init__(self, job: dict, position: int = 0):
+        keyword = job['keyword']
+        self.keyword = ','.join(keyword) if isinstance(keyword, list) else keyword
+        self.url = job.get('url', 'https://www.ikea.com/gb/en/')
+        self.sinks = job.get('sinks', ['local'])
+        unknown = [sink for sink in self.sinks if sink not in SINK_FLAGS]
+        if unknown:
+            raise ValueError(f'Unknown sinks {unknown}, use some of {list(SINK_FLAGS)}')
+        self.priority = job.get('priority', 0)
+        self.target = job.get('target')
+        self.args = [str(arg) for arg in job.get('args', [])]
+        self.position = position
+        variant = json.dumps([sorted(set(SINK_FLAGS[sink] for sink in self.sinks)), self.target, self.args]) # The same search stored elsewhere is another job
+        self.job_id = job.get('id') or f"{CrawlCheckpoint.job_name(self.keyword, self.url)}_{hashlib.sha1(variant.encode('utf-8')).hexdigest()[:8]}"
+
+    def argv(self, common_args: list = None) -> list:
+
+        '''
+        Returns the arguments of DataCollection.scrape_data for this job (see help(StoreData.user_store_data_options))
+        '''
+        argv = ['--word', self.keyword] + list(dict.fromkeys(SINK_FLAGS[sink] for sink in self.sinks))
+        if self.target is not None:
+            argv += ['--target', str(self.target)]
+        return argv + list(common_args or []) + self.args # The job's own arguments come last and win
+
+def read_jobs(path: str) -> list:
+
+    '''
+    Reads a JSONL file of crawl jobs, one job per line (empty lines and lines starting with # are skipped)
+
+    Returns
+    -------
+    list
+        The CrawlJob of each line
+
+    Raises
+    ------
+    ValueError
+        If two jobs have the same id, the second would be skipped as done
+    '''
+    jobs = []
+    with open(path) as fp:
+        for line in fp:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                jobs.append(CrawlJob(json.loads(line), len(jobs)))
+    job_ids = [job.job_id for job in jobs]
+    duplicates = sorted({job_id for job_id in job_ids if job_ids.count(job_id) > 1})
+    if duplicates:
+        raise ValueError(f'Jobs {duplicates} of {path} are repeated, remove them or give them different ids')
+    return jobs
+
+class JobStatus:
+
+    '''
+    This class keeps the status of each job (pending, running, done or failed) in a SQLite file, so a file of jobs can be run again
+    without repeating the finished ones.
+    It has the following methods:
+
+    __init__(self, path: str = 'jobs_status.sqlite')
+    add(self, job: CrawlJob)
+    status(self, job_id: str)
+    start(self, job_id: str)
+    finish(self, job_id: str)
+    fail(self, job_id: str, error: str)
+    counts(self)
+    close(self)
+    '''
+    def __init__(self, path: str = 'jobs_status.sqlite'):
+
+        '''
+        This function opens (or creates) the status file.
+
+        Parameters
+        ----------
+        path (str)
+            The path of the SQLite file
+        '''
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False) # Shared by the worker threads behind the lock
+        with self.lock, self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, keyword TEXT, url TEXT, priority INTEGER, status TEXT NOT NULL, '
+                              'attempts INTEGER NOT NULL DEFAULT 0, error TEXT, started_at REAL, finished_at REAL)')
+
+    def add(self, job: CrawlJob):
+
+        '''
+        Records a job as pending, a job already known keeps its status
+        '''
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO jobs (job_id, keyword, url, priority, status) VALUES (?, ?, ?, ?, 'pending')",
+                              (job.job_id, job.keyword, job.url, job.priority))
+
+    def status(self, job_id: str):
+
+        '''
+        Returns the status of a job, or None if it is unknown
+        '''
+        with self.lock:
+            row = self.conn.execute('SELECT status FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def start(self, job_id: str):
+
+        '''
+        Records that a job started
+        '''
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, error = NULL, started_at = ?, finished_at = NULL WHERE job_id = ?", (time(), job_id))
+
+    def finish(self, job_id: str):
+
+        '''
+        Records that a job is done
+        '''
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE jobs SET status = 'done', finished_at = ? WHERE job_id = ?", (time(), job_id))
+
+    def fail(self, job_id: str, error: str):
+
+        '''
+        Records that a job failed, it runs again with the next run of the file
+        '''
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE job_id = ?", (error, time(), job_id))
+
+    def counts(self) -> dict:
+
+        '''
+        Returns
+        -------
+        dict
+            The number of jobs for each status
+        '''
+        with self.lock:
+            return dict(self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def close(self):
+
+        '''
+        Closes the status file
+        '''
+        with self.lock:
+            self.conn.close()
+
+class JobRunner:
+
+    '''
+    This class runs crawl jobs on a pool of worker threads, highest priority first. Each job gets its own scraper
+    and all of them share one HostRateLimiter. The jobs add to the same metrics, which are exported once they are all finished.
+    It has the following methods:
+
+    __init__(self, jobs: list, status: JobStatus, num_workers: int = 2, rate_limiter: HostRateLimiter = None, common_args: list = None, scraper_factory = None)
+    _new_scraper(self, url: str)
+    run_job(self, job: CrawlJob)
+    export_metrics(self)
+    run(self, rerun: bool = False)
+    '''
+    def __init__(self, jobs: list, status: JobStatus, num_workers: int = 2, rate_limiter: HostRateLimiter = None, common_args: list = None, scraper_factory = None):
+
+        '''
+        This function initialize the runner.
+
+        Parameters
+        ----------
+        jobs (list)
+            The CrawlJob to run
+        status (JobStatus)
+            Where the status of each job is kept
+        num_workers (int)
+            The number of jobs running at the same time
+        rate_limiter (HostRateLimiter)
+            Spaces out the requests of all jobs to each host
+        common_args (list)
+            Arguments passed to every job (ex: ['--lean', '--engine', 'static'])
+        scraper_factory (function)
+            Builds the scraper of a job from its url (default: a headless DataCollection)
+        '''
+        self.jobs = jobs
+        self.status = status
+        self.num_workers = max(1, num_workers)
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.common_args = list(common_args or [])
+        self.scraper_factory = scraper_factory or self._new_scraper
+
+    def _new_scraper(self, url: str):
+        from utils.ikea import DataCollection # Imported here so the jobs file can be checked without Selenium
+        parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False) # --profile isn't taken for --profile-dir
+        add_browser_arguments(parser)
+        parser.add_argument('--replay', action='store_true', default=False)
+        args, _ = parser.parse_known_args(self.common_args)
+        if args.replay:
+            return DataCollection(url, profile=BrowserProfile.from_args(args), browser=False) # Every page is read from the page cache
+        self.rate_limiter.acquire(url) # The home page is loaded when the browser starts
+        return DataCollection(url, headless=True, profile=BrowserProfile.from_args(args))
+
+    def run_job(self, job: CrawlJob):
+
+        '''
+        Runs one job and records its status
+
+        Parameters
+        ----------
+        job (CrawlJob)
+            The job to run
+        '''
+        print(f"\nStarting job {job.job_id} ('{job.keyword}' on {job.url}, priority {job.priority})")
+        self.status.start(job.job_id)
+        scraper = None
+        try:
+            scraper = self.scraper_factory(job.url)
+            scraper.rate_limiter = self.rate_limiter # Shared by every job
+            scraper.shared_metrics = True # Exported by the runner, the other jobs are still running
+            scraper.scrape_data(job.argv(self.common_args))
+        except (Exception, SystemExit) as exc: # argparse and check_config_file exit on bad arguments or config
+            print(f'Job {job.job_id} failed: {exc!r}')
+            self.status.fail(job.job_id, repr(exc))
+            return
+        finally:
+            if scraper is not None:
+                try:
+                    scraper.driver.quit()
+                except Exception:
+                    pass # Already closed
+        self.status.finish(job.job_id)
+        print(f'Job {job.job_id} done')
+
+    def export_metrics(self):
+
+        '''
+        Saves the metrics of all the jobs to the files set with --metrics-json and --metrics-prom in the common arguments
+        and stops the metrics server
+        '''
+        parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+        parser.add_argument('--metrics-json', type=str, default=None)
+        parser.add_argument('--metrics-prom', type=str, default=None)
+        args, _ = parser.parse_known_args(self.common_args)
+        report = METRICS.report()
+        print(f"\nRun metrics: {report['counters']} in {report['duration']:.1f}s")
+        if args.metrics_json:
+            METRICS.write_report(args.metrics_json)
+        if args.metrics_prom:
+            METRICS.write_prometheus(args.metrics_prom)
+        METRICS.close()
+
+    def run(self, rerun: bool = False) -> dict:
+
+        '''
+        Runs the jobs which are not done yet (or all of them if rerun) and waits until they are finished
+
+        Returns
+        -------
+        dict
+            The number of jobs for each status
+        '''
+        job_queue = queue.PriorityQueue()
+        for job in self.jobs:
+            self.status.add(job)
+            if rerun or self.status.status(job.job_id) != 'done':
+                job_queue.put((-job.priority, job.position, job)) # Highest priority first, then in the file order
+        print(f'{job_queue.qsize()} of {len(self.jobs)} jobs to run on {self.num_workers} workers')
+
+        def run_worker():
+            while True:
+                try:
+                    _, _, job = job_queue.get_nowait()
+                except queue.Empty:
+                    break
+                self.run_job(job)
+
+        threads = [threading.Thread(target=run_worker, name=f'job-worker-{k}') for k in range(self.num_workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.rate_limiter.print_stats()
+        self.export_metrics()
+        counts = self.status.counts()
+        print(f'Jobs: {counts}')
+        return counts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs a JSONL file of crawl jobs, other arguments are passed to every job (ex: --lean)')
+    parser.add_argument('--jobs', type=str, default='jobs.jsonl', help='JSONL file of crawl jobs (ex: jobs.jsonl)')
+    parser.add_argument('--status', type=str, default='jobs_status.sqlite', help='File of the status of each job (ex: jobs_status.sqlite)')
+    parser.add_argument('--job-workers', type=int, default=2, help='Number of jobs running at the same time (ex: 4)')
+    parser.add_argument('--rate', type=float, default=2, help='Maximum requests per second to each host, shared by all jobs (ex: 2)')
+    parser.add_argument('--burst', type=int, default=4, help='Requests that can be sent at once to a host (ex: 4)')
+    parser.add_argument('--rerun', action='store_true', default=False, help='Run the jobs already done again')
+    args, common_args = parser.parse_known_args()
+    status = JobStatus(args.status)
+    runner = JobRunner(read_jobs(args.jobs), status, args.job_workers, HostRateLimiter(args.rate, args.burst), common_args)
+    runner.run(args.rerun)
+    status.close()
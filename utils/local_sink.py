@@ -0,0 +1,151 @@
+'''
+This code is to work on Data Collection Pipeline project
+It stores the product records (as data.json folders or segment files) and their images on the local disk
+'''
+import os
+import json
+from os import walk
+from utils.sinks import Sink
+from utils.pipeline import when_all
+from utils.metrics import METRICS
+from utils.image_downloader import ImageDownloader
+from utils.image_store import ImageStore
+
+class LocalSink(Sink):
+
+    '''
+    This class stores each product record as '<folder_name>/<product id>/data.json', or in segment files if --local-format is set.
+    It has the following methods:
+
+    open(self, args)
+    index_key(self)
+    stored_ids(self)
+    write(self, dict_properties: dict, dir_name: str = '_')
+    store(self, task)
+    close(self)
+    '''
+    name = 'local'
+
+    def open(self, args):
+        if args.local_format != 'dirs':
+            from utils.segment_store import SegmentStore
+            self.collection.segment_store = SegmentStore(self.collection.folder_name, args.local_format, max(1, args.segment_size),
+                                                          flush_interval=args.local_flush_interval) # Few large files instead of one folder per product
+
+    def index_key(self) -> str:
+        return f'local:{self.collection.folder_name}'
+
+    def stored_ids(self) -> list:
+        folder_name = self.collection.folder_name
+        if self.collection.segment_store is not None:
+            return self.collection.segment_store.product_ids() # Read from the segment index, no folders to walk
+        pid_list = next(walk(f'./{folder_name}/'), (None, [], []))[1] # Returns a list of previouse recordes to avoid data rescraping locally
+        return [pid for pid in pid_list if os.path.exists(f'./{folder_name}/{pid}/data.json')] # Skips folders which aren't records (like image_store)
+
+    def write(self, dict_properties: dict, dir_name: str = '_'):
+
+        '''
+        Stores a product dictionary as a json file, or appends it to the segment files
+
+        Parameters
+        ----------
+        dict_properties (dict)
+            The product dictionary
+        dir_name (str)
+            The folder of the product (like the product id)
+
+        Returns
+        -------
+        Future
+            Resolved once the segment batch of the record is written, None if the json file is written already
+        '''
+        print('Storing data locally ...')
+        folder_name = self.collection.folder_name
+        with METRICS.timer('local_write'):
+            if self.collection.segment_store is not None:
+                return self.collection.segment_store.append(dict_properties)
+            os.makedirs(f'{folder_name}/{dir_name}', exist_ok=True) # Creats folders and subfolders if they're not exist
+            with open(f'./{folder_name}/{dir_name}/data.json', 'w') as fp:
+                json.dump(dict_properties, fp) # Saves dict in a json file
+
+    def store(self, task):
+        # ------- Store Data locally ------- #
+        return self.write(self.collection._task_record(task), task.product_id) # Stored once its segment batch is written
+
+    def close(self):
+        if self.collection.segment_store is not None:
+            self.collection.segment_store.close() # Writes the records left in the buffer
+
+class ImageSink(Sink):
+
+    '''
+    This class downloads the images of each product to '<folder_name>/<product id>/images', through the shared image store.
+    With --thumbnails the details of the thumbnails are kept in '<folder_name>/thumbnails/<product id>.json', for the records
+    of the runs which don't download the images again.
+    It has the following methods:
+
+    open(self, args)
+    index_key(self)
+    stored_ids(self)
+    store(self, task)
+    save_thumbnails(self, product_id: str, image_futures: list)
+    stored_thumbnails(self, product_id: str)
+    '''
+    name = 'images'
+
+    def open(self, args):
+        collection = self.collection
+        if collection.downloader is not None:
+            collection.downloader.close(save=False) # The default downloader has no image store, it is replaced
+        collection.downloader = ImageDownloader(max_workers=max(1, args.image_workers), store=ImageStore(collection.folder_name), rate_limiter=collection.rate_limiter) # Downloads each unique image once
+        if args.thumbnails:
+            from utils.image_processor import ImageProcessor, parse_size
+            collection.image_processor = ImageProcessor(parse_size(args.thumb_size), args.thumb_format, args.thumb_quality, not args.drop_originals, args.thumb_workers)
+
+    def index_key(self) -> str:
+        return f'images:{self.collection.folder_name}'
+
+    def stored_ids(self) -> list:
+        folder_name = self.collection.folder_name
+        pid_list = next(walk(f'./{folder_name}/'), (None, [], []))[1] # Returns a list of previouse recordes to avoid data rescraping locally
+        return [pid for pid in pid_list if os.path.exists(f'./{folder_name}/{pid}/images')]
+
+    def store(self, task):
+        # ---------- Store images ---------- #
+        collection = self.collection
+        image_futures = collection._download_image(f'{task.name}_', task.product_id, task.dict_properties['Image_link'][0])
+        image_futures += collection._download_multiple_images(f'{task.name}_', task.product_id, task.dict_properties['Image_all_links'][0])
+        task.images.set_result(image_futures) # The downloads run in the background
+        stored = when_all(image_futures, failed=lambda image: not image) # Stored once every image is saved
+        if collection.image_processor is not None:
+            stored.add_done_callback(lambda _: self.save_thumbnails(task.product_id, image_futures)) # Before the product is recorded in the index
+        return stored
+
+    def save_thumbnails(self, product_id: str, image_futures: list):
+
+        '''
+        Saves the details of the thumbnails made for a product (see help(make_thumbnail))
+
+        Parameters
+        ----------
+        product_id (str)
+            The product id
+        image_futures (list)
+            The thumbnails of the product, resolved with their details or None if they failed
+        '''
+        path = f'./{self.collection.folder_name}/thumbnails/{product_id}.json'
+        os.makedirs(os.path.dirname(path), exist_ok=True) # Not in the product folder, which is removed after the S3 upload
+        with open(f'{path}.tmp', 'w') as fp:
+            json.dump([future.result() for future in image_futures if future.result()], fp)
+        os.replace(f'{path}.tmp', path)
+
+    def stored_thumbnails(self, product_id: str) -> list:
+
+        '''
+        Returns the details of the thumbnails saved for a product, or an empty list if it has none
+        '''
+        path = f'./{self.collection.folder_name}/thumbnails/{product_id}.json'
+        if not os.path.exists(path):
+            return []
+        with open(path) as fp:
+            return json.load(fp)
@@ -0,0 +1,234 @@
+'''
+This code is to work on Data Collection Pipeline project
+It records how long each stage of a run takes and counts what was done, and exports them as a JSON report or in the Prometheus text format
+'''
+import json
+import threading
+from time import perf_counter, time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60] # Upper bounds (in seconds) of the histogram buckets
+
+def percentile(values: list, percent: float) -> float:
+
+    '''
+    Returns the nearest-rank percentile of a list of numbers (0 if the list is empty)
+    '''
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+class Histogram:
+
+    '''
+    A latency histogram with cumulative buckets (like Prometheus) and the last samples for percentiles
+    '''
+    def __init__(self, max_samples: int = 10000):
+        self.counts = [0] * (len(BUCKETS) + 1) # The last one is +Inf
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+        self.samples = deque(maxlen=max_samples)
+
+    def observe(self, seconds: float):
+        for k, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[k] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+class Metrics:
+
+    '''
+    This class keeps a latency histogram for each stage (page_load, extraction, image_download, s3_upload, ...) and counters
+    (products, images, bytes, retries, ...). The stages and counters are created on first use.
+    It has the following methods:
+
+    __init__(self)
+    reset(self)
+    observe(self, stage: str, seconds: float)
+    timer(self, stage: str)
+    inc(self, counter: str, value: float = 1)
+    report(self)
+    to_prometheus(self, prefix: str = 'ikea')
+    write_report(self, path: str)
+    write_prometheus(self, path: str)
+    serve(self, port: int)
+    close(self)
+    '''
+    def __init__(self):
+
+        '''
+        This function initialize an empty registry.
+        '''
+        self.lock = threading.Lock()
+        self.server = None
+        self.reset()
+
+    def reset(self):
+
+        '''
+        Forgets every measure and starts the run clock again
+        '''
+        with self.lock:
+            self.stages = {}
+            self.counters = {}
+            self.started = time()
+            self.start = perf_counter()
+
+    def observe(self, stage: str, seconds: float):
+
+        '''
+        Records the duration of a stage
+
+        Parameters
+        ----------
+        stage (str)
+            The stage name (ex: 'page_load')
+        seconds (float)
+            How long it took
+        '''
+        with self.lock:
+            self.stages.setdefault(stage, Histogram()).observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+
+        '''
+        Records how long the code in a 'with' block takes (also if it raises)
+
+        Parameters
+        ----------
+        stage (str)
+            The stage name
+        '''
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, perf_counter() - start)
+
+    def inc(self, counter: str, value: float = 1):
+
+        '''
+        Adds a value to a counter
+
+        Parameters
+        ----------
+        counter (str)
+            The counter name (ex: 'image_bytes')
+        value (float)
+            The value to be added
+        '''
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def report(self) -> dict:
+
+        '''
+        Returns
+        -------
+        dict
+            The run duration, the latency of each stage (count, total, mean, p50, p95, p99 and max in seconds),
+            the counters and the throughput of each counter per second
+        '''
+        with self.lock:
+            elapsed = perf_counter() - self.start
+            stages = {stage: {'count': histogram.count, 'total': round(histogram.sum, 4), 'mean': round(histogram.sum / histogram.count, 4) if histogram.count else 0,
+                              'p50': round(percentile(list(histogram.samples), 50), 4), 'p95': round(percentile(list(histogram.samples), 95), 4),
+                              'p99': round(percentile(list(histogram.samples), 99), 4), 'max': round(histogram.max, 4)} for stage, histogram in self.stages.items()}
+            counters = dict(self.counters)
+        return {'started_at': self.started, 'duration': round(elapsed, 3), 'stages': stages, 'counters': counters,
+                'throughput': {counter: round(value / elapsed, 3) if elapsed else 0 for counter, value in counters.items()}}
+
+    def to_prometheus(self, prefix: str = 'ikea') -> str:
+
+        '''
+        Returns the metrics in the Prometheus text exposition format
+
+        Parameters
+        ----------
+        prefix (str)
+            The prefix of the metric names
+        '''
+        lines = [f'# HELP {prefix}_stage_seconds Duration of each stage of the scraper', f'# TYPE {prefix}_stage_seconds histogram']
+        with self.lock:
+            for stage, histogram in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            for counter, value in sorted(self.counters.items()):
+                lines.append(f'# TYPE {prefix}_{counter}_total counter')
+                lines.append(f'{prefix}_{counter}_total {value}')
+            lines.append(f'# TYPE {prefix}_run_seconds gauge')
+            lines.append(f'{prefix}_run_seconds {perf_counter() - self.start}')
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, path: str):
+
+        '''
+        Saves the JSON run report (see help(report))
+        '''
+        with open(path, 'w') as fp:
+            json.dump(self.report(), fp, indent=2)
+        print(f'Run report saved to {path}')
+
+    def write_prometheus(self, path: str):
+
+        '''
+        Saves the metrics in the Prometheus text format (ex: for the textfile collector of node_exporter)
+        '''
+        with open(path, 'w') as fp:
+            fp.write(self.to_prometheus())
+        print(f'Metrics saved to {path}')
+
+    def serve(self, port: int):
+
+        '''
+        Serves the metrics in the Prometheus text format on http://localhost:<port>/metrics while the run goes on
+
+        Parameters
+        ----------
+        port (int)
+            The port to listen on (0 picks a free one, see self.server.server_port)
+        '''
+        if self.server is not None:
+            return # Already served
+        metrics = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args):
+                pass # Keeps the scraper output readable
+        self.server = ThreadingHTTPServer(('', port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f'Metrics served on http://localhost:{self.server.server_port}/metrics')
+
+    def close(self):
+
+        '''
+        Stops the metrics server
+        '''
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+METRICS = Metrics() # Shared by every module of a run
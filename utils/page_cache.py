@@ -0,0 +1,220 @@
+'''
+This code is to work on Data Collection Pipeline project
+It keeps the pages already downloaded on disk, so a run can read them again without the network (record and replay)
+'''
+import os
+import gzip
+import sqlite3
+import hashlib
+import threading
+from time import time
+from urllib.parse import urlsplit, urlunsplit
+from utils.metrics import METRICS
+
+class CacheMiss(Exception):
+
+    '''
+    Raised in replay mode when a page isn't in the cache
+    '''
+
+class PageCache:
+
+    '''
+    This class stores pages as gzip files under '<folder>/<key>.html.gz', keyed by the link and its locale, with a SQLite index.
+
+    A page is served until it is older than the TTL. When the cache is larger than its size cap the least recently used pages are removed.
+    In replay mode every page must be in the cache (expired ones included) and a missing page raises CacheMiss instead of being downloaded.
+    It has the following methods:
+
+    __init__(self, folder: str = 'page_cache', ttl: float = 0, max_size: int = 1024 ** 3, replay: bool = False)
+    locale(url: str)
+    key(url: str, locale: str = None)
+    get(self, url: str, locale: str = None)
+    put(self, url: str, body: bytes, locale: str = None)
+    evict(self)
+    stats(self)
+    print_stats(self)
+    close(self)
+    '''
+    def __init__(self, folder: str = 'page_cache', ttl: float = 0, max_size: int = 1024 ** 3, replay: bool = False):
+
+        '''
+        This function opens (or creates) the cache.
+
+        Parameters
+        ----------
+        folder (str)
+            The folder of the cached pages
+        ttl (float)
+            The seconds a page is served before it is downloaded again, 0 to keep it forever
+        max_size (int)
+            The maximum number of bytes (compressed) of the cached pages
+        replay (bool)
+            Serves only cached pages and raises CacheMiss for the others
+        '''
+        self.folder = folder
+        self.ttl = ttl
+        self.max_size = max_size
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+        os.makedirs(folder, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(folder, 'index.sqlite'), check_same_thread=False) # Shared by the worker threads behind the lock
+        with self.lock, self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, url TEXT NOT NULL, locale TEXT, size INTEGER NOT NULL, '
+                              'stored_at REAL NOT NULL, used_at REAL NOT NULL)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS pages_used_at ON pages (used_at)')
+            self.size = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    @staticmethod
+    def locale(url: str) -> str:
+
+        '''
+        Reads the locale of an Ikea link (ex: 'gb/en' for 'https://www.ikea.com/gb/en/p/...')
+        '''
+        parts = [part for part in urlsplit(url).path.split('/') if part]
+        return '/'.join(parts[:2]) if len(parts) >= 2 and len(parts[0]) == 2 else ''
+
+    @staticmethod
+    def key(url: str, locale: str = None) -> str:
+
+        '''
+        Returns the cache key of a page: the sha256 of its locale and of its link without the fragment
+
+        Parameters
+        ----------
+        url (str)
+            The page link
+        locale (str)
+            The locale the page is requested in, read from the link if None
+        '''
+        scheme, netloc, path, query, _ = urlsplit(url)
+        url = urlunsplit((scheme, netloc.lower(), path, query, ''))
+        locale = PageCache.locale(url) if locale is None else locale
+        return hashlib.sha256(f'{locale} {url}'.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], f'{key}.html.gz')
+
+    def get(self, url: str, locale: str = None):
+
+        '''
+        Reads a page from the cache
+
+        Parameters
+        ----------
+        url (str)
+            The page link
+        locale (str)
+            The locale the page is requested in, read from the link if None
+
+        Returns
+        -------
+        bytes
+            The page, or None if it isn't cached or is expired (it raises CacheMiss instead in replay mode)
+        '''
+        key = self.key(url, locale)
+        with self.lock:
+            row = self.conn.execute('SELECT stored_at FROM pages WHERE key = ?', (key,)).fetchone()
+        body = None
+        if row is not None and (self.replay or not self.ttl or time() - row[0] <= self.ttl):
+            try:
+                with gzip.open(self._path(key), 'rb') as fp:
+                    body = fp.read()
+            except (OSError, EOFError):
+                body = None # Removed or truncated, downloaded again
+        with self.lock:
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                with self.conn:
+                    self.conn.execute('UPDATE pages SET used_at = ? WHERE key = ?', (time(), key))
+        METRICS.inc('cache_misses' if body is None else 'cache_hits')
+        if body is None and self.replay:
+            raise CacheMiss(f'{url} is not in the page cache')
+        return body
+
+    def put(self, url: str, body: bytes, locale: str = None):
+
+        '''
+        Stores a page and removes the least recently used pages if the cache is full
+
+        Parameters
+        ----------
+        url (str)
+            The page link
+        body (bytes)
+            The page
+        locale (str)
+            The locale the page is requested in, read from the link if None
+        '''
+        key = self.key(url, locale)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with gzip.open(tmp_path, 'wb', compresslevel=6) as fp:
+            fp.write(body)
+        os.replace(tmp_path, path) # A reader never sees a page half written
+        size = os.path.getsize(path)
+        now = time()
+        with self.lock, self.conn:
+            row = self.conn.execute('SELECT size FROM pages WHERE key = ?', (key,)).fetchone()
+            self.conn.execute('INSERT OR REPLACE INTO pages (key, url, locale, size, stored_at, used_at) VALUES (?, ?, ?, ?, ?, ?)',
+                              (key, url, self.locale(url) if locale is None else locale, size, now, now))
+            self.size += size - (row[0] if row else 0)
+            self.stored += 1
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+
+        '''
+        Removes the least recently used pages until the cache is under its size cap
+        '''
+        with self.lock, self.conn:
+            removed = []
+            for key, size in self.conn.execute('SELECT key, size FROM pages ORDER BY used_at').fetchall():
+                if self.size <= self.max_size:
+                    break
+                removed.append(key)
+                self.size -= size
+            self.conn.executemany('DELETE FROM pages WHERE key = ?', [(key,) for key in removed])
+            self.evicted += len(removed)
+        for key in removed:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass # Already removed
+
+    def stats(self) -> dict:
+
+        '''
+        Returns
+        -------
+        dict
+            The hits, misses, pages stored and evicted in this run, and the number and size of the cached pages
+        '''
+        with self.lock:
+            pages = self.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+            return {'hits': self.hits, 'misses': self.misses, 'stored': self.stored, 'evicted': self.evicted, 'pages': pages, 'size': self.size}
+
+    def print_stats(self):
+
+        '''
+        Prints the cache stats of this run
+        '''
+        stats = self.stats()
+        print(f"Page cache: {stats['hits']} hits, {stats['misses']} misses, {stats['stored']} stored, {stats['evicted']} evicted, "
+              f"{stats['pages']} pages ({stats['size'] / 1048576:.1f} MB)")
+
+    def close(self):
+
+        '''
+        Closes the cache index
+        '''
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,235 @@
+'''
+This code is to work on Data Collection Pipeline project
+It hands the extracted records to storage workers, so the browser never waits on storage I/O
+'''
+import queue
+import threading
+from time import perf_counter
+from concurrent.futures import Future
+from utils.metrics import METRICS
+
+class StorageTask:
+
+    '''
+    A product record on its way to the sinks.
+
+    images is resolved by the images sink with the futures of the queued downloads, so other sinks (like S3) can wait for them.
+    on_done is called with the task once every sink stored the record or failed, errors holds the error of each failed sink.
+    '''
+    def __init__(self, dict_properties: dict, on_done = None):
+        self.dict_properties = dict_properties
+        self.product_id = dict_properties['Product_id'][0]
+        self.name = dict_properties['Name'][0].replace(" ", "")
+        self.images = Future()
+        self.on_done = on_done
+        self.fingerprints = {} # Sink name -> fingerprint of the record claimed in that sink
+        self.sinks = []
+        self.errors = {}
+        self.left = 0
+        self.lock = threading.Lock()
+
+    def expect(self, sinks: list):
+
+        '''
+        Records the sinks the task is handed to, the task is done at once if there are none
+        '''
+        self.sinks = list(sinks)
+        self.left = len(self.sinks)
+        if not self.sinks and self.on_done is not None:
+            self.on_done(self)
+
+    def sink_done(self, sink: str, error: Exception = None):
+
+        '''
+        Records that a sink stored the record (or failed with error) and calls on_done after the last one
+        '''
+        with self.lock:
+            if error is not None:
+                self.errors[sink] = error
+            self.left -= 1
+            finished = self.left == 0
+        if finished and self.on_done is not None:
+            self.on_done(self)
+
+def store_task(handler, task: StorageTask, sink: str, done):
+
+    '''
+    Hands a task to the handler of a sink and calls done(task, sink, error) once the record is stored, or couldn't be.
+    A handler storing the record in the background (like a batch or an upload) returns a Future resolved once it is stored
+
+    Parameters
+    ----------
+    handler (function)
+        Stores a StorageTask in the sink
+    task (StorageTask)
+        The record
+    sink (str)
+        The sink name
+    done (function)
+        Called with the task, the sink and the error (None if it was stored)
+    '''
+    try:
+        stored = handler(task)
+    except Exception as exc:
+        if not task.images.done(): task.images.set_result([]) # Never leaves another sink waiting for the images
+        done(task, sink, exc)
+        return
+    if isinstance(stored, Future):
+        stored.add_done_callback(lambda future: done(task, sink, future.exception()))
+    else:
+        done(task, sink, None)
+
+def when_all(futures: list, failed = lambda result: False) -> Future:
+
+    '''
+    Returns a Future resolved once every future is done, with their results, or with the first error
+
+    Parameters
+    ----------
+    futures (list)
+        The futures (like the downloads or the uploads of a record)
+    failed (function)
+        Tells if a result is a failure (ex: a download which returned False)
+    '''
+    combined = Future()
+    futures = list(futures)
+    left = [len(futures)]
+    lock = threading.Lock()
+    def done(_):
+        with lock:
+            left[0] -= 1
+            if left[0]:
+                return
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if not errors:
+            failures = [future.result() for future in futures if failed(future.result())]
+            if failures: errors = [RuntimeError(f'{len(failures)} of {len(futures)} items failed')]
+        if errors:
+            combined.set_exception(errors[0])
+        else:
+            combined.set_result([future.result() for future in futures])
+    if not futures:
+        combined.set_result([])
+    for future in futures:
+        future.add_done_callback(done)
+    return combined
+
+class StoragePipeline:
+
+    '''
+    This class runs one worker thread per sink (local, images, S3, RDS), each fed by its own bounded queue.
+    When a queue is full the producer waits, which keeps the memory bounded.
+    It has the following methods:
+
+    __init__(self, handlers: dict, maxsize: int = 100, on_stored = None)
+    submit(self, task: StorageTask, sinks: list)
+    _consume(self, sink: str)
+    _stored(self, task: StorageTask, sink: str, error: Exception = None)
+    close(self)
+    stats(self)
+    print_stats(self)
+    '''
+    _STOP = object() # Tells a sink worker to finish
+
+    def __init__(self, handlers: dict, maxsize: int = 100, on_stored = None):
+
+        '''
+        This function starts the sink workers.
+
+        Parameters
+        ----------
+        handlers (dict)
+            The sink name -> the function storing a StorageTask in that sink
+        maxsize (int)
+            The maximum number of records waiting in each sink queue
+        on_stored (function)
+            Called with the task, the sink and the error (None if it was stored) once a sink stored a record, or couldn't
+        '''
+        self.handlers = handlers
+        self.on_stored = on_stored
+        self.queues = {sink: queue.Queue(maxsize=maxsize) for sink in handlers}
+        self.lock = threading.Lock()
+        self.processed = {sink: 0 for sink in handlers}
+        self.failed = {sink: 0 for sink in handlers}
+        self.max_depth = {sink: 0 for sink in handlers}
+        self.threads = [threading.Thread(target=self._consume, args=(sink,), name=f'sink-{sink}', daemon=True) for sink in handlers]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, task: StorageTask, sinks: list):
+
+        '''
+        Queues a record for some sinks. It only blocks if one of their queues is full.
+
+        Parameters
+        ----------
+        task (StorageTask)
+            The record
+        sinks (list)
+            The sinks the record has to be stored in
+        '''
+        for sink in sinks:
+            self.queues[sink].put(task)
+            with self.lock:
+                self.max_depth[sink] = max(self.max_depth[sink], self.queues[sink].qsize())
+
+    def _consume(self, sink: str):
+
+        '''
+        Stores the records of one sink until the pipeline is closed
+        '''
+        handler = self.handlers[sink]
+        sink_queue = self.queues[sink]
+        while True:
+            task = sink_queue.get()
+            if task is self._STOP:
+                break
+            start = perf_counter()
+            store_task(handler, task, sink, self._stored)
+            METRICS.observe(f'sink_{sink}', perf_counter() - start) # Up to the hand-off for the sinks storing in the background
+
+    def _stored(self, task: StorageTask, sink: str, error: Exception = None):
+
+        '''
+        Records that a sink stored a record (or failed), called by the sink worker or by the background write of the sink
+        '''
+        if error is not None:
+            print(f"Couldn't store {task.product_id} in {sink}: {error}")
+        with self.lock:
+            if error is None:
+                self.processed[sink] += 1
+            else:
+                self.failed[sink] += 1
+        if self.on_stored is not None:
+            self.on_stored(task, sink, error)
+        task.sink_done(sink, error)
+
+    def close(self):
+
+        '''
+        Waits until every queued record is handed to its sink and stops the sink workers
+        (the sinks writing in the background finish when they are closed)
+        '''
+        for sink_queue in self.queues.values():
+            sink_queue.put(self._STOP)
+        for thread in self.threads:
+            thread.join()
+
+    def stats(self) -> dict:
+
+        '''
+        Returns
+        -------
+        dict
+            The records stored, failed and the deepest queue for each sink
+        '''
+        with self.lock:
+            return {sink: {'stored': self.processed[sink], 'failed': self.failed[sink], 'max_queue': self.max_depth[sink]} for sink in self.handlers}
+
+    def print_stats(self):
+
+        '''
+        Prints the pipeline stats of this run
+        '''
+        for sink, value in self.stats().items():
+            print(f"Sink {sink}: {value['stored']} stored, {value['failed']} failed, deepest queue {value['max_queue']}")
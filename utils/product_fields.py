@@ -0,0 +1,105 @@
+'''
+This code is to work on Data Collection Pipeline project
+It keeps the xpaths of the Ikea pages in one place, so every extraction engine reads the same fields
+'''
+import re
+import json
+import hashlib
+
+PRODUCT_XPATH = "//div[@class='pip-product__subgrid product-pip js-product-pip']"
+PRICE_XPATH = "//span[@class='pip-price__integer']"
+CURRENCY_XPATH = "//span[@class='pip-price__currency-symbol pip-price__currency-symbol--leading\n        pip-price__currency-symbol--superscript']"
+NAME_XPATH = "//span[@class='pip-header-section__title--big notranslate']"
+DESCRIPTION_XPATH = "//span[@class='pip-header-section__description-text']"
+IMAGE_XPATH = '//div[@class="pip-product__left-top"]//img[@class="pip-aspect-ratio-image__image"]'
+IMAGE_LIST_XPATH = "//div[@class='pip-media-grid__grid ']//img"
+RESULTS_XPATH = "//section[@class='results']//div[@class='serp-grid__item search-grid__item product-fragment']/a"
+SHOW_MORE_XPATH = "//a[@class='show-more__button button button--secondary button--small']"
+
+# Product links end with the product id, like '.../p/micke-desk-white-80213074/' or '.../p/smastad-desk-white-grey-with-2-drawers-s19392258/'
+PRODUCT_LINK_ID = re.compile(r'-(s?)(\d{8})/?(?:[?#].*)?$', re.IGNORECASE)
+
+# Fields of the product dictionary that tell if a stored product changed (the UUID is new on every scrape)
+FINGERPRINT_FIELDS = ['Price', 'Name', 'Description', 'Image_link', 'Image_all_links']
+IMAGE_FINGERPRINT_FIELDS = ['Image_link', 'Image_all_links']
+
+# Product fields as: name -> (xpath, 'text' or the attribute to read)
+PRODUCT_FIELDS = {
+    'product_id': (PRODUCT_XPATH, 'data-product-id'),
+    'price': (PRICE_XPATH, 'text'),
+    'currency': (CURRENCY_XPATH, 'text'),
+    'name': (NAME_XPATH, 'text'),
+    'description': (DESCRIPTION_XPATH, 'text'),
+    'src_img': (IMAGE_XPATH, 'src'),
+}
+
+# Fields read as a list of values, as: name -> (xpath, 'text' or the attribute to read)
+PRODUCT_LIST_FIELDS = {
+    'src_multi_img': (IMAGE_LIST_XPATH, 'src'),
+}
+RESULT_LIST_FIELDS = {
+    'links': (RESULTS_XPATH, 'href'),
+}
+
+def product_dict(fields: dict, uuid_number: str, src_multi_img: list) -> dict:
+
+    '''
+    Builds the product dictionary stored by every sink from the extracted fields
+
+    Parameters
+    ----------
+    fields (dict)
+        The values of PRODUCT_FIELDS
+    uuid_number (str)
+        A universal unique id for the record
+    src_multi_img (list)
+        The links of all product images
+
+    Returns
+    -------
+    dict
+        A product dictionary
+    '''
+    return {'Product_id': [fields['product_id']], 'UUID_number': [uuid_number], 'Price': [fields['currency'] + fields['price']],
+            'Name': [fields['name']], 'Description': [fields['description']], 'Image_link': [fields['src_img']], 'Image_all_links': [src_multi_img]}
+
+def product_id_from_link(link: str):
+
+    '''
+    Reads the product id from a product link without loading the page
+
+    Parameters
+    ----------
+    link (str)
+        The product link
+
+    Returns
+    -------
+    str
+        The product id as stored in the records (ex: '19392258' or 'S19392258'), or None if the link has no id
+    '''
+    match = PRODUCT_LINK_ID.search(link or '')
+    if match is None:
+        return None
+    prefix, digits = match.groups()
+    return f'{prefix.upper()}{digits}'
+
+def product_fingerprint(dict_properties: dict, fields: list = FINGERPRINT_FIELDS) -> str:
+
+    '''
+    Hashes the fields of a product dictionary which can change between two scrapes
+
+    Parameters
+    ----------
+    dict_properties (dict)
+        The product dictionary
+    fields (list)
+        The fields to be hashed (ex: IMAGE_FINGERPRINT_FIELDS for the images only)
+
+    Returns
+    -------
+    str
+        The sha256 of the fields, equal for two scrapes of an unchanged product
+    '''
+    values = {field: dict_properties.get(field, [None])[0] for field in fields}
+    return hashlib.sha256(json.dumps(values, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
@@ -0,0 +1,171 @@
+'''
+This code is to work on Data Collection Pipeline project
+It spaces out the requests sent to each host with token buckets shared by every worker
+'''
+import threading
+from time import monotonic, sleep
+from urllib.parse import urlparse
+from utils.metrics import METRICS
+
+class TokenBucket:
+
+    '''
+    This class lets a request through for each token. Tokens are added at a fixed rate, up to burst tokens.
+
+    When the bucket is empty a caller reserves the next token and sleeps until it is added, so waiting callers are served in order.
+    It has the following methods:
+
+    __init__(self, rate: float, burst: int = 1)
+    acquire(self)
+    '''
+    def __init__(self, rate: float, burst: int = 1):
+
+        '''
+        This function fills the bucket.
+
+        Parameters
+        ----------
+        rate (float)
+            The number of tokens added per second
+        burst (int)
+            The maximum number of tokens, the requests that can be sent at once after an idle time
+        '''
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+
+        '''
+        Waits for a token
+
+        Returns
+        -------
+        float
+            The seconds spent waiting
+        '''
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1 # Reserves a token, it may not be added yet
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay:
+            sleep(delay)
+        return delay
+
+class HostRateLimiter:
+
+    '''
+    This class keeps a token bucket for each host. The rate of a host is halved when it throttles a request (429 or 503)
+    and grows back step by step while requests go through, to stay as fast as the host allows.
+    It has the following methods:
+
+    __init__(self, rate: float = 2, burst: int = 4, min_rate: float = 0.1)
+    bucket(self, url: str)
+    acquire(self, url: str)
+    throttled(self, url: str)
+    stats(self)
+    print_stats(self)
+    '''
+    def __init__(self, rate: float = 2, burst: int = 4, min_rate: float = 0.1):
+
+        '''
+        This function initialize the limiter.
+
+        Parameters
+        ----------
+        rate (float)
+            The maximum number of requests per second to each host
+        burst (int)
+            The number of requests that can be sent at once to a host after an idle time
+        min_rate (float)
+            The rate of a host is never halved below this one
+        '''
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.buckets = {}
+        self.requests = {}
+        self.waited = {}
+        self.throttles = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+
+        '''
+        Returns the bucket of the host of a link, created on first use
+        '''
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+                self.requests[host] = 0
+                self.waited[host] = 0
+                self.throttles[host] = 0
+            return self.buckets[host]
+
+    def acquire(self, url: str) -> float:
+
+        '''
+        Waits until a request can be sent to the host of a link
+
+        Parameters
+        ----------
+        url (str)
+            The link about to be requested
+
+        Returns
+        -------
+        float
+            The seconds spent waiting
+        '''
+        bucket = self.bucket(url)
+        waited = bucket.acquire()
+        METRICS.observe('rate_limit_wait', waited)
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            self.requests[host] += 1
+            self.waited[host] += waited
+            bucket.rate = min(self.rate, bucket.rate + self.rate / 20) # Grows back after a throttle
+        return waited
+
+    def throttled(self, url: str):
+
+        '''
+        Halves the rate of a host after it answered 429 (Too Many Requests) or 503
+
+        Parameters
+        ----------
+        url (str)
+            The link that was throttled
+        '''
+        bucket = self.bucket(url)
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            bucket.rate = max(self.min_rate, bucket.rate / 2)
+            self.throttles[host] += 1
+        METRICS.inc('throttles')
+        print(f'{host} is throttling requests, slowing down to {bucket.rate:.2f} requests/s')
+
+    def stats(self) -> dict:
+
+        '''
+        Returns
+        -------
+        dict
+            The requests, seconds waited, throttles and current rate of each host
+        '''
+        with self.lock:
+            return {host: {'requests': self.requests[host], 'waited': round(self.waited[host], 3), 'throttles': self.throttles[host],
+                           'rate': round(bucket.rate, 3)} for host, bucket in self.buckets.items()}
+
+    def print_stats(self):
+
+        '''
+        Prints the rate limiter stats of this run
+        '''
+        for host, value in self.stats().items():
+            print(f"Host {host}: {value['requests']} requests, waited {value['waited']:.2f}s, {value['throttles']} throttles, rate {value['rate']} requests/s")
@@ -0,0 +1,318 @@
+'''
+This code is to work on Data Collection Pipeline project
+It buffers product records and writes them to RDS in batches, and is the RDS sink of the storage pipeline
+'''
+import io
+import csv
+import json
+import uuid
+import threading
+import pandas as pd
+from time import perf_counter
+from concurrent.futures import Future
+from sqlalchemy import inspect
+from utils.sinks import Sink
+from utils.metrics import METRICS
+
+def psql_insert_copy(table, conn, keys, data_iter):
+
+    '''
+    Writes rows with PostgreSQL COPY, used as the 'method' of pandas.DataFrame.to_sql
+
+    Parameters
+    ----------
+    table (pandas.io.sql.SQLTable)
+        The table rows are written to
+    conn (sqlalchemy.engine.Connection)
+        The connection of the running transaction
+    keys (list)
+        The column names
+    data_iter (iterable)
+        The rows
+    '''
+    dbapi_conn = conn.connection
+    with dbapi_conn.cursor() as cur:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(data_iter)
+        buffer.seek(0)
+        columns = ', '.join(f'"{k}"' for k in keys)
+        table_name = f'"{table.schema}"."{table.name}"' if table.schema else f'"{table.name}"'
+        cur.copy_expert(sql=f'COPY {table_name} ({columns}) FROM STDIN WITH CSV', file=buffer)
+
+def array_literal(values: list) -> str:
+
+    '''
+    Writes a list as a PostgreSQL array literal (ex: {a,b}), the text Image_all_links was stored as by one row inserts
+    '''
+    items = []
+    for value in values:
+        value = str(value)
+        if value == '' or value.upper() == 'NULL' or any(char in value for char in ',{}"\\ \t\n'):
+            value = '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        items.append(value)
+    return '{' + ','.join(items) + '}'
+
+class RDSBatchWriter:
+
+    '''
+    This class collects product records and writes them to a table in batches, by size or after a time interval.
+    With upsert, the rows of a batch replace the rows with the same Product_id. Columns missing from an existing table (like Thumbnails)
+    are added before a batch is written. A batch which fails is written again
+    up to retries times, then the future of each of its records is resolved with the error.
+    It has the following methods:
+
+    __init__(self, engine, table_name: str, batch_size: int = 500, flush_interval: float = 5, upsert: bool = False, retries: int = 1)
+    add(self, dict_properties: dict)
+    flush(self)
+    _write(self, df: pd.DataFrame, futures: list)
+    _add_columns(self, columns: list)
+    _upsert(self, df: pd.DataFrame)
+    _flush_periodically(self)
+    close(self)
+    stats(self)
+    print_stats(self)
+    '''
+    def __init__(self, engine, table_name: str, batch_size: int = 500, flush_interval: float = 5, upsert: bool = False, retries: int = 1):
+
+        '''
+        This function initialize the buffer and starts the thread that flushes it every flush_interval seconds.
+
+        Parameters
+        ----------
+        engine (Engine)
+            The SQLAlchemy engine (a pooled one, see StoreData.psycopg2_create_engine)
+        table_name (str)
+            The table the records are appended to
+        batch_size (int)
+            The number of records that triggers a flush
+        flush_interval (float)
+            The maximum time (in seconds) a record waits in the buffer
+        upsert (bool)
+            Replaces the stored rows of the products in a batch instead of appending them
+        retries (int)
+            The number of times a failed batch is written again (each batch is one transaction)
+        '''
+        self.engine = engine
+        self.table_name = table_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.upsert = upsert
+        self.retries = max(0, retries)
+        self.method = psql_insert_copy if engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2' else 'multi' # COPY, or multi-row INSERTs for other databases
+        self.columns = None # The columns of the table, read before the first batch
+        self.buffer = []
+        self.futures = [] # The future of each record in the buffer
+        self.lock = threading.Lock() # Guards the buffer and the stats
+        self.write_lock = threading.Lock() # Keeps one batch written at a time
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.batches = 0
+        self.write_seconds = 0
+        self.closed = threading.Event()
+        self.timer = threading.Thread(target=self._flush_periodically, daemon=True)
+        self.timer.start()
+
+    def add(self, dict_properties: dict):
+
+        '''
+        Adds a product record to the buffer and flushes it if it is full
+
+        Parameters
+        ----------
+        dict_properties (dict)
+            The product dictionary (each value is a one item list)
+
+        Returns
+        -------
+        Future
+            Resolved once the batch of the record is written, or with the error if it couldn't be
+        '''
+        written = Future()
+        with self.lock:
+            self.buffer.append({key: array_literal(value[0]) if isinstance(value[0], list) else value[0] for key, value in dict_properties.items()})
+            self.futures.append(written)
+            full = len(self.buffer) >= self.batch_size
+        if full:
+            self.flush()
+        return written
+
+    def flush(self):
+
+        '''
+        Writes the records in the buffer as one batch
+        '''
+        with self.write_lock:
+            with self.lock:
+                rows, self.buffer = self.buffer, []
+                futures, self.futures = self.futures, []
+            if rows:
+                self._write(pd.DataFrame(rows), futures)
+
+    def _write(self, df: pd.DataFrame, futures: list):
+
+        '''
+        Writes a batch in one transaction (again if it fails, up to retries times), records the stats and resolves the futures of its records
+        '''
+        for attempt in range(self.retries + 1):
+            start = perf_counter()
+            try:
+                self._add_columns(list(df.columns))
+                if self.upsert:
+                    self._upsert(df)
+                else:
+                    df.to_sql(self.table_name, self.engine, if_exists='append', index=False, method=self.method, chunksize=1000)
+                break
+            except Exception as exc:
+                error = exc
+                print(f"Couldn't store {len(df)} records on RDS (attempt {attempt + 1} of {self.retries + 1}): {exc}")
+        else:
+            with self.lock:
+                self.rows_failed += len(df)
+            METRICS.inc('rds_failures', len(df))
+            for future in futures:
+                future.set_exception(error) # The records aren't recorded in the index
+            return
+        seconds = perf_counter() - start
+        METRICS.observe('rds_write', seconds)
+        METRICS.inc('rds_rows', len(df))
+        with self.lock:
+            self.write_seconds += seconds
+            self.rows_written += len(df)
+            self.batches += 1
+        print(f'Stored {len(df)} records on RDS')
+        for future in futures:
+            future.set_result(True)
+
+    def _add_columns(self, columns: list):
+
+        '''
+        Adds the columns of a batch which the table doesn't have yet (as TEXT), so records with new fields can be stored in a table created before
+
+        Parameters
+        ----------
+        columns (list)
+            The column names of the batch
+        '''
+        if self.columns is None:
+            inspector = inspect(self.engine)
+            if not inspector.has_table(self.table_name):
+                return # Created with every column by the first batch
+            self.columns = {column['name'] for column in inspector.get_columns(self.table_name)}
+        missing = [column for column in columns if column not in self.columns]
+        if missing:
+            with self.engine.begin() as conn:
+                for column in missing:
+                    conn.exec_driver_sql(f'ALTER TABLE "{self.table_name}" ADD COLUMN "{column}" TEXT')
+            print(f"Added the columns {missing} to the RDS table {self.table_name}")
+            self.columns.update(missing)
+
+    def _upsert(self, df: pd.DataFrame):
+
+        '''
+        Writes a batch to a staging table and swaps the rows with the same Product_id in one transaction
+
+        Parameters
+        ----------
+        df (DataFrame)
+            The batch, only the last record of each product is kept
+        '''
+        df = df.drop_duplicates('Product_id', keep='last')
+        if not inspect(self.engine).has_table(self.table_name):
+            df.to_sql(self.table_name, self.engine, if_exists='append', index=False, method=self.method, chunksize=1000)
+            return
+        staging = f'{self.table_name}_staging_{uuid.uuid4().hex[:8]}'
+        columns = ', '.join(f'"{column}"' for column in df.columns)
+        with self.engine.begin() as conn:
+            df.to_sql(staging, conn, index=False, method=self.method, chunksize=1000)
+            conn.exec_driver_sql(f'DELETE FROM "{self.table_name}" WHERE "Product_id" IN (SELECT "Product_id" FROM "{staging}")')
+            conn.exec_driver_sql(f'INSERT INTO "{self.table_name}" ({columns}) SELECT {columns} FROM "{staging}"')
+            conn.exec_driver_sql(f'DROP TABLE "{staging}"')
+
+    def _flush_periodically(self):
+
+        '''
+        Flushes the buffer every flush_interval seconds until the writer is closed
+        '''
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+
+        '''
+        Stops the flush thread and writes the records left in the buffer
+        '''
+        self.closed.set()
+        self.timer.join()
+        self.flush()
+
+    def stats(self) -> dict:
+
+        '''
+        Returns
+        -------
+        dict
+            The rows written and failed, the number of batches and the rows written per second
+        '''
+        with self.lock:
+            rows_per_second = self.rows_written / self.write_seconds if self.write_seconds else 0
+            return {'rows': self.rows_written, 'failed': self.rows_failed, 'batches': self.batches, 'rows_per_second': round(rows_per_second, 1)}
+
+    def print_stats(self):
+
+        '''
+        Prints the RDS stats of this run
+        '''
+        stats = self.stats()
+        print(f"\nRows stored on RDS: {stats['rows']} in {stats['batches']} batches ({stats['rows_per_second']} rows/s), failures: {stats['failed']}")
+
+class RDSSink(Sink):
+
+    '''
+    This class stores each product record as a row of an RDS table, written in batches by an RDSBatchWriter.
+    It has the following methods:
+
+    open(self, args)
+    index_key(self)
+    stored_ids(self)
+    store(self, task)
+    close(self)
+    '''
+    name = 'rds'
+
+    def open(self, args):
+
+        '''
+        Creates the engine and the batch writer of the --table table
+        '''
+        collection = self.collection
+        collection.table_name = args.table
+        collection.check_config_file()
+        collection.engine = collection.psycopg2_create_engine()
+        collection.rds_writer = RDSBatchWriter(collection.engine, collection.table_name, max(1, args.rds_batch), args.rds_flush_interval, upsert=collection.refresh) # Refreshed rows replace the old ones
+
+    def index_key(self) -> str:
+        return f'rds:{self.collection.table_name}'
+
+    def stored_ids(self) -> list:
+        pid_list = []
+        with self.collection.engine.connect() as conn:
+            try:
+                product_id_column = conn.execute(f'SELECT "Product_id" FROM {self.collection.table_name}')
+                for p_id in product_id_column:
+                    pid_list.append(''.join(p_id)) # Returns a list of previouse recordes to avoid data rescraping on RDS
+                product_id_column.close()
+            except:
+                print(f'No table found with {self.collection.table_name} name on the Amazon RDS')
+        return pid_list
+
+    def store(self, task):
+        # -------- Store Data on RDS ------- #
+        dict_properties = self.collection._task_record(task)
+        if 'Thumbnails' in dict_properties:
+            dict_properties = dict(dict_properties, Thumbnails=[json.dumps(dict_properties['Thumbnails'][0])]) # Stored as a json text column
+        return self.collection.rds_writer.add(dict_properties) # Stored once the next batch is written
+
+    def close(self):
+        if self.collection.rds_writer is not None:
+            self.collection.rds_writer.close() # Writes the records left in the buffer
+            self.collection.rds_writer.print_stats()
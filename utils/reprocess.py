@@ -0,0 +1,176 @@
+'''
+This code is to work on Data Collection Pipeline project
+It keeps the raw HTML of each product page, and extracts the products again from these pages on a pool of processes
+to rewrite the stored records without a browser
+'''
+import os
+import sys
+import gzip
+import json
+import argparse
+import threading
+from time import time, perf_counter
+from multiprocessing import get_context, cpu_count
+from utils.static_engine import StaticEngine, ExtractionError
+
+class PageArchive:
+
+    '''
+    This class stores the HTML of each product page as '<folder_name>/page_archive/<product id>.html.gz',
+    with the page link and the archive time in '<product id>.json'.
+    It has the following methods:
+
+    __init__(self, folder_name: str = 'raw_data')
+    save(self, product_id: str, html: bytes, url: str)
+    load(self, product_id: str)
+    pages(self)
+    '''
+    def __init__(self, folder_name: str = 'raw_data'):
+
+        '''
+        This function initialize the archive folder.
+
+        Parameters
+        ----------
+        folder_name (str)
+            The folder where data is stored, the pages are kept in '<folder_name>/page_archive'
+        '''
+        self.root = os.path.join(folder_name, 'page_archive')
+        os.makedirs(self.root, exist_ok=True)
+
+    def save(self, product_id: str, html: bytes, url: str):
+
+        '''
+        Archives the page of a product, replacing the previous one
+
+        Parameters
+        ----------
+        product_id (str)
+            The product id
+        html (bytes)
+            The HTML of the product page
+        url (str)
+            The page link, needed to make the image links absolute
+        '''
+        path = os.path.join(self.root, f'{product_id}.html.gz')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with gzip.open(tmp_path, 'wb') as fp:
+            fp.write(html)
+        os.replace(tmp_path, path) # A reprocess never reads a page half written
+        with open(os.path.join(self.root, f'{product_id}.json'), 'w') as fp:
+            json.dump({'url': url, 'archived_at': time()}, fp)
+
+    def load(self, product_id: str) -> tuple:
+
+        '''
+        Returns
+        -------
+        tuple
+            The HTML and the link of an archived page
+        '''
+        with gzip.open(os.path.join(self.root, f'{product_id}.html.gz'), 'rb') as fp:
+            html = fp.read()
+        with open(os.path.join(self.root, f'{product_id}.json')) as fp:
+            return html, json.load(fp)['url']
+
+    def pages(self) -> list:
+
+        '''
+        Returns
+        -------
+        list
+            The (product id, archived page path, page link) of every archived page
+        '''
+        pages = []
+        for name in sorted(os.listdir(self.root)):
+            if not name.endswith('.html.gz'):
+                continue
+            product_id = name[:-len('.html.gz')]
+            try:
+                with open(os.path.join(self.root, f'{product_id}.json')) as fp:
+                    url = json.load(fp)['url']
+            except (OSError, ValueError, KeyError):
+                url = '' # The image links stay relative
+            pages.append((product_id, os.path.join(self.root, name), url))
+        return pages
+
+def extract_page(page: tuple) -> tuple:
+
+    '''
+    Extracts a product from an archived page, in a worker process
+
+    Parameters
+    ----------
+    page (tuple)
+        The (product id, archived page path, page link) of a page
+
+    Returns
+    -------
+    tuple
+        The product id, the product dictionary (None if it failed) and the error message
+    '''
+    product_id, path, url = page
+    try:
+        with gzip.open(path, 'rb') as fp:
+            return product_id, StaticEngine.parse(fp.read(), url), None
+    except (OSError, EOFError, ExtractionError, ValueError) as exc:
+        return product_id, None, str(exc)
+
+def reprocess(collection, archive: PageArchive, processes: int = None, chunksize: int = 16) -> dict:
+
+    '''
+    Extracts every archived page again on a pool of processes and stores the products through the storage pipeline of a collection.
+
+    The collection runs in refresh mode, so only the records which changed are rewritten.
+
+    Parameters
+    ----------
+    collection (DataCollection)
+        A collection with its sinks set (see help(StoreData.user_store_data_options))
+    archive (PageArchive)
+        The archived pages
+    processes (int)
+        The number of worker processes (default: the number of cores)
+    chunksize (int)
+        The number of pages sent to a worker process at once
+
+    Returns
+    -------
+    dict
+        The number of pages extracted and failed, and the seconds it took
+    '''
+    pages = archive.pages()
+    counts = {'pages': len(pages), 'extracted': 0, 'failed': 0}
+    start = perf_counter()
+    with get_context('spawn').Pool(processes or cpu_count()) as pool: # Not forked, the sinks and the pipeline run threads holding locks
+        for product_id, dict_properties, error in pool.imap_unordered(extract_page, pages, chunksize=max(1, chunksize)):
+            if dict_properties is None:
+                print(f"Couldn't extract {product_id} from its archived page: {error}")
+                counts['failed'] += 1
+                continue
+            collection.store_data_final(dict_properties) # Extraction runs on the pool while the sinks write
+            counts['extracted'] += 1
+    counts['seconds'] = round(perf_counter() - start, 3)
+    return counts
+
+if __name__ == '__main__':
+    from utils.ikea import DataCollection, StoreData
+    from utils.wait_policy import WaitPolicy
+    parser = argparse.ArgumentParser(description='Extracts the products again from the archived pages (see --archive) and rewrites the records that changed. '
+                                                 'The other arguments choose the sinks, like for main.py (ex: --local --rds --table products)')
+    parser.add_argument('--folder', type=str, default='raw_data', help='Folder of the archived pages and of the local data (ex: raw_data)')
+    parser.add_argument('--processes', type=int, default=None, help='Number of worker processes, the number of cores by default (ex: 8)')
+    parser.add_argument('--chunksize', type=int, default=16, help='Number of pages sent to a worker process at once (ex: 16)')
+    args, sink_args = parser.parse_known_args()
+    archive = PageArchive(args.folder)
+    if not archive.pages():
+        sys.exit(f'No archived pages in {archive.root}, scrape with --archive first')
+    collection = DataCollection.__new__(DataCollection) # No browser is needed
+    StoreData.__init__(collection)
+    collection.wait = WaitPolicy(None)
+    collection.user_store_data_options(sink_args + ['--folder', args.folder, '--refresh'])
+    try:
+        counts = reprocess(collection, archive, args.processes, args.chunksize)
+    finally:
+        collection.close_storage()
+    print(f"Reprocessed {counts['extracted']} of {counts['pages']} archived pages ({counts['failed']} failed) in {counts['seconds']:.1f}s")
@@ -0,0 +1,320 @@
+'''
+This code is to work on Data Collection Pipeline project
+It lists and uploads records on AWS S3 through one shared transfer manager, and is the S3 sink of the storage pipeline
+'''
+import io
+import os
+import json
+import shutil
+import threading
+from time import perf_counter
+from concurrent.futures import Future, wait
+import boto3
+from botocore.config import Config
+from boto3.s3.transfer import create_transfer_manager, TransferConfig
+from s3transfer.subscribers import BaseSubscriber
+from utils.sinks import Sink
+from utils.pipeline import when_all
+from utils.metrics import METRICS
+
+class _UploadDone(BaseSubscriber):
+
+    '''
+    Calls back the sink when an upload is finished
+    '''
+    def __init__(self, callback):
+        self.callback = callback
+
+    def on_done(self, future, **kwargs):
+        self.callback(future)
+
+class S3Sink:
+
+    '''
+    This class stores records on an S3 bucket. Uploads run in the background and are shared by all the workers.
+    It has the following methods:
+
+    __init__(self, client, bucket_name: str, max_concurrency: int = 10)
+    list_product_ids(self, prefix: str)
+    put_json(self, key: str, data: dict)
+    put_bytes(self, key: str, body: bytes)
+    upload_file(self, path: str, key: str)
+    _upload(self, fileobj, key: str)
+    wait(self)
+    close(self)
+    '''
+    def __init__(self, client, bucket_name: str, max_concurrency: int = 10):
+
+        '''
+        This function initialize the transfer manager.
+
+        Parameters
+        ----------
+        client (S3.Client)
+            The boto3 S3 client, it should allow at least max_concurrency connections
+        bucket_name (str)
+            The bucket name from AWS S3
+        max_concurrency (int)
+            The maximum number of uploads running at the same time
+        '''
+        self.client = client
+        self.bucket_name = bucket_name
+        self.manager = create_transfer_manager(client, TransferConfig(max_concurrency=max_concurrency))
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock) # Notified when an upload is done
+        self.pending = set()
+        self.uploaded = 0
+        self.failures = []
+
+    def list_product_ids(self, prefix: str) -> list:
+
+        '''
+        Lists every product folder under a prefix, reading all the pages of the listing (1000 prefixes each)
+
+        Parameters
+        ----------
+        prefix (str)
+            The folder on the bucket (ex: 'raw_data/')
+
+        Returns
+        -------
+        list
+            The product ids found on S3
+        '''
+        pid_list = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Delimiter='/', Prefix=prefix):
+            for obj in page.get('CommonPrefixes', []):
+                pid_list.append(obj['Prefix'][len(prefix):].rstrip('/')) # Removes the prefix itself, not its characters
+        return pid_list
+
+    def put_json(self, key: str, data: dict):
+
+        '''
+        Uploads a dictionary as a json file straight from memory
+
+        Parameters
+        ----------
+        key (str)
+            The object key (ex: 'raw_data/10253025/data.json')
+        data (dict)
+            The dictionary to be uploaded
+        '''
+        return self.put_bytes(key, json.dumps(data).encode('utf-8'))
+
+    def put_bytes(self, key: str, body: bytes):
+
+        '''
+        Uploads bytes (like an image) straight from memory
+
+        See help(put_json) for accurate signature
+        '''
+        return self._upload(io.BytesIO(body), key)
+
+    def upload_file(self, path: str, key: str):
+
+        '''
+        Uploads a file from disk, streamed in parts by the transfer manager
+
+        Parameters
+        ----------
+        path (str)
+            The file to be uploaded
+        key (str)
+            The object key
+        '''
+        return self._upload(path, key)
+
+    def _upload(self, fileobj, key: str):
+
+        '''
+        Queues an upload, records it until it is done and reports it if it failed
+
+        Returns
+        -------
+        Future
+            Resolved once the object is on S3, or with the error of the upload
+        '''
+        start = perf_counter()
+        stored = Future()
+        def done(future):
+            METRICS.observe('s3_upload', perf_counter() - start) # From queued to done
+            try:
+                future.result()
+            except Exception as exc:
+                print(f"Couldn't upload {key} to S3: {exc}")
+                with self.lock:
+                    self.failures.append(key)
+                METRICS.inc('s3_failures')
+                stored.set_exception(exc)
+            else:
+                with self.lock:
+                    self.uploaded += 1
+                METRICS.inc('s3_uploads')
+                stored.set_result(key)
+            with self.lock: # Only once the callbacks of the upload ran, so wait() returns after them
+                self.pending.discard(stored)
+                self.idle.notify_all()
+        with self.lock:
+            self.pending.add(stored) # Before it starts, a fast upload can finish before upload() returns
+        try:
+            self.manager.upload(fileobj, self.bucket_name, key, subscribers=[_UploadDone(done)])
+        except Exception as exc:
+            print(f"Couldn't upload {key} to S3: {exc}")
+            with self.lock:
+                self.pending.discard(stored)
+                self.failures.append(key)
+            stored.set_exception(exc)
+        return stored
+
+    def wait(self):
+
+        '''
+        Waits for the uploads queued so far, and for their callbacks
+        '''
+        with self.lock:
+            while self.pending:
+                self.idle.wait()
+
+    def close(self):
+
+        '''
+        Waits for all uploads and stops the transfer manager
+        '''
+        self.wait()
+        self.manager.shutdown()
+        print(f'Uploaded {self.uploaded} files to S3, failures: {len(self.failures)}')
+
+class S3RecordSink(Sink):
+
+    '''
+    This class stores each product record on S3 with the same structure as the local folders, and its images once by content.
+    It has the following methods:
+
+    __init__(self, collection)
+    open(self, args)
+    index_key(self)
+    stored_ids(self)
+    upload(self, dir_name: str = '_', dict_properties: dict = None, from_memory: bool = False)
+    _upload_blob(self, sha: str, blob_key: str)
+    store(self, task)
+    close(self)
+    '''
+    name = 's3'
+
+    def __init__(self, collection):
+        super().__init__(collection)
+        self.lock = threading.Lock()
+        self.blob_uploads = {} # Content hash -> upload of an image running in this run, shared by the products showing it
+
+    def open(self, args):
+
+        '''
+        Creates the S3 client and the S3Sink that uploads records in the background, with --s3-uploads uploads running at the same time
+        '''
+        collection = self.collection
+        max_concurrency = max(1, args.s3_uploads)
+        collection.check_config_file()
+        collection.s3_client = boto3.client('s3',aws_access_key_id=collection.config.get('KEY','AWSAccessKeyId'), aws_secret_access_key= collection.config.get('KEY','AWSSecretKey'),
+                                            config=Config(max_pool_connections=max_concurrency)) # One connection per concurrent upload
+        collection.s3_sink = S3Sink(collection.s3_client, collection.config.get('KEY','AWSBucketName'), max_concurrency)
+
+    def index_key(self) -> str:
+        return f"s3:{self.collection.config.get('KEY','AWSBucketName')}/{self.collection.folder_name}"
+
+    def stored_ids(self) -> list:
+        pid_list = self.collection.s3_sink.list_product_ids(f'{self.collection.folder_name}/') # Returns a list of previouse recordes to avoid data rescraping on S3
+        pid_list = [pid for pid in pid_list if pid != 'image_store']
+        if not pid_list:
+            print('No data found on the Amazon S3')
+        return pid_list
+
+    def upload(self, dir_name: str = '_', dict_properties: dict = None, from_memory: bool = False):
+
+        '''
+        Stores a product on S3 and keeps the same structure as the local folders. The uploads run in the background.
+
+        Parameters
+        ----------
+        dir_name (str)
+            The folder of the product (like the product id)
+        dict_properties (dict)
+            The product dictionary, uploaded straight from memory as data.json. If None, data.json is uploaded from the local folder
+        from_memory (bool)
+            Reads the files of the folder (like the thumbnails) before they are queued, so the folder can be removed at once
+
+        Returns
+        -------
+        list
+            The futures of the uploads the product needs, including the images other products are uploading
+        '''
+        print('Storing data on S3 ...')
+        s3_sink = self.collection.s3_sink
+        directory_name = f'{self.collection.folder_name}/{dir_name}' 
+        uploads = []
+        if dict_properties is not None:
+            uploads.append(s3_sink.put_json(f'{directory_name}/data.json', dict_properties))
+        store = self.collection.downloader.store
+        image_manifest = {}
+        for root,dirs,files in os.walk(directory_name):
+            for file in files:
+                path = os.path.join(root,file)
+                if dict_properties is not None and file == 'data.json' and root == directory_name:
+                    continue # Already uploaded from memory
+                sha = store.sha_of(path) if store is not None else None
+                if sha is None:
+                    if from_memory:
+                        with open(path, 'rb') as fp:
+                            uploads.append(s3_sink.put_bytes(path.replace(os.sep, '/'), fp.read()))
+                    else:
+                        uploads.append(s3_sink.upload_file(path, path.replace(os.sep, '/')))
+                    continue
+                # Images are uploaded once by content and the product keeps a manifest pointing to them
+                blob_key = os.path.relpath(store.blob_path(sha)).replace(os.sep, '/')
+                upload = self._upload_blob(sha, blob_key)
+                if upload is not None:
+                    uploads.append(upload)
+                image_manifest[os.path.relpath(path, directory_name).replace(os.sep, '/')] = blob_key
+        if image_manifest:
+            uploads.append(s3_sink.put_json(f'{directory_name}/images.json', image_manifest))
+        return uploads
+
+    def _upload_blob(self, sha: str, blob_key: str):
+
+        '''
+        Uploads an image of the image store once. It is recorded as uploaded in the store only once the upload succeeded,
+        a failed upload is forgotten, so the next product showing the image uploads it again
+
+        Returns
+        -------
+        Future
+            The upload running in this run, or None if the image was uploaded in a previous run
+        '''
+        store = self.collection.downloader.store
+        with self.lock:
+            upload = self.blob_uploads.get(sha)
+            if upload is not None or store.is_uploaded(sha):
+                return upload
+            upload = self.blob_uploads[sha] = self.collection.s3_sink.upload_file(store.blob_path(sha), blob_key) # In flight, shared by the products showing it
+        def done(upload):
+            if upload.exception() is None:
+                store.mark_uploaded(sha)
+            else:
+                with self.lock:
+                    self.blob_uploads.pop(sha, None)
+        upload.add_done_callback(done)
+        return upload
+
+    def store(self, task):
+        # -------- Store Data on S3 -------- #
+        collection = self.collection
+        wait(task.images.result()) # The images need to be on disk before they are uploaded
+        remove = not collection.store_data_locally
+        uploads = self.upload(task.product_id, collection._task_record(task), from_memory=remove) # The dictionary is uploaded from memory
+        if remove and os.path.exists(f'./{collection.folder_name}/{task.product_id}'):
+            shutil.rmtree(f'./{collection.folder_name}/{task.product_id}') # Removes the image links and the thumbnails already read, the images stay in the image store
+        return when_all(uploads) # Stored once every upload is done
+
+    def close(self):
+        if self.collection.s3_sink is not None:
+            self.collection.s3_sink.close() # Waits for the uploads still running
@@ -0,0 +1,196 @@
+'''
+This code is to work on Data Collection Pipeline project
+It records which products were stored in which sink, so a run doesn't rebuild that list from the sinks at startup
+'''
+import sqlite3
+import threading
+from time import time
+
+class SeenIndex:
+
+    '''
+    This class keeps a persistent SQLite index of the product ids written to each sink (local, images, S3 or RDS),
+    with the fingerprint of the stored record and the last time it was checked.
+    It has the following methods:
+
+    __init__(self, path: str = 'seen_index.sqlite')
+    contains(self, sink: str, product_id: str)
+    add(self, sink: str, product_id: str, fingerprint: str = None)
+    fingerprint(self, sink: str, product_id: str)
+    stored_at(self, sink: str, product_id: str)
+    touch(self, sink: str, product_id: str)
+    count(self, sink: str)
+    product_ids(self, sink: str)
+    reconcile(self, sink: str, product_ids: list)
+    view(self, sink: str)
+    close(self)
+    '''
+    def __init__(self, path: str = 'seen_index.sqlite'):
+
+        '''
+        This function opens (or creates) the index.
+
+        Parameters
+        ----------
+        path (str)
+            The path of the SQLite file
+        '''
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False) # Shared by the worker threads behind the lock, other jobs wait for the write lock
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL') # The jobs of the job runner read while one of them writes
+        with self.lock, self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS seen (sink TEXT NOT NULL, product_id TEXT NOT NULL, stored_at REAL NOT NULL, fingerprint TEXT, PRIMARY KEY (sink, product_id))')
+            columns = [row[1] for row in self.conn.execute('PRAGMA table_info(seen)')]
+            if 'fingerprint' not in columns:
+                self.conn.execute('ALTER TABLE seen ADD COLUMN fingerprint TEXT') # Indexes written before fingerprints were recorded
+
+    def contains(self, sink: str, product_id: str) -> bool:
+
+        '''
+        Checks if a product is stored in a sink
+
+        Parameters
+        ----------
+        sink (str)
+            The sink name (ex: 'local:raw_data')
+        product_id (str)
+            The product id
+        '''
+        with self.lock:
+            return self.conn.execute('SELECT 1 FROM seen WHERE sink = ? AND product_id = ?', (sink, product_id)).fetchone() is not None
+
+    def add(self, sink: str, product_id: str, fingerprint: str = None):
+
+        '''
+        Records that a product was stored in a sink
+
+        Parameters
+        ----------
+        sink (str)
+            The sink name (ex: 'local:raw_data')
+        product_id (str)
+            The product id
+        fingerprint (str)
+            The fingerprint of the stored record (see product_fields.product_fingerprint)
+        '''
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO seen (sink, product_id, stored_at, fingerprint) VALUES (?, ?, ?, ?)', (sink, product_id, time(), fingerprint))
+
+    def fingerprint(self, sink: str, product_id: str):
+
+        '''
+        Returns the fingerprint of a stored record, or None if it is unknown
+
+        See help(contains) for accurate signature
+        '''
+        with self.lock:
+            row = self.conn.execute('SELECT fingerprint FROM seen WHERE sink = ? AND product_id = ?', (sink, product_id)).fetchone()
+        return row[0] if row else None
+
+    def stored_at(self, sink: str, product_id: str):
+
+        '''
+        Returns the last time (in seconds since the epoch) a record was stored or found unchanged, or None if it isn't stored
+
+        See help(contains) for accurate signature
+        '''
+        with self.lock:
+            row = self.conn.execute('SELECT stored_at FROM seen WHERE sink = ? AND product_id = ?', (sink, product_id)).fetchone()
+        return row[0] if row else None
+
+    def touch(self, sink: str, product_id: str):
+
+        '''
+        Records that a stored record was checked and found unchanged
+
+        See help(contains) for accurate signature
+        '''
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE seen SET stored_at = ? WHERE sink = ? AND product_id = ?', (time(), sink, product_id))
+
+    def count(self, sink: str) -> int:
+
+        '''
+        Returns the number of products recorded for a sink
+        '''
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM seen WHERE sink = ?', (sink,)).fetchone()[0]
+
+    def product_ids(self, sink: str) -> list:
+
+        '''
+        Returns the product ids recorded for a sink
+        '''
+        with self.lock:
+            return [row[0] for row in self.conn.execute('SELECT product_id FROM seen WHERE sink = ?', (sink,))]
+
+    def reconcile(self, sink: str, product_ids: list):
+
+        '''
+        Replaces the products recorded for a sink with the ones actually found in it, keeping the fingerprints of the products still there
+
+        Parameters
+        ----------
+        sink (str)
+            The sink name
+        product_ids (list)
+            The product ids found in the sink
+        '''
+        now = time()
+        with self.lock, self.conn:
+            found = set(product_ids)
+            recorded = {row[0] for row in self.conn.execute('SELECT product_id FROM seen WHERE sink = ?', (sink,))}
+            self.conn.executemany('DELETE FROM seen WHERE sink = ? AND product_id = ?', ((sink, product_id) for product_id in recorded - found))
+            self.conn.executemany('INSERT OR IGNORE INTO seen (sink, product_id, stored_at) VALUES (?, ?, ?)', ((sink, product_id, now) for product_id in found - recorded))
+        print(f'Index of {sink} rebuilt with {len(product_ids)} products')
+
+    def view(self, sink: str):
+
+        '''
+        Returns a list-like view of one sink, used as a product id list by StoreData
+        '''
+        return SeenView(self, sink)
+
+    def close(self):
+
+        '''
+        Closes the index
+        '''
+        with self.lock:
+            self.conn.close()
+
+class SeenView:
+
+    '''
+    This class behaves like the product id lists of StoreData ('in' and append) but reads and writes the index.
+    It also gives the fingerprint and the age of each record, used by the refresh mode.
+    '''
+    def __init__(self, index: SeenIndex, sink: str):
+        self.index = index
+        self.sink = sink
+
+    def __contains__(self, product_id: str) -> bool:
+        return self.index.contains(self.sink, product_id)
+
+    def append(self, product_id: str, fingerprint: str = None):
+        self.index.add(self.sink, product_id, fingerprint)
+
+    def fingerprint(self, product_id: str):
+        return self.index.fingerprint(self.sink, product_id)
+
+    def stored_at(self, product_id: str):
+        return self.index.stored_at(self.sink, product_id)
+
+    def touch(self, product_id: str):
+        self.index.touch(self.sink, product_id)
+
+    def reconcile(self, product_ids: list):
+        self.index.reconcile(self.sink, product_ids)
+
+    def __len__(self) -> int:
+        return self.index.count(self.sink)
+
+    def __iter__(self):
+        return iter(self.index.product_ids(self.sink))
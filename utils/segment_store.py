@@ -0,0 +1,333 @@
+'''
+This code is to work on Data Collection Pipeline project
+It appends the product records to a few large segment files (JSONL, gzipped JSONL or Parquet) instead of one folder per product
+'''
+import os
+import io
+import sys
+import gzip
+import json
+import sqlite3
+import argparse
+import threading
+from time import time
+from concurrent.futures import Future
+
+FORMATS = {'jsonl': '.jsonl', 'jsonl.gz': '.jsonl.gz', 'parquet': '.parquet'}
+
+class SegmentStore:
+
+    '''
+    This class stores product records in rotating, append-only segment files with a SQLite index from product id to segment and offset.
+
+    Records are buffered and written in batches, by size or after a time interval. A gzipped batch is one gzip member,
+    so a record is read back by seeking to its member. A Parquet batch is a new segment file (Parquet files can't be appended).
+    A product stored again is appended once more and the index points to its last record.
+    It has the following methods:
+
+    __init__(self, folder: str, fmt: str = 'jsonl', segment_size: int = 10000, batch_size: int = 100, flush_interval: float = 5)
+    append(self, dict_properties: dict)
+    flush(self)
+    _flush(self)
+    _resolve(self, futures: list, error: Exception = None)
+    _flush_periodically(self)
+    _write_jsonl(self, segment: str, records: list)
+    _write_parquet(self, segment: str, records: list)
+    _current_segment(self, num_records: int)
+    get(self, product_id: str)
+    product_ids(self)
+    __contains__(self, product_id: str)
+    __len__(self)
+    close(self)
+    '''
+    def __init__(self, folder: str, fmt: str = 'jsonl', segment_size: int = 10000, batch_size: int = 100, flush_interval: float = 5):
+
+        '''
+        This function opens (or creates) the segments of a folder and starts the thread that flushes the buffer every flush_interval seconds.
+
+        Parameters
+        ----------
+        folder (str)
+            The folder to store data (ex: raw_data), the segments are kept in '{folder}/segments'
+        fmt (str)
+            The segment format: 'jsonl', 'jsonl.gz' or 'parquet'
+        segment_size (int)
+            The maximum number of records in a JSONL segment before a new one is started
+        batch_size (int)
+            The number of records buffered before they are written (for Parquet a batch is a whole segment)
+        flush_interval (float)
+            The maximum time (in seconds) a record waits in the buffer before it is written
+        '''
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown segment format {fmt}, use one of {list(FORMATS)}')
+        if fmt == 'parquet':
+            import pyarrow # Checks the optional dependency before anything is scraped (pip install pyarrow)
+        self.root = os.path.join(folder, 'segments')
+        os.makedirs(self.root, exist_ok=True)
+        self.fmt = fmt
+        self.segment_size = segment_size
+        self.batch_size = min(batch_size, segment_size)
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.futures = [] # The future of each record in the buffer
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.root, 'index.sqlite'), check_same_thread=False) # Shared by the worker threads behind the lock
+        with self.lock, self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS records (product_id TEXT PRIMARY KEY, segment TEXT NOT NULL, offset INTEGER NOT NULL, line INTEGER NOT NULL, stored_at REAL NOT NULL)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS segments (segment TEXT PRIMARY KEY, records INTEGER NOT NULL)')
+        self.closed = threading.Event()
+        self.timer = threading.Thread(target=self._flush_periodically, daemon=True)
+        self.timer.start()
+
+    def append(self, dict_properties: dict):
+
+        '''
+        Adds a product record to the buffer and writes the buffer if it is full
+
+        Parameters
+        ----------
+        dict_properties (dict)
+            The product dictionary (each value is a one item list)
+
+        Returns
+        -------
+        Future
+            Resolved once the batch of the record is written, or with the error if it couldn't be
+        '''
+        written = Future()
+        with self.lock:
+            self.buffer.append(dict_properties)
+            self.futures.append(written)
+            flushed = self._flush() if len(self.buffer) >= self.batch_size else ([],)
+        self._resolve(*flushed)
+        return written
+
+    def flush(self):
+
+        '''
+        Writes the records in the buffer to the current segment
+        '''
+        with self.lock:
+            flushed = self._flush()
+        self._resolve(*flushed)
+
+    def _flush(self):
+
+        '''
+        Writes the buffer, the lock must be held
+
+        Returns
+        -------
+        tuple
+            The futures of the records written and the error if they couldn't be, resolved by _resolve once the lock is released
+        '''
+        if not self.buffer:
+            return ([],)
+        records, self.buffer = self.buffer, []
+        futures, self.futures = self.futures, []
+        try:
+            segment = self._current_segment(len(records))
+            if self.fmt == 'parquet':
+                locations = self._write_parquet(segment, records)
+            else:
+                locations = self._write_jsonl(segment, records)
+            now = time()
+            with self.conn:
+                self.conn.execute('INSERT INTO segments (segment, records) VALUES (?, ?) ON CONFLICT(segment) DO UPDATE SET records = records + ?', (segment, len(records), len(records)))
+                self.conn.executemany('INSERT OR REPLACE INTO records (product_id, segment, offset, line, stored_at) VALUES (?, ?, ?, ?, ?)',
+                                      ((record['Product_id'][0], segment, offset, line, now) for record, (offset, line) in zip(records, locations)))
+        except Exception as error:
+            print(f"Couldn't write {len(records)} records to the segments: {error}")
+            return (futures, error)
+        return (futures,)
+
+    def _resolve(self, futures: list, error: Exception = None):
+
+        '''
+        Resolves the futures of a written batch, outside the lock as their callbacks can take a while (like recording the products in the index)
+        '''
+        for future in futures:
+            if error is None:
+                future.set_result(True)
+            else:
+                future.set_exception(error) # The records aren't recorded in the index
+
+    def _flush_periodically(self):
+
+        '''
+        Flushes the buffer every flush_interval seconds until the store is closed
+        '''
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+
+    def _write_jsonl(self, segment: str, records: list) -> list:
+
+        '''
+        Appends records to a JSONL segment
+
+        Returns
+        -------
+        list
+            The (offset, line) of each record: the byte offset of the line, or of the gzip member and the line in it
+        '''
+        path = os.path.join(self.root, segment)
+        lines = [json.dumps(record) + '\n' for record in records]
+        with open(path, 'ab') as fp:
+            start = fp.tell()
+            if self.fmt == 'jsonl.gz':
+                fp.write(gzip.compress(''.join(lines).encode('utf-8'))) # One gzip member per batch, gzip readers join them
+                locations = [(start, line) for line in range(len(lines))]
+            else:
+                locations = []
+                for line in lines:
+                    locations.append((fp.tell(), 0))
+                    fp.write(line.encode('utf-8'))
+            fp.flush()
+            os.fsync(fp.fileno())
+        return locations
+
+    def _write_parquet(self, segment: str, records: list) -> list:
+
+        '''
+        Writes records as a new Parquet segment
+
+        Returns
+        -------
+        list
+            The (0, row) of each record
+        '''
+        import pandas as pd # Only needed for parquet, it is slow to import
+        df = pd.DataFrame([{key: value[0] for key, value in record.items()} for record in records])
+        df.to_parquet(os.path.join(self.root, segment), index=False)
+        return [(0, row) for row in range(len(records))]
+
+    def _current_segment(self, num_records: int) -> str:
+
+        '''
+        Returns the segment the next batch is written to, a new one if the last is full (or Parquet)
+        '''
+        row = self.conn.execute('SELECT segment, records FROM segments ORDER BY segment DESC LIMIT 1').fetchone()
+        if row is not None and self.fmt != 'parquet' and row[0].endswith(FORMATS[self.fmt]) and row[1] + num_records <= self.segment_size:
+            return row[0]
+        number = int(row[0].split('-')[1].split('.')[0]) + 1 if row else 1
+        return f'segment-{number:06d}{FORMATS[self.fmt]}'
+
+    def get(self, product_id: str):
+
+        '''
+        Reads the last record of a product
+
+        Parameters
+        ----------
+        product_id (str)
+            The product id
+
+        Returns
+        -------
+        dict
+            The product dictionary, or None if it isn't stored
+        '''
+        with self.lock:
+            flushed = self._flush() # The record could still be in the buffer
+            row = self.conn.execute('SELECT segment, offset, line FROM records WHERE product_id = ?', (product_id,)).fetchone()
+        self._resolve(*flushed)
+        if row is None:
+            return None
+        segment, offset, line = row
+        path = os.path.join(self.root, segment)
+        if segment.endswith('.parquet'):
+            import pandas as pd
+            values = pd.read_parquet(path).iloc[line].to_dict()
+            return {key: [value.tolist() if hasattr(value, 'tolist') else value] for key, value in values.items()}
+        with open(path, 'rb') as fp:
+            fp.seek(offset)
+            reader = io.TextIOWrapper(gzip.GzipFile(fileobj=fp), encoding='utf-8') if segment.endswith('.gz') else io.TextIOWrapper(fp, encoding='utf-8')
+            for _ in range(line):
+                reader.readline()
+            return json.loads(reader.readline())
+
+    def product_ids(self) -> list:
+
+        '''
+        Returns the product ids stored in the segments (and in the buffer)
+        '''
+        with self.lock:
+            pid_list = [row[0] for row in self.conn.execute('SELECT product_id FROM records')]
+            return list(dict.fromkeys(pid_list + [record['Product_id'][0] for record in self.buffer]))
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self.product_ids()
+
+    def __len__(self) -> int:
+        return len(self.product_ids())
+
+    def close(self):
+
+        '''
+        Stops the flush thread, writes the records left in the buffer and closes the index
+        '''
+        self.closed.set()
+        self.timer.join()
+        with self.lock:
+            flushed = self._flush()
+            self.conn.close()
+        self._resolve(*flushed)
+
+def migrate(folder: str, store: SegmentStore, remove: bool = False) -> int:
+
+    '''
+    Moves the records of the '{folder}/<product id>/data.json' tree into a segment store
+
+    Parameters
+    ----------
+    folder (str)
+        The folder of the records (ex: raw_data)
+    store (SegmentStore)
+        The store the records are appended to
+    remove (bool)
+        Removes each data.json after the records are written (the image folders are kept)
+
+    Returns
+    -------
+    int
+        The number of records migrated
+
+    Raises
+    ------
+    Exception
+        The error of a batch which couldn't be written, nothing is removed then
+    '''
+    migrated = []
+    written = []
+    for pid in sorted(next(os.walk(folder), (None, [], []))[1]):
+        path = os.path.join(folder, pid, 'data.json')
+        if not os.path.exists(path):
+            continue # Not a record (like image_store or segments)
+        with open(path) as fp:
+            written.append(store.append(json.load(fp)))
+        migrated.append(path)
+    store.flush()
+    for future in written:
+        future.result() # Every record is on disk before anything is removed
+    if remove:
+        for path in migrated:
+            os.remove(path)
+            if not os.listdir(os.path.dirname(path)):
+                os.rmdir(os.path.dirname(path))
+    return len(migrated)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migrates the <folder>/<product id>/data.json records into segment files')
+    parser.add_argument('--folder', type=str, default='raw_data', help='Folder\'s name of the records (ex: raw_data)')
+    parser.add_argument('--format', type=str, default='jsonl.gz', choices=list(FORMATS), help='Segment format (ex: jsonl.gz)')
+    parser.add_argument('--segment-size', type=int, default=10000, help='Maximum number of records in a JSONL segment (ex: 10000)')
+    parser.add_argument('--remove', action='store_true', default=False, help='Remove the data.json files after migrating them')
+    args = parser.parse_args()
+    store = SegmentStore(args.folder, args.format, args.segment_size, batch_size=1000)
+    try:
+        num_records = migrate(args.folder, store, args.remove)
+    except Exception as exc:
+        sys.exit(f"Couldn't migrate the records of {args.folder}, none was removed: {exc}")
+    finally:
+        store.close()
+    print(f'Migrated {num_records} records of {args.folder} to {store.root}')
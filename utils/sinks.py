@@ -0,0 +1,140 @@
+'''
+This code is to work on Data Collection Pipeline project
+It keeps the registry of the storage sinks (local records, images, S3 and RDS). A sink module is imported only when
+the sink is enabled, so a run only pays the import time of the backends it uses
+'''
+import sys
+import argparse
+import importlib
+import subprocess
+from time import perf_counter
+from utils.metrics import METRICS
+
+# Sink name -> 'module:class', in the order the sinks are handed a record. A sink class can be replaced with register_sink
+SINK_PLUGINS = {'local': 'utils.local_sink:LocalSink', 'images': 'utils.local_sink:ImageSink', 's3': 'utils.s3_sink:S3RecordSink', 'rds': 'utils.rds_writer:RDSSink'}
+IMPORT_TIMES = {}
+
+class Sink:
+
+    '''
+    This class is the interface of a storage sink. A sink keeps a reference to its DataCollection and reads the shared settings
+    (folder_name, config, downloader ...) from it, so it can be used before it is opened (like in the tests).
+    It has the following methods:
+
+    __init__(self, collection)
+    open(self, args)
+    index_key(self)
+    stored_ids(self)
+    store(self, task)
+    close(self)
+    '''
+    name = ''
+
+    def __init__(self, collection):
+
+        '''
+        Parameters
+        ----------
+        collection (DataCollection)
+            The scraper whose records this sink stores
+        '''
+        self.collection = collection
+
+    def open(self, args):
+
+        '''
+        Connects the sink with the command line arguments (see help(StoreData.user_store_data_options))
+        '''
+
+    def index_key(self) -> str:
+
+        '''
+        Returns the name of the view of this sink in the index of stored products (ex: 'local:raw_data')
+        '''
+        raise NotImplementedError
+
+    def stored_ids(self) -> list:
+
+        '''
+        Returns the ids of the products stored in this sink, read from the backend to rebuild the index
+        '''
+        raise NotImplementedError
+
+    def store(self, task):
+
+        '''
+        Stores a StorageTask, called by the storage worker of this sink. It returns once the record is stored, or returns
+        a Future resolved once it is stored in the background (the product is only recorded in the index then)
+        '''
+        raise NotImplementedError
+
+    def close(self):
+
+        '''
+        Waits until the records are stored and closes the connections
+        '''
+
+def register_sink(name: str, target: str):
+
+    '''
+    Replaces the class of a sink (ex: to keep the records in another database), the sink is still enabled by its flag
+
+    Parameters
+    ----------
+    name (str)
+        The sink name (local, images, s3 or rds)
+    target (str)
+        The class of the sink as 'module:class' (ex: 'my_package.mongo_sink:MongoSink'), imported when it is first used
+    '''
+    SINK_PLUGINS[name] = target
+
+def load_sink(name: str) -> type:
+
+    '''
+    Imports the class of a sink and records how long its module took to import
+
+    Returns
+    -------
+    type
+        The Sink class
+    '''
+    if name not in SINK_PLUGINS:
+        raise ValueError(f'Unknown sink {name}, use one of {list(SINK_PLUGINS)}')
+    module_name, _, class_name = SINK_PLUGINS[name].partition(':')
+    start = perf_counter()
+    module = importlib.import_module(module_name) # Only a dictionary lookup once the module is loaded
+    seconds = perf_counter() - start
+    if name not in IMPORT_TIMES:
+        IMPORT_TIMES[name] = seconds
+        METRICS.observe(f'import_{name}', seconds)
+    return getattr(module, class_name)
+
+def import_seconds(module: str, runs: int = 3) -> float:
+
+    '''
+    Measures the import time of a module in a new interpreter, the fastest of a few runs
+
+    Parameters
+    ----------
+    module (str)
+        The module (ex: 'utils.ikea')
+    runs (int)
+        The number of interpreters started
+
+    Returns
+    -------
+    float
+        The seconds the import took
+    '''
+    code = f'from time import perf_counter; start = perf_counter(); import {module}; print(perf_counter() - start)'
+    return min(float(subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout) for _ in range(max(1, runs)))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the import time of the scraper and of each sink, each in a new interpreter')
+    parser.add_argument('--runs', type=int, default=3, help='Number of interpreters started for each measure, the fastest is kept (ex: 5)')
+    args = parser.parse_args()
+    base = import_seconds('utils.ikea', args.runs)
+    print(f'utils.ikea: {base * 1000:.0f} ms')
+    for name, target in SINK_PLUGINS.items():
+        module = target.partition(':')[0]
+        print(f"{name} sink ({module}): +{(import_seconds(f'utils.ikea, {module}', args.runs) - base) * 1000:.0f} ms")
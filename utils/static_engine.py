@@ -0,0 +1,174 @@
+'''
+This code is to work on Data Collection Pipeline project
+It reads product pages over plain HTTP instead of rendering them in Chrome
+'''
+import uuid
+import requests
+import lxml.html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils.rate_limiter import HostRateLimiter
+from utils.metrics import METRICS
+from utils.page_cache import PageCache
+from utils.product_fields import PRODUCT_FIELDS, IMAGE_LIST_XPATH, product_dict
+
+class ExtractionError(Exception):
+
+    '''
+    Raised when a field can't be found in a static page
+    '''
+
+class StaticEngine:
+
+    '''
+    This class fetches product pages over pooled HTTP connections and extracts the same fields as the Selenium path.
+    It has the following methods:
+
+    __init__(self, pool_size: int = 10, timeout: float = 10, rate_limiter: HostRateLimiter = None, page_cache: PageCache = None)
+    fetch(self, url: str)
+    parse(html, url: str = '')
+    retrieve_product_page(self, url: str)
+    retrieve_product_details(self, url: str)
+    close(self)
+    '''
+    def __init__(self, pool_size: int = 10, timeout: float = 10, rate_limiter: HostRateLimiter = None, page_cache: PageCache = None):
+
+        '''
+        This function initialize the HTTP session.
+
+        Parameters
+        ----------
+        pool_size (int)
+            The number of connections kept alive per host (set it to the number of workers or more)
+        timeout (float)
+            The timeout (in seconds) of each request
+        rate_limiter (HostRateLimiter)
+            Spaces out the requests to each host, shared with the other workers (None for no limit)
+        page_cache (PageCache)
+            Serves the pages already downloaded and keeps the new ones (None to always download them)
+        '''
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.page_cache = page_cache
+        self.session = requests.Session()
+        retries = Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries) # Reuses connections between pages
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/105.0 Safari/537.36',
+                                     'Accept-Language': 'en-GB,en;q=0.9'})
+
+    def fetch(self, url: str) -> bytes:
+
+        '''
+        Downloads a page, or reads it from the page cache
+
+        Parameters
+        ----------
+        url (str)
+            The page link
+
+        Returns
+        -------
+        bytes
+            The HTML of the page, left undecoded so the parser can read the page's own charset
+        '''
+        if self.page_cache is not None:
+            body = self.page_cache.get(url) # Raises CacheMiss in replay mode
+            if body is not None:
+                return body
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(url)
+        try:
+            with METRICS.timer('static_fetch'):
+                response = self.session.get(url, timeout=self.timeout)
+        except requests.exceptions.RetryError:
+            if self.rate_limiter is not None: self.rate_limiter.throttled(url) # Still 429 or 503 after the retries
+            raise
+        retries = getattr(getattr(response.raw, 'retries', None), 'history', ())
+        if retries: METRICS.inc('retries', len(retries))
+        METRICS.inc('static_bytes', len(response.content))
+        if response.status_code in (429, 503) and self.rate_limiter is not None:
+            self.rate_limiter.throttled(url)
+        response.raise_for_status() # Stops if a bad download occurs
+        if self.page_cache is not None:
+            self.page_cache.put(url, response.content)
+        return response.content
+
+    @staticmethod
+    def parse(html, url: str = '') -> dict:
+
+        '''
+        Extracts the product fields from the HTML of a product page
+
+        Parameters
+        ----------
+        html (str or bytes)
+            The HTML of a product page
+        url (str)
+            The page link, used to make relative image links absolute
+
+        Returns
+        -------
+        dict
+            A product dictionary, the same as DataCollection.retrieve_product_details returns
+        '''
+        tree = lxml.html.fromstring(html)
+        if url:
+            tree.make_links_absolute(url)
+        fields = {}
+        for field, (xpath, attribute) in PRODUCT_FIELDS.items():
+            elements = tree.xpath(xpath)
+            if not elements:
+                raise ExtractionError(f'{field} not found')
+            if attribute == 'text':
+                fields[field] = ' '.join(elements[0].text_content().split()) # Same as the visible text read by Selenium
+            else:
+                fields[field] = elements[0].get(attribute)
+            if not fields[field]:
+                raise ExtractionError(f'{field} is empty')
+        src_multi_img = [img.get('src') for img in tree.xpath(IMAGE_LIST_XPATH)]
+        return product_dict(fields, str(uuid.uuid4()), src_multi_img)
+
+    def retrieve_product_page(self, url: str) -> tuple:
+
+        '''
+        Fetches and parses a product page
+
+        Parameters
+        ----------
+        url (str)
+            The product link
+
+        Returns
+        -------
+        tuple
+            A product dictionary and the HTML of the page, or (None, None) if the static extraction failed and the Selenium path should be used
+        '''
+        try:
+            html = self.fetch(url)
+            dict_properties = self.parse(html, url)
+        except (requests.RequestException, ExtractionError, ValueError) as exc:
+            print(f"Static extraction failed for {url}: {exc}")
+            return None, None
+        print(dict_properties['Product_id'][0])
+        return dict_properties, html
+
+    def retrieve_product_details(self, url: str):
+
+        '''
+        Fetches and parses a product page (see help(retrieve_product_page))
+
+        Returns
+        -------
+        dict
+            A product dictionary, or None if the static extraction failed and the Selenium path should be used
+        '''
+        return self.retrieve_product_page(url)[0]
+
+    def close(self):
+
+        '''
+        Closes the pooled connections
+        '''
+        self.session.close()
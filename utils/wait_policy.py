@@ -0,0 +1,210 @@
+'''
+This code is to work on Data Collection Pipeline project
+It replaces the fixed sleeps of the scraper with explicit readiness conditions
+'''
+import threading
+from time import perf_counter
+from collections import defaultdict
+from utils.metrics import METRICS
+from selenium.common.exceptions import TimeoutException # selenium.webdriver is imported once a page is waited for, it is slow to import
+
+# True once the page is loaded and no resource finished loading in the last arguments[0] milliseconds
+SETTLED_SCRIPT = '''
+const last = performance.getEntriesByType('resource').reduce((end, entry) => Math.max(end, entry.responseEnd), 0);
+return document.readyState === 'complete' && performance.now() - last >= arguments[0];
+'''
+STUCK = 'stuck' # Returned by a condition which gives up: the page settled and the value will not change anymore
+
+class WaitPolicy:
+
+    '''
+    This class waits for a page to be ready instead of sleeping a fixed time and reports how long was spent waiting.
+    It has the following methods:
+
+    __init__(self, driver, timeout: float = 10, poll_frequency: float = 0.1, idle_time: float = 0.25)
+    element_present(self, xpath: str, timeout: float = None)
+    element_gone(self, xpath: str, timeout: float = None)
+    network_idle(self, timeout: float = None)
+    count_stable(self, xpath: str, min_count: int = 1, timeout: float = None)
+    merge(self, other)
+    report(self)
+    print_report(self)
+    '''
+    def __init__(self, driver, timeout: float = 10, poll_frequency: float = 0.1, idle_time: float = 0.25):
+
+        '''
+        This function initialize all attributes used in this class.
+
+        Parameters
+        ----------
+        driver (WebDriver)
+            The web driver the conditions are checked on
+        timeout (float)
+            The maximum time (in seconds) to wait for a condition
+        poll_frequency (float)
+            How often (in seconds) a condition is checked
+        idle_time (float)
+            How long (in seconds) a value must stay unchanged to be considered stable
+        '''
+        self.driver = driver
+        self.timeout = timeout
+        self.poll_frequency = poll_frequency
+        self.idle_time = idle_time
+        self.waited = defaultdict(float) # Seconds spent waiting for each condition
+        self.calls = defaultdict(int)
+        self.timeouts = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def _until(self, name: str, condition, timeout: float = None):
+
+        '''
+        Waits until a condition is met and records the time spent
+
+        Returns
+        -------
+        The value returned by the condition, or None if it timed out
+        '''
+        from selenium.webdriver.support.ui import WebDriverWait
+        start = perf_counter()
+        try:
+            return WebDriverWait(self.driver, timeout or self.timeout, poll_frequency=self.poll_frequency).until(condition)
+        except TimeoutException:
+            with self.lock:
+                self.timeouts[name] += 1
+            print(f'Waiting for {name} took too much time!')
+        finally:
+            waited = perf_counter() - start
+            METRICS.observe(f'wait_{name}', waited)
+            with self.lock:
+                self.waited[name] += waited
+                self.calls[name] += 1
+
+    def _settled(self, driver) -> bool:
+
+        '''
+        Checks if the page is loaded and no resource finished loading for idle_time seconds, so there is nothing left to wait for
+        '''
+        return bool(driver.execute_script(SETTLED_SCRIPT, self.idle_time * 1000))
+
+    def _stable(self, read_value, is_ready = lambda value: True, give_up: bool = False):
+
+        '''
+        Builds a condition which is met once the value returned by read_value stops changing for idle_time seconds.
+        A ready value on a page which already settled is accepted at once.
+        With give_up, a value which is not ready but stopped changing on a settled page returns STUCK instead of waiting for the timeout
+        '''
+        state = {'value': None, 'since': perf_counter()}
+        def condition(driver):
+            value = read_value(driver)
+            if is_ready(value) and self._settled(driver):
+                return True # Fast pages go straight through
+            now = perf_counter()
+            if value != state['value']:
+                state['value'], state['since'] = value, now
+                return False
+            if now - state['since'] < self.idle_time:
+                return False
+            if is_ready(value):
+                return True
+            return STUCK if give_up and self._settled(driver) else False
+        return condition
+
+    def element_present(self, xpath: str, timeout: float = None):
+
+        '''
+        Waits until an element is present on the page
+
+        Parameters
+        ----------
+        xpath (str)
+            The xpath of the element
+        timeout (float)
+            Overrides the default timeout
+        '''
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        return self._until('element_present', EC.presence_of_element_located((By.XPATH, xpath)), timeout)
+
+    def element_gone(self, xpath: str, timeout: float = None):
+
+        '''
+        Waits until an element is hidden or removed from the page (like a cookies banner)
+
+        See help(element_present) for accurate signature
+        '''
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        return self._until('element_gone', EC.invisibility_of_element_located((By.XPATH, xpath)), timeout)
+
+    def network_idle(self, timeout: float = None):
+
+        '''
+        Waits until the page is loaded and no new resources (images, scripts, ...) are requested for idle_time seconds
+
+        Parameters
+        ----------
+        timeout (float)
+            Overrides the default timeout
+        '''
+        read_value = lambda driver: driver.execute_script("return [document.readyState, performance.getEntriesByType('resource').length]")
+        is_ready = lambda value: value[0] == 'complete'
+        return self._until('network_idle', self._stable(read_value, is_ready), timeout)
+
+    def count_stable(self, xpath: str, min_count: int = 1, timeout: float = None):
+
+        '''
+        Waits until the number of elements matching an xpath (like search results) is at least min_count and stops changing.
+        It stops early if the page settled and the count stayed below min_count (like 'show more' adding no results)
+
+        Parameters
+        ----------
+        xpath (str)
+            The xpath of the elements
+        min_count (int)
+            The minimum number of elements expected (ex: more than before clicking 'show more')
+        timeout (float)
+            Overrides the default timeout
+
+        Returns
+        -------
+        bool
+            True if the count got stable, False if no more elements are coming, None if it timed out
+        '''
+        from selenium.webdriver.common.by import By
+        read_value = lambda driver: len(driver.find_elements(by=By.XPATH, value=xpath))
+        is_ready = lambda value: value >= min_count
+        result = self._until('count_stable', self._stable(read_value, is_ready, give_up=True), timeout)
+        return False if result == STUCK else result
+
+    def merge(self, other):
+
+        '''
+        Adds the waiting times of another WaitPolicy (like a worker's) to this one
+        '''
+        with self.lock:
+            for name in other.calls:
+                self.waited[name] += other.waited[name]
+                self.calls[name] += other.calls[name]
+                self.timeouts[name] += other.timeouts[name]
+
+    def report(self) -> dict:
+
+        '''
+        Returns
+        -------
+        dict
+            The number of waits, timeouts and seconds spent for each condition
+        '''
+        with self.lock:
+            return {name: {'calls': self.calls[name], 'timeouts': self.timeouts[name], 'seconds': round(self.waited[name], 3)} for name in self.calls}
+
+    def print_report(self):
+
+        '''
+        Prints how long was spent waiting in this run
+        '''
+        report = self.report()
+        total = sum(value['seconds'] for value in report.values())
+        print(f'\nTime spent waiting: {total:.2f}s')
+        for name, value in report.items():
+            print(f"  {name}: {value['seconds']:.2f}s in {value['calls']} waits ({value['timeouts']} timeouts)")
@@ -0,0 +1,360 @@
+'''
+This code is to work on Data Collection Pipeline project
+It shares the product links of a crawl between several nodes: a coordinator publishes the links and the workers
+claim them with a time-limited lease, so a link whose worker stopped is given to another one
+'''
+import os
+import socket
+import sqlite3
+import argparse
+import threading
+from time import time
+
+def worker_name() -> str:
+
+    '''
+    Returns a name for the worker thread calling it, unique across nodes (ex: 'node1-4242-139871')
+    '''
+    return f'{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}'
+
+class SQLiteWorkQueue:
+
+    '''
+    This class keeps a shared queue of product links in a SQLite file, for the nodes sharing a disk (processes or containers
+    with the same volume). Each claim runs in its own write transaction, so a link is leased to one worker at a time.
+    It has the following methods:
+
+    __init__(self, path: str = 'work_queue.sqlite', lease: float = 600, max_attempts: int = 3)
+    publish(self, links_list: list)
+    claim(self, worker: str)
+    complete(self, link: str, worker: str)
+    fail(self, link: str, worker: str, error: str = '')
+    drained(self)
+    counts(self)
+    close(self)
+    '''
+    def __init__(self, path: str = 'work_queue.sqlite', lease: float = 600, max_attempts: int = 3):
+
+        '''
+        This function opens (or creates) the queue.
+
+        Parameters
+        ----------
+        path (str)
+            The path of the SQLite file
+        lease (float)
+            The seconds a worker has to scrape a claimed link before it is given to another worker
+        max_attempts (int)
+            The number of claims of a link before it is recorded as failed
+        '''
+        folder = os.path.dirname(path)
+        if folder: os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max(1, max_attempts)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False) # Other nodes wait for the write lock, the transactions are explicit
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL') # The readers don't block the claims
+            self.conn.execute('PRAGMA synchronous=NORMAL') # No disk sync on each claim, a claim lost in a power cut is leased again
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS links (link TEXT PRIMARY KEY, position INTEGER NOT NULL, status TEXT NOT NULL, worker TEXT, '
+                              'lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT, updated_at REAL NOT NULL)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS links_status ON links (status, position)')
+
+    def _transaction(self, statements):
+
+        '''
+        Runs a function of the connection in a write transaction, taken before anything is read
+        '''
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = statements(self.conn)
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+            return result
+
+    def publish(self, links_list: list) -> int:
+
+        '''
+        Adds product links to the queue and records that they were published, the links already in the queue are skipped
+
+        Parameters
+        ----------
+        links_list (list)
+            The product links to be scraped
+
+        Returns
+        -------
+        int
+            The number of links added
+        '''
+        def insert(conn):
+            now = time()
+            position = conn.execute('SELECT COALESCE(MAX(position) + 1, 0) FROM links').fetchone()[0]
+            added = 0
+            for link in links_list:
+                added += conn.execute("INSERT OR IGNORE INTO links (link, position, status, updated_at) VALUES (?, ?, 'pending', ?)",
+                                      (link, position + added, now)).rowcount
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('published', ?)", (str(now),))
+            return added
+        return self._transaction(insert)
+
+    def claim(self, worker: str):
+
+        '''
+        Leases the next link to a worker. A link whose lease expired is claimed again, or recorded as failed after max_attempts claims
+
+        Parameters
+        ----------
+        worker (str)
+            The name of the worker (see worker_name())
+
+        Returns
+        -------
+        str
+            The link, or None if no link can be claimed now
+        '''
+        def lease(conn):
+            now = time()
+            conn.execute("UPDATE links SET status = 'failed', error = 'Lease expired', worker = NULL, updated_at = ? "
+                         "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?", (now, now, self.max_attempts))
+            row = conn.execute("SELECT link FROM links WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?) ORDER BY position LIMIT 1",
+                               (now,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE links SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? WHERE link = ?",
+                         (worker, now + self.lease, now, row[0]))
+            return row[0]
+        return self._transaction(lease)
+
+    def complete(self, link: str, worker: str):
+
+        '''
+        Records that a link was scraped. It is kept as done even if its lease expired meanwhile
+        '''
+        self._transaction(lambda conn: conn.execute("UPDATE links SET status = 'done', worker = ?, lease_until = NULL, error = NULL, updated_at = ? WHERE link = ?",
+                                                    (worker, time(), link)))
+
+    def fail(self, link: str, worker: str, error: str = ''):
+
+        '''
+        Records that a link couldn't be scraped. It goes back to the queue (for any worker) until it was claimed max_attempts times.
+        Nothing changes if the lease of the worker expired and the link was claimed by another one
+        '''
+        def release(conn):
+            conn.execute("UPDATE links SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, worker = NULL, lease_until = NULL, "
+                         "error = ?, updated_at = ? WHERE link = ? AND status = 'leased' AND worker = ?", (self.max_attempts, f'{worker}: {error}', time(), link, worker))
+        self._transaction(release)
+
+    def drained(self) -> bool:
+
+        '''
+        Checks if the links were published and none is waiting or leased, the workers stop then
+        '''
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'published'").fetchone() is None:
+                return False # The coordinator is still searching
+            return self.conn.execute("SELECT 1 FROM links WHERE status IN ('pending', 'leased') LIMIT 1").fetchone() is None
+
+    def counts(self) -> dict:
+
+        '''
+        Returns
+        -------
+        dict
+            The number of links for each status (pending, leased, done, failed)
+        '''
+        with self.lock:
+            return dict(self.conn.execute('SELECT status, COUNT(*) FROM links GROUP BY status').fetchall())
+
+    def close(self):
+
+        '''
+        Closes the queue
+        '''
+        with self.lock:
+            self.conn.close()
+
+# Each script runs atomically on the Redis server, so two workers never claim the same link
+CLAIM_SCRIPT = '''
+local now, lease_until, max_attempts = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+for _, link in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)) do
+    redis.call('ZREM', KEYS[2], link)
+    redis.call('HDEL', KEYS[5], link)
+    if tonumber(redis.call('HGET', KEYS[3], link) or '0') >= max_attempts then
+        redis.call('HSET', KEYS[4], link, 'failed')
+    else
+        redis.call('HSET', KEYS[4], link, 'pending')
+        redis.call('RPUSH', KEYS[1], link)
+    end
+end
+local link = redis.call('LPOP', KEYS[1])
+if not link then return false end
+redis.call('ZADD', KEYS[2], lease_until, link)
+redis.call('HINCRBY', KEYS[3], link, 1)
+redis.call('HSET', KEYS[4], link, 'leased')
+redis.call('HSET', KEYS[5], link, ARGV[4])
+return link
+'''
+
+PUBLISH_SCRIPT = '''
+local added = 0
+for _, link in ipairs(ARGV) do
+    if redis.call('HSETNX', KEYS[2], link, 'pending') == 1 then
+        redis.call('RPUSH', KEYS[1], link)
+        added = added + 1
+    end
+end
+redis.call('SET', KEYS[3], '1')
+return added
+'''
+
+FAIL_SCRIPT = '''
+if redis.call('HGET', KEYS[4], ARGV[1]) ~= 'leased' or redis.call('HGET', KEYS[5], ARGV[1]) ~= ARGV[3] then return 0 end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[5], ARGV[1])
+redis.call('HSET', KEYS[6], ARGV[1], ARGV[3] .. ': ' .. ARGV[4])
+if tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or '0') >= tonumber(ARGV[2]) then
+    redis.call('HSET', KEYS[4], ARGV[1], 'failed')
+else
+    redis.call('HSET', KEYS[4], ARGV[1], 'pending')
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+end
+return 1
+'''
+
+class RedisWorkQueue:
+
+    '''
+    This class keeps the shared queue of product links on a Redis server (or a Redis-compatible one), for nodes on
+    different machines. It needs the redis package (pip install redis). The leases use the clocks of the workers,
+    so the nodes should have their clocks synchronised.
+    It has the same methods as SQLiteWorkQueue:
+
+    __init__(self, url: str = 'redis://localhost:6379/0', lease: float = 600, max_attempts: int = 3, name: str = 'ikea_work_queue')
+    publish(self, links_list: list)
+    claim(self, worker: str)
+    complete(self, link: str, worker: str)
+    fail(self, link: str, worker: str, error: str = '')
+    drained(self)
+    counts(self)
+    close(self)
+    '''
+    def __init__(self, url: str = 'redis://localhost:6379/0', lease: float = 600, max_attempts: int = 3, name: str = 'ikea_work_queue'):
+
+        '''
+        This function connects to the Redis server.
+
+        Parameters
+        ----------
+        url (str)
+            The Redis server (ex: redis://localhost:6379/0)
+        lease (float)
+            The seconds a worker has to scrape a claimed link before it is given to another worker
+        max_attempts (int)
+            The number of claims of a link before it is recorded as failed
+        name (str)
+            The prefix of the Redis keys of the queue
+        '''
+        import redis # Optional dependency, only needed for this backend
+        self.path = url
+        self.lease = lease
+        self.max_attempts = max(1, max_attempts)
+        self.client = redis.Redis.from_url(url, decode_responses=True) # Thread safe, with a pool of connections
+        self.pending, self.leases, self.attempts, self.status, self.published = (f'{name}:{key}' for key in ['pending', 'leases', 'attempts', 'status', 'published'])
+        self.errors, self.workers = f'{name}:errors', f'{name}:workers' # The worker holding the lease of each link
+        self._claim = self.client.register_script(CLAIM_SCRIPT)
+        self._publish = self.client.register_script(PUBLISH_SCRIPT)
+        self._fail = self.client.register_script(FAIL_SCRIPT)
+
+    def publish(self, links_list: list) -> int:
+
+        '''
+        See help(SQLiteWorkQueue.publish)
+        '''
+        added = 0
+        links_list = list(links_list)
+        for start in range(0, len(links_list), 1000): # Keeps each script short
+            added += self._publish(keys=[self.pending, self.status, self.published], args=links_list[start:start + 1000])
+        if not links_list:
+            self.client.set(self.published, '1')
+        return added
+
+    def claim(self, worker: str):
+
+        '''
+        See help(SQLiteWorkQueue.claim)
+        '''
+        now = time()
+        return self._claim(keys=[self.pending, self.leases, self.attempts, self.status, self.workers], args=[now, now + self.lease, self.max_attempts, worker]) or None
+
+    def complete(self, link: str, worker: str):
+
+        '''
+        See help(SQLiteWorkQueue.complete)
+        '''
+        with self.client.pipeline() as pipe: # MULTI/EXEC
+            pipe.zrem(self.leases, link)
+            pipe.hset(self.status, link, 'done')
+            pipe.hdel(self.errors, link)
+            pipe.hdel(self.workers, link)
+            pipe.execute()
+
+    def fail(self, link: str, worker: str, error: str = ''):
+
+        '''
+        See help(SQLiteWorkQueue.fail)
+        '''
+        self._fail(keys=[self.pending, self.leases, self.attempts, self.status, self.workers, self.errors], args=[link, self.max_attempts, worker, error])
+
+    def drained(self) -> bool:
+
+        '''
+        See help(SQLiteWorkQueue.drained)
+        '''
+        with self.client.pipeline() as pipe:
+            published, pending, leased = pipe.exists(self.published).llen(self.pending).zcard(self.leases).execute()
+        return bool(published) and not pending and not leased
+
+    def counts(self) -> dict:
+
+        '''
+        See help(SQLiteWorkQueue.counts)
+        '''
+        counts = {}
+        for status in self.client.hvals(self.status):
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def close(self):
+
+        '''
+        Closes the connections to the server
+        '''
+        self.client.close()
+
+def open_work_queue(url: str, lease: float = 600, max_attempts: int = 3):
+
+    '''
+    Opens the queue of a link: a redis:// (or rediss://, unix://) server, or else the path of a SQLite file
+
+    Returns
+    -------
+    SQLiteWorkQueue or RedisWorkQueue
+        The queue
+    '''
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisWorkQueue(url, lease, max_attempts)
+    return SQLiteWorkQueue(url, lease, max_attempts)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Shows the number of links of a shared work queue for each status (see --queue of main.py)')
+    parser.add_argument('--queue', type=str, default='work_queue.sqlite', help='SQLite file or redis:// link of the queue (ex: redis://localhost:6379/0)')
+    args = parser.parse_args()
+    work_queue = open_work_queue(args.queue)
+    print(f"{args.queue}: {work_queue.counts()}{' (drained)' if work_queue.drained() else ''}")
+    work_queue.close()